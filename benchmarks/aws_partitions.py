@@ -0,0 +1,76 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""AWS Partitions.
+
+Measures the partition lookups of an account run. The partition index of
+aws_partitions is compared with the frozen lookups it replaced, which the
+partition test checks it against. The first call, which loads the endpoint
+data, is reported separately from the warm lookups.
+
+    python benchmarks/aws_partitions.py [--number 100000] [--runs 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def lookups(partitions):
+    """
+    Makes the lookups of one account run: the run context, the STS
+    connection and the notification payload, and a region only matched by
+    the region pattern of its partition.
+
+    :return Tuple of the results.
+    """
+    partition = partitions.get_partition_for_region('us-east-1')
+    return (partition,
+            partitions.get_iam_region(partition),
+            list(partitions.get_partition_regions(partition)),
+            partitions.get_partition_for_region('eu-west-1'),
+            partitions.get_partition_name(partition),
+            partitions.get_partition_for_region('us-future-1'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--number', type=int, default=100000,
+                        help='lookup sets per run')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='runs per implementation, the fastest is'
+                             ' reported')
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    sys.path[:0] = [os.path.join(ROOT, 'src', 'access_key_auto_rotation'),
+                    os.path.join(ROOT, 'tests')]
+    import aws_partitions
+    import legacy_partitions
+
+    implementations = (('legacy', legacy_partitions),
+                       ('index', aws_partitions))
+    first_ms = {}
+    results = {}
+    for name, partitions in implementations:
+        start = time.perf_counter()
+        results[name] = lookups(partitions)
+        first_ms[name] = (time.perf_counter() - start) * 1000
+    if results['legacy'] != results['index']:
+        sys.exit(f'The lookups differ: {results}')
+
+    for name, partitions in implementations:
+        best = min(timeit.repeat(lambda: lookups(partitions),
+                                 number=args.number, repeat=args.runs))
+        print(f'{name}: first call {first_ms[name]:.1f} ms,'
+              f' {best / args.number * 1e6:.2f} us per lookup set')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Import Time.
+
+Measures the cold start import time of every Lambda handler. Each handler
+module is imported in a fresh interpreter with `python -X importtime`, the
+same way Lambda loads it, and the total and slowest imports are reported.
+
+    python benchmarks/import_time.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# handler directory and module, as deployed by serverless.yml
+HANDLERS = (
+    ('src/notifier', 'main'),
+    ('src/notifier', 'digest'),
+    ('src/access_key_auto_rotation', 'main'),
+    ('src/access_key_auto_rotation', 'event_handler'),
+    ('src', 'account_inventory'),
+)
+
+# required configuration without a default in the handlers
+ENVIRONMENT = {
+    'ROTATION_PERIOD': '90',
+    'INSTALLATION_GRACE_PERIOD': '10',
+    'RECOVERY_GRACE_PERIOD': '10',
+    'PENDING_ACTION_WARN_PERIOD': '7',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+}
+
+
+def measure_imports(directory, module):
+    """
+    Imports a handler module in a fresh interpreter.
+
+    :return Dictionary of imported module name to cumulative microseconds.
+    """
+    env = dict(ENVIRONMENT, **os.environ)
+    # compiled modules would hide the cost of a fresh deployment
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.join(ROOT, directory), env=env, capture_output=True,
+        text=True, check=True)
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.setdefault(name.strip(), int(cumulative))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5,
+                        help='imports per handler, the median is reported')
+    parser.add_argument('--top', type=int, default=10,
+                        help='slowest imports listed per handler')
+    args = parser.parse_args()
+
+    for directory, module in HANDLERS:
+        runs = [measure_imports(directory, module) for _ in range(args.runs)]
+        total = statistics.median(run[module] for run in runs) / 1000
+        print(f'{directory}/{module}.py: {total:.1f} ms')
+
+        slowest = sorted(((cumulative, name) for name, cumulative
+                          in runs[-1].items() if name != module),
+                         reverse=True)
+        for cumulative, name in slowest[:args.top]:
+            print(f'    {cumulative / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
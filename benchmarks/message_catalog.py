@@ -0,0 +1,113 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Message Catalog.
+
+Measures formatting the notification messages of a large action queue. The
+message catalog is compared with the frozen f-string messages it replaced,
+which the message catalog test checks it against, on the same random mix of
+actions, warnings and failures.
+
+    python benchmarks/message_catalog.py [--actions 100000] [--runs 5]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# required configuration without a default in the rotation function
+ENVIRONMENT = {
+    'ROTATION_PERIOD': '90',
+    'INSTALLATION_GRACE_PERIOD': '10',
+    'RECOVERY_GRACE_PERIOD': '10',
+    'PENDING_ACTION_WARN_PERIOD': '7',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+}
+
+
+def make_actions(count, now):
+    """
+    Builds a random action queue, with every twentieth executed action
+    failed.
+
+    :return Tuple of the action queue and the errors by id of action.
+    """
+    from key_policy import ActionReasons
+    from key_records import ActionKind, KeyAction, KeyRecord
+
+    rng = random.Random(1)
+    kinds = list(ActionKind)
+    reasons = list(ActionReasons)
+    warned_reasons = [reason for reason in reasons
+                      if 'PENDING' in reason.name]
+    actions = []
+    action_errors = {}
+    for i in range(count):
+        key = KeyRecord(f'user{i}', f'AKIA{i:016d}', True, now, None, now)
+        kind = rng.choice(kinds)
+        if kind == ActionKind.WARN:
+            action = KeyAction(kind, key, rng.choice(warned_reasons),
+                               now + datetime.timedelta(
+                                   days=rng.randint(1, 7)))
+        else:
+            action = KeyAction(kind, key, rng.choice(reasons))
+            if rng.random() < 0.05:
+                action_errors[id(action)] = 'AccessDenied'
+        actions.append(action)
+    return actions, action_errors
+
+
+def best_of(runs, function):
+    """
+    Runs a function several times.
+
+    :return Tuple of the fastest seconds and the result of the last run.
+    """
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--actions', type=int, default=100000,
+                        help='actions in the queue')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='runs per formatter, the fastest is reported')
+    args = parser.parse_args()
+
+    for name, value in ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    sys.path[:0] = [os.path.join(ROOT, 'src', 'access_key_auto_rotation'),
+                    os.path.join(ROOT, 'tests')]
+    from legacy_messages import format_action_message
+    from message_catalog import get_catalog
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    actions, action_errors = make_actions(args.actions, now)
+    for dryrun in (False, True):
+        legacy_seconds, legacy_messages = best_of(args.runs, lambda: [
+            format_action_message(action, dryrun, action_errors, now)
+            for action in actions])
+        catalog_seconds, catalog_messages = best_of(args.runs, lambda: list(
+            get_catalog('en').format_actions(actions, dryrun, action_errors,
+                                             now)))
+        if catalog_messages != legacy_messages:
+            sys.exit('The message catalog formats different messages.')
+        print(f'dryrun={dryrun}: f-strings {legacy_seconds * 1000:.0f} ms,'
+              f' message catalog {catalog_seconds * 1000:.0f} ms'
+              f' ({len(actions)} actions)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Account Run.
+
+This module provides the steps shared by the scheduled and the event driven
+entry points once the actions of an account are known: executing them,
+notifying the account owner and summarizing the run.
+"""
+
+import datetime
+import time
+
+from config import Config
+from state_store import record_action_results
+from notification_handler import send_to_notifier
+from key_actions import log_actions, execute_actions
+from key_records import ActionKind
+
+config = Config()
+
+
+def get_account_summary(aws_account_id, action_queue, dryrun, start,
+                        action_results=()):
+    """Counts the actions taken on an account for fleet level reporting.
+
+    :return Dictionary summary of the account run.
+    """
+    failed_actions = {id(result['action_spec']) for result in action_results
+                      if result['error']}
+    counts = dict.fromkeys(ActionKind, 0)
+    for key_action in action_queue:
+        if id(key_action) not in failed_actions:
+            counts[key_action.kind] += 1
+    return {
+        'account': aws_account_id,
+        'dryrun': dryrun,
+        'keys_rotated': counts[ActionKind.ROTATE],
+        'keys_deactivated': counts[ActionKind.DEACTIVATE],
+        'keys_deleted': counts[ActionKind.DELETE],
+        'warnings': counts[ActionKind.WARN],
+        'actions_failed': len(failed_actions),
+        'error': None,
+        'duration_ms': int((time.monotonic() - start) * 1000)
+    }
+
+
+def apply_actions(context, run_context, account_name, account_email,
+                  action_queue, dryrun):
+    """Executes the actions of an account, unless in dryrun, and notifies
+    the account owner.
+
+    :return List of action results, empty in dryrun.
+    """
+    aws_account_id = run_context.account_id
+    action_results = []
+    if action_queue:
+        log_actions(action_queue, dryrun)
+        if dryrun:
+            send_to_notifier(context, aws_account_id, account_name, account_email,
+                             action_queue, dryrun, config.emailTemplateAudit)
+        else:
+            action_results = execute_actions(action_queue, run_context)
+            record_action_results(
+                run_context, action_results,
+                datetime.datetime.now(tz=datetime.timezone.utc))
+            send_to_notifier(context, aws_account_id, account_name, account_email,
+                             action_queue, dryrun, config.emailTemplateEnforce,
+                             action_results)
+    return action_results
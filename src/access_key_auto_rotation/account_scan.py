@@ -3,743 +3,261 @@
 # https://aws.amazon.com/agreement/ or other written agreement between Customer
 # and Amazon Web Services, Inc.
 
-"""Key Actions - Mapping of Action Reasons.
+"""Account Scan.
 
-This class provides the mappings to different key
-rotation logic actions.
+This module provides the functionality to list the users and access keys
+of an account and evaluate them against the key rotation policy.
 """
 
 import datetime
-import dateutil.tz
 
-from enum import Enum
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from config import Config, log
+from key_policy import KeyBatch, evaluate_batch, get_next_check
+from key_records import KeyRecord
 from exemption_handler import validate_exemption_group
-
-
-class ActionReasons(Enum):
-    UNUSED_EXPIRED_KEY = 'Expired key has never been used.'
-    EXPIRED_ACTIVE_KEY = 'Active key has expired.'
-    FORCED_ROTATION = 'Forced active key rotation.'
-    EXPIRED_ACTIVE_KEY_CONFLICT_LRU = 'Expired active key with conflict, ' \
-                                      'least recently used.'
-    EXPIRED_INACTIVE_KEY_CONFLICT = 'Expired key with conflict, already ' \
-                                    'inactive.'
-    FORCED_ROTATION_CONFLICT_LRU = 'Forced active key rotation with conflict, ' \
-                                   'least recently used.'
-    FORCED_INACTIVE_KEY_CONFLICT = 'Forced rotation with conflict, already ' \
-                                   'inactive.'
-    INSTALL_GRACE_PERIOD_END = 'Installation grace period has ended.'
-    RECOVER_GRACE_PERIOD_END = 'Recovery grace period has ended.'
-    KEY_PENDING_ROTATION = 'Key will be rotated soon.'
-    KEY_PENDING_DEACTIVATION = 'Key will be deactivated soon, ' \
-                               'please install new key.'
-    KEY_PENDING_DELETION = 'Key will be permanently deleted soon, ' \
-                           'please validate new key.'
-    KEY_PENDING_EXPIRATION_CONFLICT = 'Key will expire soon, cannot be ' \
-                                      'rotated due to presence of other key.'
-    KEY_PENDING_DELETION_CONFLICT = 'Key will be permanently deleted soon, ' \
-                                    'due to conflict.'
-    UNUSED_KEY_PENDING_DELETION = 'Key will be permanently deleted soon, ' \
-                                  'key is about to expire and has never' \
-                                  ' been used.'
-
-
-def get_actions_for_keys(access_key_metadata, account_session,
-                         force_rotate):
-
+from throttling import TokenBucket
+from credential_report import get_credential_report, \
+    get_report_last_used_date
+from state_store import is_user_current, get_user_state
+from user_filter import iter_filtered_users
+from capabilities import CREDENTIAL_REPORT_ACTIONS
+
+
+def get_last_used_date(key, iam_client, limiter, report_keys=None):
+    # prefer the credential report, fall back to the key itself
+    last_used_date = get_report_last_used_date(key, report_keys)
+    if last_used_date is not None:
+        return last_used_date
+
+    # API errors are raised, only a missing date means the key is unused
+    try:
+        return limiter.call(
+            iam_client.get_access_key_last_used,
+            AccessKeyId=key['AccessKeyId']
+            )['AccessKeyLastUsed']['LastUsedDate']
+    except KeyError:
+        log.info(f"--Key {key['AccessKeyId']} has not been used before.")
+        return None
+
+
+def get_key_records_for_user(user_name, iam_client, limiter, rotation_period,
+                             report_keys=None, user_state=None):
+    """
+    Lists the access keys of a user along with their last used dates, and
+    the deactivation dates recorded in the stored state of the user.
+
+    :return List of KeyRecords of the user.
+    """
+    stored_keys = user_state['keys'] if user_state else {}
+    access_key_metadata = limiter.call(
+        iam_client.list_access_keys, UserName=user_name)['AccessKeyMetadata']
+    return [KeyRecord.from_metadata(
+                key,
+                get_last_used_date(key, iam_client, limiter, report_keys),
+                rotation_period,
+                stored_keys.get(key['AccessKeyId'], {}).get('deactivate_date'))
+            for key in access_key_metadata]
+
+
+def get_actions_for_keys(key_records, force_rotate):
+    """
+    Evaluates the keys of a single user against the rotation policy.
+
+    :return List of KeyActions for the keys.
+    """
     config = Config()
-    action_queue = []
-    keys = []
-
-    iam_client = account_session.client('iam')
-
-    # Cache current time to avoid race conditions
-    now = datetime.datetime.now(tz=dateutil.tz.gettz('US/Eastern'))
-    warn_period = datetime.timedelta(days=config.pending_action_warn_period)
-    installation_grace_period = datetime.timedelta(
-                days=config.installation_grace_period)
-    recovery_grace_period = datetime.timedelta(
-                days=config.recovery_grace_period)
-
-    for key in access_key_metadata:
-        # Populate lastused and expiration dates
-        try:
-            key['LastUsedDate'] = iam_client.get_access_key_last_used(
-                AccessKeyId=key['AccessKeyId']
-                )['AccessKeyLastUsed']['LastUsedDate']
-        except:
-            log.info("--Key has not been used before.")
-            key['LastUsedDate'] = None
-            
-        key['ExpireDate'] = key['CreateDate'] + \
-            datetime.timedelta(days=config.rotationPeriod)
-        
-        # TODO: If we stored state in dynamo, we would fetch the RotateDate
-        #  and the DeactivateDate here instead of dynamically computing them
-
-        # if the key is expired and has never been used, just delete it
-        if key['LastUsedDate'] is None \
-                and key['ExpireDate'] <= now:
-            reason = ActionReasons.UNUSED_EXPIRED_KEY
-            log.info(
-                f'DELETE {key["UserName"]}: {key["AccessKeyId"]} '
-                f'-- {reason.value}')
-            action_queue.append({
-                'action': 'DELETE',
-                'key': key,
-                'reason': reason
-            })
-            continue
-
-        # if the key is about to expire and has never been used, warn
-        if key['LastUsedDate'] is None \
-                and key['ExpireDate'] <= now + warn_period:
-            reason = ActionReasons.UNUSED_KEY_PENDING_DELETION
-            log.info(
-                f'WARN {key["UserName"]}: {key["AccessKeyId"]} '
-                f'-- {reason.value}')
-            action_queue.append({
-                'action': 'WARN',
-                'action_date': key['ExpireDate'],
-                'key': key,
-                'reason': reason
-            })
-
-        keys.append(key)
-
-    if len(keys) == 0:
-        log.info('Skipping, no keys to evaluate.')
-        pass
-
-    elif len(keys) == 1:
-        key = keys[0]
-
-        if key['Status'] == 'Active':
-            log.info('--Key Logic: [Active, Null]')
-            # rotate expiring key
-            if key['ExpireDate'] <= now:
-                reason = ActionReasons.EXPIRED_ACTIVE_KEY
-                # key is expired and needs to be rotated
-                log.info(
-                    f'ROTATE {key["UserName"]}: {key["AccessKeyId"]}'
-                    f'-- {reason.value}')
-                action_queue.append({
-                    'action': 'ROTATE',
-                    'key': key,
-                    'reason': reason
-                })
-            # or force rotate key
-            elif force_rotate:
-                reason = ActionReasons.FORCED_ROTATION
-                # key is force rotated
-                log.info(
-                    f'ROTATE {key["UserName"]}: {key["AccessKeyId"]}'
-                    f'-- {reason.value}')
-                action_queue.append({
-                    'action': 'ROTATE',
-                    'key': key,
-                    'reason': reason
-                })
-            # warn if key is about to expire
-            elif key['ExpireDate'] <= now + warn_period:
-                reason = ActionReasons.KEY_PENDING_ROTATION
-                log.info(
-                    f'WARN {key["UserName"]}: {key["AccessKeyId"]}'
-                    f'-- {reason.value}')
-                action_queue.append({
-                    'action': 'WARN',
-                    'action_date': key['ExpireDate'],
-                    'key': key,
-                    'reason': reason
-                })
-
-        elif key['Status'] != 'Active':
-            log.info('--Key Logic: [Inactive, Null]')
-            # all we can do here is calculate grace period based on creation
-            rotation_date = key['CreateDate']
-            delete_date = rotation_date + \
-                          installation_grace_period + \
-                          recovery_grace_period
-
-            # recovery period has ended
-            if delete_date <= now:
-                reason = ActionReasons.RECOVER_GRACE_PERIOD_END
-                log.info(
-                    f'DELETE {key["UserName"]}: '
-                    f'{key["AccessKeyId"]} '
-                    f'-- {reason.value}')
-                action_queue.append({
-                    'action': 'DELETE',
-                    'key': key,
-                    'reason': reason
-                })
-            # warn of pending deletion
-            elif delete_date <= now + warn_period:
-                reason = ActionReasons.KEY_PENDING_DELETION
-                log.info(
-                    f'WARN {key["UserName"]}: {key["AccessKeyId"]}'
-                    f'-- {reason.value}')
-                action_queue.append({
-                    'action': 'WARN',
-                    'action_date': delete_date,
-                    'key': key,
-                    'reason': reason
-                })
-            # nothing to do, key is valid
-            else:
-                log.info('Skipping, key is valid.')
-                pass
-
-    elif len(keys) == 2:
-        num_active = len([k for k in keys if k['Status'] == 'Active'])
-        if num_active == 0:
-            log.info('--Key Logic: [Inactive,Inactive]')
-            num_expired = len([k for k in keys if k['ExpireDate'] <= now])
-
-            if num_expired == 2:
-                # both keys are inactive and expired, just delete them
-                for key in keys:
-                    reason = ActionReasons.RECOVER_GRACE_PERIOD_END
-                    log.info(
-                        f'DELETE {key["UserName"]}: '
-                        f'{key["AccessKeyId"]} '
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'DELETE',
-                        'key': key,
-                        'reason': reason
-                    })
-            elif num_expired == 1:
-                # maybe someone deactivated the new key accidentally?
-                # respect the recovery grace period on the inactive key
-                inactive_keys_by_create_date = sorted(
-                    keys, key=lambda x: x['CreateDate'])
-                expired_key = inactive_keys_by_create_date[0]
-                unexpired_key = inactive_keys_by_create_date[1]
-                # use the creation date of the unexpired key
-                # to guess when the expired key was deactivated
-                expired_key_rotation_date = unexpired_key['CreateDate']
-                expired_key_delete_date = \
-                    expired_key_rotation_date + \
-                    installation_grace_period + \
-                    recovery_grace_period
-                unexpired_key_rotation_date = unexpired_key['ExpireDate']
-
-                # delete the expired key if grace period is over
-                if expired_key_delete_date <= now:
-                    reason = ActionReasons.RECOVER_GRACE_PERIOD_END
-                    log.info(
-                        f'DELETE {expired_key["UserName"]}: '
-                        f'{expired_key["AccessKeyId"]} '
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'DELETE',
-                        'key': expired_key,
-                        'reason': reason
-                    })
-                    # warn if other key is about to be rotated
-                    if unexpired_key_rotation_date <= now + warn_period:
-                        rotate_reason = ActionReasons.KEY_PENDING_ROTATION
-                        log.info(
-                            f'WARN {unexpired_key["UserName"]}: '
-                            f'{unexpired_key["AccessKeyId"]}'
-                            f'-- {rotate_reason.value}')
-                        action_queue.append({
-                            'action': 'WARN',
-                            'action_date': unexpired_key_rotation_date,
-                            'key': unexpired_key,
-                            'reason': rotate_reason
-                        })
-
-                # also warn if unexpired key is about to expire and be rotated
-                # expired will be deleted due to conflict
-                elif unexpired_key_rotation_date <= now + warn_period:
-                    delete_reason = ActionReasons.KEY_PENDING_DELETION_CONFLICT
-                    rotate_reason = ActionReasons.KEY_PENDING_ROTATION
-                    log.info(
-                        f'WARN {expired_key["UserName"]}: '
-                        f'{expired_key["AccessKeyId"]}'
-                        f'-- {delete_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': unexpired_key_rotation_date,
-                        'key': expired_key,
-                        'reason': delete_reason
-                    })
-                    log.info(
-                        f'WARN {unexpired_key["UserName"]}: '
-                        f'{unexpired_key["AccessKeyId"]}'
-                        f'-- {rotate_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': unexpired_key_rotation_date,
-                        'key': unexpired_key,
-                        'reason': rotate_reason
-                    })
-
-                # warn if the grace period is about to end
-                elif expired_key_delete_date <= now + warn_period:
-                    reason = ActionReasons.KEY_PENDING_DELETION
-                    log.info(
-                        f'WARN {expired_key["UserName"]}: '
-                        f'{expired_key["AccessKeyId"]}'
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': expired_key_delete_date,
-                        'key': expired_key,
-                        'reason': reason
-                    })
-
-            else:
-                # nothing to do, both keys have not expired
-                # pending expirations don't need warnings,
-                # nothing will change until end of grace period
-                log.info('Skipping, keys are both valid.')
-
-        elif num_active == 1:
-            # we have a key in the recycle bin, waiting to be deleted
-            log.info('--Key Logic: [Active, Inactive]')
-            if keys[0]['Status'] == 'Active':
-                active_key = keys[0]
-                inactive_key = keys[1]
-            else:
-                active_key = keys[1]
-                inactive_key = keys[0]
-
-            active_key_rotate_date = active_key['ExpireDate']
-
-            if active_key_rotate_date <= now:
-                # the edge case where the active key is expired
-                # we should only encounter this on first deploy
-                # we have to delete the inactive one
-                # so we can rotate the active one
-                delete_reason = ActionReasons.EXPIRED_INACTIVE_KEY_CONFLICT
-                rotate_reason = ActionReasons.EXPIRED_ACTIVE_KEY
-                log.info(
-                    f'DELETE {inactive_key["UserName"]}: '
-                    f'{inactive_key["AccessKeyId"]} '
-                    f'-- {delete_reason.value}')
-                log.info(
-                    f'ROTATE {active_key["UserName"]}: '
-                    f'{active_key["AccessKeyId"]} '
-                    f'-- {rotate_reason.value}')
-                action_queue.append({
-                    'action': 'DELETE',
-                    'key': inactive_key,
-                    'reason': delete_reason
-                })
-                action_queue.append({
-                    'action': 'ROTATE',
-                    'key': active_key,
-                    'reason': delete_reason
-                })
-
-            # force rotate the active key, must delete inactive key
-            elif force_rotate:
-                delete_reason = ActionReasons.FORCED_INACTIVE_KEY_CONFLICT
-                rotate_reason = ActionReasons.FORCED_ROTATION
-                log.info(
-                    f'DELETE {inactive_key["UserName"]}: '
-                    f'{inactive_key["AccessKeyId"]} '
-                    f'-- {delete_reason.value}')
-                log.info(
-                    f'ROTATE {active_key["UserName"]}: '
-                    f'{active_key["AccessKeyId"]} '
-                    f'-- {rotate_reason.value}')
-                action_queue.append({
-                    'action': 'DELETE',
-                    'key': inactive_key,
-                    'reason': delete_reason
-                })
-                action_queue.append({
-                    'action': 'ROTATE',
-                    'key': active_key,
-                    'reason': delete_reason
-                })
-            else:
-                # check if the recovery grace period on the inactive key has passed
-                # the trick here is that we use the creation date of the active key
-                # to guess when the inactive key was deactivated
-                if inactive_key['LastUsedDate'] is not None:
-                    # if the key has a more recent last used date use that instead
-                    rotation_date = max([active_key['CreateDate'],
-                                         inactive_key['LastUsedDate']])
-                else:
-                    rotation_date = active_key['CreateDate']
-                inactive_key_delete_date = rotation_date + \
-                                           installation_grace_period + \
-                                           recovery_grace_period
-
-                # delete inactive key if grace period is over
-                if inactive_key_delete_date <= now:
-                    reason = ActionReasons.RECOVER_GRACE_PERIOD_END
-                    log.info(
-                        f'DELETE {inactive_key["UserName"]}: '
-                        f'{inactive_key["AccessKeyId"]} '
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'DELETE',
-                        'key': inactive_key,
-                        'reason': reason
-                    })
-                    # warn if active key is about to be rotated
-                    if active_key_rotate_date <= now + warn_period:
-                        reason = ActionReasons.KEY_PENDING_ROTATION
-                        log.info(
-                            f'WARN {active_key["UserName"]}: '
-                            f'{active_key["AccessKeyId"]}'
-                            f'-- {reason.value}')
-                        action_queue.append({
-                            'action': 'WARN',
-                            'action_date': active_key_rotate_date,
-                            'key': active_key,
-                            'reason': reason
-                        })
-
-                # also warn if active key is about to expire
-                # inactive key will be deleted due to conflict
-                elif active_key_rotate_date <= now + warn_period:
-                    delete_reason = ActionReasons.KEY_PENDING_DELETION_CONFLICT
-                    rotate_reason = ActionReasons.KEY_PENDING_ROTATION
-                    log.info(
-                        f'WARN {inactive_key["UserName"]}: '
-                        f'{inactive_key["AccessKeyId"]}'
-                        f'-- {delete_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': active_key_rotate_date,
-                        'key': inactive_key,
-                        'reason': delete_reason
-                    })
-                    log.info(
-                        f'WARN {active_key["UserName"]}: '
-                        f'{active_key["AccessKeyId"]}'
-                        f'-- {rotate_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': active_key_rotate_date,
-                        'key': active_key,
-                        'reason': rotate_reason
-                    })
-
-                # warn if inactive key is about to expire
-                elif inactive_key_delete_date <= now + warn_period:
-                    reason = ActionReasons.KEY_PENDING_DELETION
-                    log.info(
-                        f'WARN {inactive_key["UserName"]}: '
-                        f'{inactive_key["AccessKeyId"]}'
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': inactive_key_delete_date,
-                        'key': inactive_key,
-                        'reason': reason
-                    })
-
-        elif num_active == 2:
-            log.info('--Key Logic: [Active, Active]')
-            # This means that either a key has been rotated and we are in the
-            # install period, or it means that the user has two active keys that
-            # need to be evaluated
-
-            num_expired = len([k for k in keys if k['ExpireDate'] <= now])
-
-            if num_expired == 2:
-                # This is the catch 22, we have to pick one key to deactivate
-                # both are expired and both have been used
-                # we have no way to track the grace period if both keys are expired
-                # we have to delete one and rotate the other
-
-                delete_reason = ActionReasons.EXPIRED_ACTIVE_KEY_CONFLICT_LRU
-                rotate_reason = ActionReasons.EXPIRED_ACTIVE_KEY
-
-                # we choose to delete the least recently used key
-                if keys[0]['LastUsedDate'] and keys[1]['LastUsedDate']:
-                    lru_keys = sorted(keys, key=lambda x: x['LastUsedDate'])
-                    key_to_delete = lru_keys[0]
-                    key_to_rotate = lru_keys[1]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}]:"
-                             f"[{key_to_delete['LastUsedDate']}] was last used "
-                             f"before Key [{key_to_rotate['AccessKeyId']}]:"
-                             f"[{key_to_rotate['LastUsedDate']}].")
-                # or the one that hasn't ever been used
-                elif keys[0]['LastUsedDate']:
-                    key_to_delete = keys[1]
-                    key_to_rotate = keys[0]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}] "
-                             f"has never been used.")
-                elif keys[1]['LastUsedDate']:
-                    key_to_delete = keys[0]
-                    key_to_rotate = keys[1]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}] "
-                             f"has never been used.")
-                # or the one that was created first if none have been used
-                elif keys[0]['CreateDate'] <= keys[1]['CreateDate']:
-                    key_to_delete = keys[0]
-                    key_to_rotate = keys[1]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}]:"
-                             f"[{key_to_delete['CreateDate']}] is older "
-                             f"than Key [{key_to_rotate['AccessKeyId']}]:"
-                             f"[{key_to_rotate['CreateDate']}].")
-                else:
-                    key_to_delete = keys[1]
-                    key_to_rotate = keys[0]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}]:"
-                             f"[{key_to_delete['CreateDate']}] is older "
-                             f"than Key [{key_to_rotate['AccessKeyId']}]:"
-                             f"[{key_to_rotate['CreateDate']}].")
-
-                log.info(
-                    f'DELETE {key_to_delete["UserName"]}: '
-                    f'{key_to_delete["AccessKeyId"]} '
-                    f'-- {delete_reason.value}')
-                log.info(
-                    f'ROTATE {key_to_rotate["UserName"]}: '
-                    f'{key_to_rotate["AccessKeyId"]} '
-                    f'-- {rotate_reason.value}')
-                action_queue.append({
-                    'action': 'DELETE',
-                    'key': key_to_delete,
-                    'reason': delete_reason
-                })
-                action_queue.append({
-                    'action': 'ROTATE',
-                    'key': key_to_rotate,
-                    'reason': rotate_reason
-                })
-
-            # force rotate, so we need to delete LRU key same as above
-            elif force_rotate:
-                delete_reason = ActionReasons.FORCED_ROTATION_CONFLICT_LRU
-                rotate_reason = ActionReasons.FORCED_ROTATION
-
-                # we choose to delete the least recently used key
-                if keys[0]['LastUsedDate'] and keys[1]['LastUsedDate']:
-                    lru_keys = sorted(keys, key=lambda x: x['LastUsedDate'])
-                    key_to_delete = lru_keys[0]
-                    key_to_rotate = lru_keys[1]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}]:"
-                             f"[{key_to_delete['LastUsedDate']}] was last used "
-                             f"before Key [{key_to_rotate['AccessKeyId']}]:"
-                             f"[{key_to_rotate['LastUsedDate']}].")
-                # or the one that hasn't ever been used
-                elif keys[0]['LastUsedDate']:
-                    key_to_delete = keys[1]
-                    key_to_rotate = keys[0]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}] "
-                             f"has never been used.")
-                elif keys[1]['LastUsedDate']:
-                    key_to_delete = keys[0]
-                    key_to_rotate = keys[1]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}] "
-                             f"has never been used.")
-                # or the one that was created first if none have been used
-                elif keys[0]['CreateDate'] <= keys[1]['CreateDate']:
-                    key_to_delete = keys[0]
-                    key_to_rotate = keys[1]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}]:"
-                             f"[{key_to_delete['CreateDate']}] is older "
-                             f"than Key [{key_to_rotate['AccessKeyId']}]:"
-                             f"[{key_to_rotate['CreateDate']}].")
-                else:
-                    key_to_delete = keys[1]
-                    key_to_rotate = keys[0]
-                    log.info(f"--Key [{key_to_delete['AccessKeyId']}]:"
-                             f"[{key_to_delete['CreateDate']}] is older "
-                             f"than Key [{key_to_rotate['AccessKeyId']}]:"
-                             f"[{key_to_rotate['CreateDate']}].")
+    batch = KeyBatch()
+    user_name = key_records[0].user_name if key_records else None
+    batch.add_user(user_name, key_records, force_rotate)
+    return evaluate_batch(
+        batch, datetime.datetime.now(tz=datetime.timezone.utc), config)
+
+
+def iter_users(iam_client, page_size):
+    """
+    Lists the users of an account one page at a time.
+
+    :return Generator of IAM users.
+    """
+    paginator = iam_client.get_paginator('list_users')
+    for page in paginator.paginate(PaginationConfig={'PageSize': page_size}):
+        yield from page['Users']
+
+
+def map_ordered(executor, fn, iterable, window):
+    """
+    Maps fn over iterable on the executor while keeping at most window
+    calls in flight, so the iterable is consumed lazily.
+
+    :return Generator of (item, result) tuples in the order of iterable.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def get_scanned_user_state(user_name, key_records, has_actions, now, config):
+    """
+    Builds the state of a user that was just scanned. Users with actions
+    are evaluated again on the next run.
+
+    :return Dict user state.
+    """
+    if has_actions:
+        next_check = now
+    else:
+        next_check = get_next_check(key_records, now, config)
+    return get_user_state(user_name, key_records, next_check)
 
-                log.info(
-                    f'DELETE {key_to_delete["UserName"]}: '
-                    f'{key_to_delete["AccessKeyId"]} '
-                    f'-- {delete_reason.value}')
-                log.info(
-                    f'ROTATE {key_to_rotate["UserName"]}: '
-                    f'{key_to_rotate["AccessKeyId"]} '
-                    f'-- {rotate_reason.value}')
-                action_queue.append({
-                    'action': 'DELETE',
-                    'key': key_to_delete,
-                    'reason': delete_reason
-                })
-                action_queue.append({
-                    'action': 'ROTATE',
-                    'key': key_to_rotate,
-                    'reason': rotate_reason
-                })
-
-            elif num_expired == 1:
-                # only one expired
-                if keys[0]['ExpireDate'] <= now:
-                    expired_key = keys[0]
-                    unexpired_key = keys[1]
-                else:
-                    expired_key = keys[1]
-                    unexpired_key = keys[0]
-
-                # we assume the creation date of the other key
-                # is the date the key was rotated
-                expired_key_rotation_date = unexpired_key['CreateDate']
-                expired_key_deactivation_date = expired_key_rotation_date + \
-                                                installation_grace_period
-                unexpired_key_rotation_date = unexpired_key['ExpireDate']
-
-                # deactivate the expired key if the grace period is ended
-                if expired_key_deactivation_date <= now:
-                    reason = ActionReasons.INSTALL_GRACE_PERIOD_END
-                    log.info(
-                        f'DEACTIVATE {expired_key["UserName"]}: '
-                        f'{expired_key["AccessKeyId"]} '
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'DEACTIVATE',
-                        'key': expired_key,
-                        'reason': reason
-                    })
-                    # warn if the unexpired key is about to expire
-                    if unexpired_key_rotation_date <= now + warn_period:
-                        reason = ActionReasons.KEY_PENDING_ROTATION
-                        log.info(
-                            f'WARN {unexpired_key["UserName"]}: '
-                            f'{unexpired_key["AccessKeyId"]}'
-                            f'-- {reason.value}')
-                        action_queue.append({
-                            'action': 'WARN',
-                            'action_date': unexpired_key_rotation_date,
-                            'key': unexpired_key,
-                            'reason': reason
-                        })
-
-                # warn if the unexpired key is about to be rotated
-                # the expired key will be deleted due to conflict
-                elif unexpired_key_rotation_date <= now + warn_period:
-                    delete_reason = ActionReasons.KEY_PENDING_DELETION_CONFLICT
-                    rotate_reason = ActionReasons.KEY_PENDING_ROTATION
-                    log.info(
-                        f'WARN {expired_key["UserName"]}: '
-                        f'{expired_key["AccessKeyId"]}'
-                        f'-- {delete_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': unexpired_key_rotation_date,
-                        'key': expired_key,
-                        'reason': delete_reason
-                    })
-                    log.info(
-                        f'WARN {unexpired_key["UserName"]}: '
-                        f'{unexpired_key["AccessKeyId"]}'
-                        f'-- {rotate_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': unexpired_key_rotation_date,
-                        'key': unexpired_key,
-                        'reason': rotate_reason
-                    })
-
-                # warn if the expired key is about to be deactivated
-                elif expired_key_deactivation_date <= now + warn_period:
-                    reason = ActionReasons.KEY_PENDING_DEACTIVATION
-                    log.info(
-                        f'WARN {expired_key["UserName"]}: '
-                        f'{expired_key["AccessKeyId"]}'
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': expired_key_deactivation_date,
-                        'key': expired_key,
-                        'reason': reason
-                    })
-
-            elif num_expired == 0:
-                log.info('Keys are both valid.')
-                # it's harder than it seems to warn of pending actions
-                keys_by_expire_date = sorted(
-                    keys, key=lambda x: x['ExpireDate'])
-                older_key = keys_by_expire_date[0]
-                newer_key = keys_by_expire_date[1]
-                older_key_expire_date = older_key['ExpireDate']
-                newer_key_rotation_date = newer_key['ExpireDate']
-
-                # warn if newer key is about to expire
-                # older will be deleted due to conflict
-                if newer_key_rotation_date <= now + warn_period:
-                    delete_reason = ActionReasons.KEY_PENDING_DELETION_CONFLICT
-                    rotate_reason = ActionReasons.KEY_PENDING_ROTATION
-                    log.info(
-                        f'WARN {older_key["UserName"]}: '
-                        f'{older_key["AccessKeyId"]}'
-                        f'-- {delete_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': newer_key_rotation_date,
-                        'key': older_key,
-                        'reason': delete_reason
-                    })
-                    log.info(
-                        f'WARN {newer_key["UserName"]}: '
-                        f'{newer_key["AccessKeyId"]}'
-                        f'-- {rotate_reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': newer_key_rotation_date,
-                        'key': newer_key,
-                        'reason': rotate_reason
-                    })
-
-                # warn if first key will expire
-                # it can't be rotated due to conflict
-                elif older_key_expire_date <= now + warn_period:
-                    reason = ActionReasons.KEY_PENDING_EXPIRATION_CONFLICT
-                    log.info(
-                        f'WARN {older_key["UserName"]}: '
-                        f'{older_key["AccessKeyId"]}'
-                        f'-- {reason.value}')
-                    action_queue.append({
-                        'action': 'WARN',
-                        'action_date': older_key_expire_date,
-                        'key': older_key,
-                        'reason': reason
-                    })
-
-    # Return compiled list of remediation options
-    return action_queue
 
+def save_scanned_users(run_context, stored_users, watermark, batch,
+                       action_queue, now, full_scan, targeted=False):
+    """
+    Stores the state of the scanned users, removes users that no longer
+    exist, records the time of a full scan and schedules the account for
+    the first user due or the next full scan, whichever comes first.
 
-def get_actions_for_account(account_session, force_rotate_users):
+    A targeted run did not list every user, so it only stores the scanned
+    users and moves the schedule of the account forward if needed.
+    """
     config = Config()
+    store = run_context.state_store
+
+    users_with_actions = {key_action.key.user_name
+                          for key_action in action_queue}
+    offsets = batch.user_offsets
+    user_states = []
+    for user, user_name in enumerate(batch.user_names):
+        user_state = get_scanned_user_state(
+            user_name, batch.keys[offsets[user]:offsets[user + 1]],
+            user_name in users_with_actions, now, config)
+        run_context.user_states[user_name] = user_state
+        user_states.append(user_state)
+    store.put_users(run_context.account_id, user_states)
+
+    if targeted:
+        next_checks = [user_state['next_check'] for user_state in user_states
+                       if user_state['next_check'] is not None]
+        if next_checks:
+            store.lower_next_due(run_context.account_id, min(next_checks))
+        log.info(f'Stored state of {len(user_states)} users.')
+        return
+
+    deleted_users = [user_name for user_name in stored_users
+                     if user_name not in run_context.user_arns]
+    if deleted_users:
+        store.delete_users(run_context.account_id, deleted_users)
+
+    if full_scan:
+        store.set_watermark(run_context.account_id, now)
+        watermark = now
+
+    next_due = watermark + datetime.timedelta(days=config.fullScanInterval)
+    for user_name, user_state in stored_users.items():
+        if user_name in run_context.user_arns:
+            user_state = run_context.user_states.get(user_name, user_state)
+            if user_state['next_check'] is not None:
+                next_due = min(next_due, user_state['next_check'])
+    for user_state in user_states:
+        if user_state['next_check'] is not None:
+            next_due = min(next_due, user_state['next_check'])
+    store.set_next_due(run_context.account_id, next_due)
+
+    log.info(f'Stored state of {len(user_states)} users, removed '
+             f'{len(deleted_users)} deleted users, account is due next at '
+             f'{next_due.isoformat()}.')
+
+
+def get_actions_for_account(run_context, force_rotate_users, reconcile=False,
+                            user_filter=None):
+    """
+    Scans the users of an account and evaluates their keys, or only the
+    users selected by user_filter.
+
+    :return List of KeyActions for the account.
+    """
+    config = Config()
+    targeted = user_filter is not None
 
-    # Initialize values
-    list_of_exempted_users = None
-    force_rotate_user = None
+    iam_client = run_context.clients.client('iam')
 
-    iam_client = account_session.client('iam')
+    # Shared by all scan workers to stay under the IAM request rate, its
+    # calls are made with a client that leaves throttling to the limiter
+    limiter = TokenBucket(config.iamRequestRate)
+    limited_iam_client = run_context.clients.limited_client('iam')
 
-    action_queue = []
+    # Keys of all users are evaluated together once the scan is done
+    batch = KeyBatch()
 
-    # Get all Users in AWS Account
-    users = iam_client.list_users()['Users']
-    if not users:
-        log.info('There are no users in this account.')
+    # Cache current time to avoid race conditions
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    # With a state store only users with a deadline coming up are scanned,
+    # until the next full scan is due
+    store = run_context.state_store
+    stored_users = {}
+    watermark = None
+    full_scan = True
+    if store is not None and targeted:
+        # selected users are always scanned, stored state is only needed
+        # for their recorded deactivation dates
+        full_scan = False
+    elif store is not None:
+        stored_users, watermark = store.get_account_state(
+            run_context.account_id)
+        full_scan = reconcile or watermark is None or now - watermark >= \
+            datetime.timedelta(days=config.fullScanInterval)
+        log.info(f'Loaded stored state of {len(stored_users)} users, '
+                 f'{"full" if full_scan else "incremental"} scan.')
+
+    # Check to see if an IAM Exemption Group exists in CloudFormation
+    # and within the Account.
+    exemption_group, exempted_users = validate_exemption_group(
+        config.iamExemptionGroup, iam_client, log)
+
+    # Use a single credential report for the key inventory if enabled
+    credential_report = None
+    if config.scanMode == 'credential_report' and not targeted:
+        if run_context.capabilities.allows(*CREDENTIAL_REPORT_ACTIONS):
+            credential_report = get_credential_report(
+                iam_client, config.credentialReportMaxAge)
+        else:
+            missing = run_context.capabilities.missing(
+                CREDENTIAL_REPORT_ACTIONS)
+            log.info(f'Credential report is not allowed, {missing} blocked.'
+                     f' Listing keys instead.')
+
+    log.info('Starting user loop.')
+    log.info('---------------------------')
+
+    total_users = 0
+    current_users = 0
+
+    if targeted:
+        log.info(f'Only evaluating users selected by {user_filter}.')
+        users = iter_filtered_users(limited_iam_client, limiter,
+                                    user_filter, config.iamPageSize)
     else:
-        # Check to see if an IAM Exemption Group exists in CloudFormation
-        # and within the Account.
-        exemption_group, list_of_exempted_users = validate_exemption_group(
-            config.iamExemptionGroup, iam_client, log)
-
-        total_users = len(users)
-
-        log.info(
-            f'Starting user loop. There are {total_users}'
-            f' users to evaluate in this account.')
-        log.info('---------------------------')
+        users = iter_users(iam_client, config.iamPageSize)
 
+    def users_to_scan():
+        """Yields the users whose keys need to be fetched."""
+        nonlocal total_users, current_users
         for user in users:
+            total_users += 1
             user_name = user['UserName']
+            run_context.user_arns[user_name] = user['Arn']
 
             # handle exemptions
-            if user_name in list_of_exempted_users:
+            if user_name in exempted_users:
                 log.info(
                     f'--User [{user_name} is exempt.'
                     f' Skipping validation check.')
@@ -761,14 +279,104 @@ def get_actions_for_account(account_session, force_rotate_users):
                     f' Force Rotate User = False.')
             else:
                 force_rotate_user = False
-                
-            access_key_metadata = iam_client.list_access_keys(
-                UserName=user["UserName"])['AccessKeyMetadata']
 
-            action_queue += get_actions_for_keys(
-                access_key_metadata, account_session,
-                force_rotate_user)
+            report_keys = None
+            if credential_report is not None:
+                report_keys = credential_report.get(user_name)
+                # users created after the report are not in it
+                if report_keys is not None and not report_keys:
+                    log.info(f'--User [{user_name}] has no access keys.')
+                    continue
+
+            if targeted:
+                user_state = store.get_user(run_context.account_id,
+                                            user_name) if store else None
+            else:
+                user_state = stored_users.get(user_name)
+            if not full_scan and not targeted and not force_rotate_user \
+                    and is_user_current(user_state, now, report_keys):
+                current_users += 1
+                continue
+
+            yield user_name, force_rotate_user, report_keys, user_state
+
+    # Fetch keys concurrently while users are still being listed, results
+    # come back in list_users order so the action queue is the same as for
+    # a serial scan
+    with ThreadPoolExecutor(max_workers=config.scanWorkers) as executor:
+        key_records_by_user = map_ordered(
+            executor,
+            lambda user: get_key_records_for_user(
+                user[0], limited_iam_client, limiter, config.rotationPeriod,
+                user[2], user[3]),
+            users_to_scan(), config.scanWorkers * 2)
+
+        for (user_name, force_rotate_user, _, _), key_records in \
+                key_records_by_user:
+            batch.add_user(user_name, key_records, force_rotate_user)
+
+    action_queue = evaluate_batch(batch, now, config)
+
+    if store is not None:
+        save_scanned_users(run_context, stored_users, watermark, batch,
+                           action_queue, now, full_scan, targeted)
+        log.info(f'Skipped {current_users} users without upcoming '
+                 f'deadlines.')
+
+    if not total_users:
+        log.info('There are no users in this account.')
+    else:
+        log.info(f'Evaluated {total_users} users in this account.')
 
     # TODO: clean up secrets for IAM users that no longer exist...
 
     return action_queue
+
+
+def get_actions_for_user(run_context, user_name):
+    """
+    Evaluates the keys of a single user, e.g. after a change to them, and
+    updates the stored state of the user and the schedule of the account.
+
+    :return List of KeyActions for the keys of the user.
+    """
+    config = Config()
+    iam_client = run_context.clients.client('iam')
+    limiter = TokenBucket(config.iamRequestRate)
+    limited_iam_client = run_context.clients.limited_client('iam')
+    store = run_context.state_store
+
+    exemption_group, exempted_users = validate_exemption_group(
+        config.iamExemptionGroup, iam_client, log)
+    if user_name in exempted_users:
+        log.info(f'--User [{user_name}] is exempt. Skipping validation check.')
+        return []
+
+    user_state = None
+    if store is not None:
+        user_state = store.get_user(run_context.account_id, user_name)
+
+    try:
+        key_records = get_key_records_for_user(
+            user_name, limited_iam_client, limiter, config.rotationPeriod,
+            user_state=user_state)
+    except limited_iam_client.exceptions.NoSuchEntityException:
+        log.info(f'--User [{user_name}] no longer exists.')
+        if store is not None:
+            store.delete_users(run_context.account_id, [user_name])
+        return []
+
+    log.info(f'--Evaluating keys for user [{user_name}].')
+    action_queue = get_actions_for_keys(key_records, False)
+
+    if store is not None:
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        user_state = get_scanned_user_state(
+            user_name, key_records, bool(action_queue), now, config)
+        run_context.user_states[user_name] = user_state
+        store.put_users(run_context.account_id, [user_state])
+        if user_state['next_check'] is not None:
+            store.lower_next_due(run_context.account_id,
+                                 user_state['next_check'])
+
+    return action_queue
@@ -9,51 +9,76 @@ This module grabs the environment partition
 and the endpoint resolver
 """
 
+import functools
 import re
-import boto3
 
-def _get_endpoint_resolver():
-    session = boto3._get_default_session()
-    endpoint_resolver = session._session._get_internal_component(
-        'endpoint_resolver')
-    return endpoint_resolver
+from botocore.loaders import create_loader
 
 
+@functools.lru_cache(maxsize=None)
+def _get_partition_index():
+    """
+    Builds the partition lookup tables from the botocore endpoint data once
+    per process.
+
+    :return Tuple of a region to partition dict, a partition to partition
+        details dict, and the precompiled region patterns of each partition.
+    """
+    endpoint_data = create_loader().load_data('endpoints')
+    regions = {}
+    partitions = {}
+    region_patterns = []
+    for partition in endpoint_data['partitions']:
+        partition_id = partition['partition']
+
+        iam_region = None
+        iam = partition['services'].get('iam', {})
+        if 'partitionEndpoint' in iam:
+            iam_region = iam['endpoints'][iam['partitionEndpoint']][
+                'credentialScope']['region']
+
+        partitions[partition_id] = {
+            'name': partition['partitionName'],
+            'iam_region': iam_region,
+            'regions': tuple(partition['regions'])
+        }
+        for region_name in partition['regions']:
+            regions.setdefault(region_name, partition_id)
+        if 'regionRegex' in partition:
+            region_patterns.append(
+                (re.compile(partition['regionRegex']), partition_id))
+    return regions, partitions, tuple(region_patterns)
+
+
+def _get_partition(partition_id):
+    partition = _get_partition_index()[1].get(partition_id)
+    if partition is None:
+        raise ValueError('Invalid partition: {0}'.format(partition_id))
+    return partition
+
+
+@functools.lru_cache(maxsize=None)
 def get_partition_for_region(region_name=None):
-    endpoint_resolver = _get_endpoint_resolver()
-    for partition in endpoint_resolver._endpoint_data['partitions']:
-        if region_name in partition['regions']:
-            return partition['partition']
-        if 'regionRegex' not in partition:
-            continue
-        if re.compile(partition['regionRegex']).match(region_name):
-            return partition['partition']
+    regions, _, region_patterns = _get_partition_index()
+    if region_name in regions:
+        return regions[region_name]
+    if region_name is not None:
+        for region_pattern, partition_id in region_patterns:
+            if region_pattern.match(region_name):
+                return partition_id
     raise ValueError('Invalid region name: {0}'.format(region_name))
 
 
 def get_partition_name(partition_id=None):
-    endpoint_resolver = _get_endpoint_resolver()
-    for partition in endpoint_resolver._endpoint_data['partitions']:
-        if partition_id == partition['partition']:
-            return partition['partitionName']
-    raise ValueError('Invalid partition: {0}'.format(partition_id))
+    return _get_partition(partition_id)['name']
 
 
 def get_iam_region(partition_id=None):
-    endpoint_resolver = _get_endpoint_resolver()
-    for partition in endpoint_resolver._endpoint_data['partitions']:
-        if partition_id == partition['partition']:
-            iam = partition['services']['iam']
-            partition_endpoint = iam['partitionEndpoint']
-            return iam['endpoints'][partition_endpoint]['credentialScope'][
-                'region']
-    raise ValueError('Invalid partition: {0}'.format(partition_id))
+    iam_region = _get_partition(partition_id)['iam_region']
+    if iam_region is None:
+        raise ValueError('Invalid partition: {0}'.format(partition_id))
+    return iam_region
 
 
 def get_partition_regions(partition_id=None):
-    endpoint_resolver = _get_endpoint_resolver()
-    for partition in endpoint_resolver._endpoint_data['partitions']:
-        if partition_id == partition['partition']:
-            regions = partition['regions'].keys()
-            return regions
-    raise ValueError('Invalid partition: {0}'.format(partition_id))
+    return _get_partition(partition_id)['regions']
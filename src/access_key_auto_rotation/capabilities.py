@@ -0,0 +1,129 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Capabilities.
+
+This module provides the actions the assumed role may use, as found by the
+permission check of the account inventory. Scheduled runs get the denied
+actions in their payload, event driven runs read them from the SSM
+parameter the inventory shares them in, so neither simulates them again.
+The inventory can only check the assumed role of the primary account, so
+runs of other accounts allow every action.
+"""
+
+import json
+import time
+
+from config import Config, log
+
+# Actions of the credential report scan mode
+CREDENTIAL_REPORT_ACTIONS = ('iam:GenerateCredentialReport',
+                             'iam:GetCredentialReport')
+
+# Actions that change keys or their secrets, without them a run can only
+# report what it would do
+KEY_ACTIONS = ('iam:CreateAccessKey', 'iam:UpdateAccessKey',
+               'iam:DeleteAccessKey', 'secretsmanager:CreateSecret',
+               'secretsmanager:PutSecretValue')
+
+# Capabilities read from the SSM parameter, as (time read, Capabilities)
+_parameter_cache = None
+
+
+class Capabilities:
+    """Actions the assumed role may use.
+
+    :param blocked: Actions the permission check found denied, every action
+        is allowed if empty
+    :param checked_at: Epoch seconds of the permission check, None if not
+        known
+    """
+
+    def __init__(self, blocked=(), checked_at=None):
+        self.blocked = frozenset(blocked)
+        self.checked_at = checked_at
+
+    @classmethod
+    def from_event(cls, event):
+        """
+        Builds the capabilities from the "blocked_actions" the account
+        inventory adds to the payload.
+
+        :return Capabilities of the run.
+        """
+        return cls(event.get('blocked_actions') or ())
+
+    def allows(self, *actions):
+        return self.blocked.isdisjoint(actions)
+
+    def missing(self, actions):
+        return sorted(self.blocked.intersection(actions))
+
+    def is_stale(self, max_age):
+        return self.checked_at is not None \
+            and time.time() - self.checked_at > max_age
+
+    def __repr__(self):
+        return f'Capabilities(blocked={sorted(self.blocked)!r})'
+
+
+def load_capabilities(account_id):
+    """
+    Reads the capabilities of the assumed role of the primary account from
+    PERMISSION_CACHE_PARAMETER, reusing them for PERMISSION_CACHE_TTL
+    seconds in a warm container. Checks older than PERMISSION_CHECK_MAX_AGE
+    are ignored, the inventory refreshes them on every run.
+
+    :return Capabilities, allowing every action for other accounts and if
+        the parameter is unset, stale or cannot be read.
+    """
+    global _parameter_cache
+    config = Config()
+    if not config.permissionCacheParameter \
+            or account_id != config.primaryAccountId:
+        return Capabilities()
+    if _parameter_cache is not None \
+            and time.monotonic() - _parameter_cache[0] \
+            < config.permissionCacheTtl \
+            and not _parameter_cache[1].is_stale(config.permissionCheckMaxAge):
+        return _parameter_cache[1]
+
+    import boto3
+
+    try:
+        check = json.loads(boto3.client('ssm').get_parameter(
+            Name=config.permissionCacheParameter)['Parameter']['Value'])
+        role_suffix = f':{account_id}:role/{config.iamAssumedRoleName}'
+        blocked = next((actions for principal_arn, actions
+                        in check['blocked'].items()
+                        if principal_arn.endswith(role_suffix)), ())
+        capabilities = Capabilities(blocked, check['checked_at'])
+    except Exception as error:
+        log.info(f'Unable to read permission check'
+                 f' {config.permissionCacheParameter}, assuming every action'
+                 f' is allowed. Raw Error: {error}')
+        capabilities = Capabilities()
+    if capabilities.is_stale(config.permissionCheckMaxAge):
+        age_hours = (time.time() - capabilities.checked_at) / 3600
+        log.info(f'Ignoring permission check from {age_hours:.0f} hours ago,'
+                 f' assuming every action is allowed.')
+        capabilities = Capabilities()
+    _parameter_cache = (time.monotonic(), capabilities)
+    return capabilities
+
+
+def check_dryrun(capabilities, dryrun):
+    """
+    Falls back to a dryrun when the assumed role may not change keys, so a
+    run reports its actions instead of failing each of them.
+
+    :return True if the run is a dryrun.
+    """
+    missing = capabilities.missing(KEY_ACTIONS)
+    if missing and not dryrun:
+        log.error(f'The assumed role is not allowed to use {missing},'
+                  f' running as a dryrun.')
+        return True
+    return dryrun
@@ -0,0 +1,72 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Client Registry.
+
+This module provides a registry that creates the boto3 clients of an
+assumed role session once and shares them across the scan and the
+execution of actions for an account.
+"""
+
+import threading
+
+from botocore.config import Config as BotoConfig
+
+
+# Calls made through a TokenBucket are retried by the bucket, which lowers
+# its rate when they are throttled. Their clients only retry once, so a
+# throttled call reaches the bucket instead of being retried by botocore
+LIMITED_RETRIES = {'mode': 'standard', 'total_max_attempts': 2}
+
+
+class ClientRegistry:
+    """Creates each client of a session once per service and region.
+
+    Clients are thread safe, sessions are not, so clients are created under
+    a lock and then shared by all workers.
+
+    :param session: boto3 session of the assumed role
+    :param max_pool_connections: Connection pool size of each client, should
+        match the number of concurrent workers using the client
+    """
+
+    def __init__(self, session, max_pool_connections=10):
+        self.session = session
+        self.region_name = session.region_name
+        self.client_config = BotoConfig(
+            max_pool_connections=max_pool_connections,
+            retries={'mode': 'adaptive', 'max_attempts': 10},
+            tcp_keepalive=True
+        )
+        self.limited_client_config = BotoConfig(
+            max_pool_connections=max_pool_connections,
+            # botocore converts the retries in place
+            retries=dict(LIMITED_RETRIES),
+            tcp_keepalive=True
+        )
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _get_client(self, service_name, region_name, limited):
+        key = (service_name, region_name, limited)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self.session.client(
+                    service_name, region_name=region_name,
+                    config=self.limited_client_config if limited
+                    else self.client_config)
+            return self._clients[key]
+
+    def client(self, service_name, region_name=None):
+        return self._get_client(service_name, region_name, False)
+
+    def limited_client(self, service_name, region_name=None):
+        """
+        Gets a client for calls made through a TokenBucket, which retries
+        and backs off throttled calls itself.
+
+        :return boto3 client with LIMITED_RETRIES.
+        """
+        return self._get_client(service_name, region_name, True)
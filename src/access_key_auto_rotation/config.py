@@ -18,6 +18,19 @@ log = logging.getLogger()
 log.setLevel(logging.INFO)
 
 
+def get_positive_int(name, default):
+    """
+    Reads a count from the environment that must be at least 1, e.g. a
+    number of workers.
+
+    :return Integer value of the variable, the default if it is unset.
+    """
+    value = int(os.getenv(name, default))
+    if value < 1:
+        raise ValueError(f'{name} must be at least 1, got {value}')
+    return value
+
+
 @dataclass
 class Config:
     """Configuration for the application."""
@@ -35,6 +48,39 @@ class Config:
     # The Arn of the Lambda Function used for Notification
     notifierLambdaArn = os.getenv('NOTIFIER_FUNCTION_ARN')
 
+    # Whether notifications are queued for the Notifier to send in batches
+    # instead of invoking the Notifier once per notification
+    notificationBatching = \
+        str(os.getenv('NOTIFICATION_BATCHING')).lower() == 'true'
+
+    # The URL of the SQS queue the Notifier consumes in batches
+    notificationQueueUrl = os.getenv('NOTIFICATION_QUEUE_URL')
+
+    # Whether notifications are collected for a daily digest per recipient
+    # instead of being sent per account and run
+    notificationDigest = \
+        str(os.getenv('NOTIFICATION_DIGEST')).lower() == 'true'
+
+    # The URL of the SQS queue the daily digest is collected in
+    digestQueueUrl = os.getenv('DIGEST_QUEUE_URL')
+
+    # Locale of the message catalog the actions are notified in
+    notificationLocale = os.getenv('NOTIFICATION_LOCALE', 'en')
+
+    # Size in bytes above which the action list of a notification is
+    # written to the notification bucket and passed by reference
+    payloadSpillSize = int(os.getenv('PAYLOAD_SPILL_SIZE', 200000))
+
+    # S3 bucket large action lists are written to
+    notificationBucket = os.getenv('NOTIFICATION_BUCKET')
+
+    # Local directory large action lists are written to instead of the
+    # notification bucket, for testing
+    payloadSpillDir = os.getenv('PAYLOAD_SPILL_DIR')
+
+    # Email notified for accounts whose owner cannot be looked up
+    recipientEmail = os.getenv('RECIPIENT_EMAIL')
+
     # The IAM Assumed Role
     iamAssumedRoleName = os.getenv('IAM_ASSUMED_ROLE_NAME')
 
@@ -58,6 +104,55 @@ class Config:
     # 'False' preforms key rotation and sends notifications to end users (Remediation Mode)."
     dryrun = str(os.getenv('DRY_RUN_FLAG')).lower() == 'true'
 
+    # How the access key inventory of an account is collected.
+    # 'api' looks up every key with GetAccessKeyLastUsed.
+    # 'credential_report' reads a single IAM credential report and only
+    # falls back to per key lookups for keys the report does not cover.
+    scanMode = os.getenv('SCAN_MODE', 'api')
+
+    # Maximum age in hours of a credential report before it is ignored
+    credentialReportMaxAge = int(os.getenv('CREDENTIAL_REPORT_MAX_AGE', 4))
+
+    # Number of users whose keys are fetched concurrently during a scan
+    scanWorkers = get_positive_int('SCAN_WORKERS', 8)
+
+    # Maximum IAM requests per second shared by all scan workers
+    iamRequestRate = int(os.getenv('IAM_REQUEST_RATE', 10))
+
+    # Number of users whose actions are executed concurrently
+    actionWorkers = get_positive_int('ACTION_WORKERS', 4)
+
+    # Number of users and group members requested per IAM page
+    iamPageSize = int(os.getenv('IAM_PAGE_SIZE', 100))
+
+    # Where the key state is kept between runs for incremental scans,
+    # one of 'none', 'dynamodb', 'sqlite' or 'memory'
+    stateStore = os.getenv('STATE_STORE', 'none')
+
+    # DynamoDB table of the 'dynamodb' state store
+    stateTableName = os.getenv('STATE_TABLE_NAME')
+
+    # Database file of the 'sqlite' state store
+    stateDbPath = os.getenv('STATE_DB_PATH', '/tmp/key_state.db')
+
+    # SSM parameter the account inventory shares its permission check in,
+    # read by event driven runs
+    permissionCacheParameter = os.getenv('PERMISSION_CACHE_PARAMETER')
+
+    # Seconds the permission check is reused in a warm container
+    permissionCacheTtl = int(os.getenv('PERMISSION_CACHE_TTL', 3600))
+
+    # Seconds after which a permission check is ignored, the 24 hour
+    # schedule of the account inventory that refreshes it
+    permissionCheckMaxAge = int(os.getenv('PERMISSION_CHECK_MAX_AGE', 86400))
+
+    # Account the permission check of the assumed role applies to
+    primaryAccountId = os.getenv('PRIMARY_ACCOUNT_ID')
+
+    # Number of days after which all users of an account are scanned again
+    # regardless of their stored state
+    fullScanInterval = int(os.getenv('FULL_SCAN_INTERVAL', 7))
+
     # Format for name of ASM secrets
     secretNameFormat = 'User_{}_AccessKey'
 
@@ -0,0 +1,117 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Credential Report Handler.
+
+This module provides the functionality to build the access key inventory
+of an account from a single IAM credential report instead of looking up
+every key individually.
+"""
+
+import csv
+import datetime
+import io
+import time
+
+from config import log
+
+# How long to wait for IAM to finish generating a credential report
+REPORT_POLL_INTERVAL = 2
+REPORT_POLL_ATTEMPTS = 15
+
+# Values IAM uses in date columns when there is no date to report
+EMPTY_REPORT_VALUES = ('', 'N/A', 'not_supported', 'no_information')
+
+
+def _parse_report_date(value):
+    if value in EMPTY_REPORT_VALUES:
+        return None
+    return datetime.datetime.fromisoformat(value)
+
+
+def _generate_credential_report(iam_client):
+    for _ in range(REPORT_POLL_ATTEMPTS):
+        state = iam_client.generate_credential_report()['State']
+        if state == 'COMPLETE':
+            return True
+        time.sleep(REPORT_POLL_INTERVAL)
+    return False
+
+
+def parse_credential_report(content):
+    """
+    Parses the CSV content of a credential report row by row.
+
+    :return Dict of user name to the access keys listed for that user. Each
+        key has its 'CreateDate', 'Status' and 'LastUsedDate'.
+    """
+    report = {}
+    for row in csv.DictReader(io.StringIO(content.decode('utf-8'))):
+        if row['user'] == '<root_account>':
+            continue
+        keys = []
+        for slot in ('access_key_1', 'access_key_2'):
+            create_date = _parse_report_date(row[f'{slot}_last_rotated'])
+            if create_date is None:
+                continue
+            keys.append({
+                'CreateDate': create_date,
+                'Status': 'Active' if row[f'{slot}_active'] == 'true'
+                else 'Inactive',
+                'LastUsedDate': _parse_report_date(
+                    row[f'{slot}_last_used_date'])
+            })
+        report[row['user']] = keys
+    return report
+
+
+def get_credential_report(iam_client, max_age_hours):
+    """
+    Gets the access key inventory of an account from its credential report.
+
+    :return Dict of user name to access keys, or None if the report could
+        not be generated or is older than max_age_hours.
+    """
+    try:
+        if not _generate_credential_report(iam_client):
+            log.info('Credential report was not ready in time, falling back'
+                     ' to per key lookups.')
+            return None
+        response = iam_client.get_credential_report()
+    except iam_client.exceptions.ClientError as error:
+        log.info(f'Unable to get credential report, falling back to per key'
+                 f' lookups. Raw Error: {error}')
+        return None
+
+    generated_time = response['GeneratedTime']
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if now - generated_time > datetime.timedelta(hours=max_age_hours):
+        log.info(f'Credential report generated at {generated_time} is stale,'
+                 f' falling back to per key lookups.')
+        return None
+
+    report = parse_credential_report(response['Content'])
+    log.info(f'Loaded credential report generated at {generated_time} with'
+             f' {len(report)} users.')
+    return report
+
+
+def get_report_last_used_date(key, report_keys):
+    """
+    Finds the last used date of a key in the credential report.
+
+    The report does not list access key ids, so keys are matched on their
+    creation date. Only keys the report shows as used are returned, keys
+    reported as unused are confirmed with the API before they are deleted.
+
+    :return The last used date of the key, or None if it is not covered.
+    """
+    if not report_keys:
+        return None
+    create_date = key['CreateDate'].replace(microsecond=0)
+    for report_key in report_keys:
+        if report_key['CreateDate'].replace(microsecond=0) == create_date:
+            return report_key['LastUsedDate']
+    return None
@@ -0,0 +1,136 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Access Key Event Handler.
+
+This module provides the event driven entry point of the rotation. It
+consumes the CloudTrail events EventBridge delivers for changes to access
+keys and users, and only evaluates the user the event is about, leaving
+the scan of every user to the weekly reconcile.
+"""
+
+import time
+
+from config import Config, log
+
+config = Config()
+
+# CloudTrail events that change the access keys of a user
+KEY_EVENTS = ('CreateAccessKey', 'UpdateAccessKey', 'DeleteAccessKey')
+USER_EVENTS = ('DeleteUser',)
+
+
+def parse_event(event):
+    """
+    Gets what an EventBridge CloudTrail event changed.
+
+    :return Tuple of the event name, account id and user name, or None if
+        the event does not need to be handled.
+    """
+    detail = event.get('detail', {})
+    event_name = detail.get('eventName')
+    if event_name not in KEY_EVENTS + USER_EVENTS:
+        log.info(f'Ignoring unsupported event [{event_name}].')
+        return None
+    if detail.get('errorCode'):
+        log.info(f'Ignoring failed {event_name} call: {detail["errorCode"]}.')
+        return None
+
+    # changes made by the rotation itself are recorded by the rotation
+    session_issuer = detail.get('userIdentity', {}) \
+        .get('sessionContext', {}).get('sessionIssuer', {})
+    if session_issuer.get('userName') == config.iamAssumedRoleName:
+        log.info(f'Ignoring {event_name} made by the rotation.')
+        return None
+
+    account_id = detail.get('recipientAccountId') or event.get('account')
+    request_parameters = detail.get('requestParameters') or {}
+    response_elements = detail.get('responseElements') or {}
+    user_name = request_parameters.get('userName') or \
+        response_elements.get('accessKey', {}).get('userName')
+    if not user_name:
+        # without a user name the call was made on the caller's own keys
+        identity = detail.get('userIdentity', {})
+        if identity.get('type') != 'IAMUser':
+            log.info(f'Ignoring {event_name} without an IAM user.')
+            return None
+        user_name = identity.get('userName')
+
+    return event_name, account_id, user_name
+
+
+def get_account_contact(aws_account_id):
+    """
+    Gets the name and email of an account for its notifications, falling
+    back to the recipient email like the account inventory does.
+
+    :return Tuple of the account name and email.
+    """
+    import boto3
+
+    try:
+        account = boto3.client('organizations').describe_account(
+            AccountId=aws_account_id)['Account']
+        return account['Name'], account['Email']
+    except Exception as error:
+        log.info(f'Unable to describe account {aws_account_id}, notifying'
+                 f' the recipient email. Raw Error: {error}')
+        return config.recipientEmail, config.recipientEmail
+
+
+def lambda_handler(event, context):
+    """Handler for Lambda.
+
+    :param event: EventBridge event of a CloudTrail CreateAccessKey,
+        UpdateAccessKey, DeleteAccessKey or DeleteUser call
+    :param context: Lambda context object
+    :return Dictionary summary of the user run, or None if the event was
+        ignored.
+    """
+    start = time.monotonic()
+    log.info('Function starting.')
+
+    parsed = parse_event(event)
+    if parsed is None:
+        return None
+    event_name, aws_account_id, user_name = parsed
+
+    # boto3 and the rotation modules are only loaded for events that are
+    # evaluated, most events are the rotation's own and ignored right away
+    from sts_connection_handler import get_account_session
+    from client_registry import ClientRegistry
+    from run_context import RunContext
+    from state_store import get_state_store
+    from account_scan import get_actions_for_user
+    from account_run import apply_actions, get_account_summary
+    from capabilities import load_capabilities, check_dryrun
+
+    log.info(f'Handling {event_name} of user [{user_name}] in Account ID:'
+             f' {aws_account_id}')
+
+    state_store = get_state_store()
+    if event_name in USER_EVENTS:
+        # nothing left to rotate, only forget the user
+        if state_store is not None:
+            state_store.delete_users(aws_account_id, [user_name])
+        return get_account_summary(aws_account_id, [], config.dryrun, start)
+
+    capabilities = load_capabilities(aws_account_id)
+    dryrun = check_dryrun(capabilities, config.dryrun)
+
+    account_session = get_account_session(aws_account_id)
+    clients = ClientRegistry(account_session, config.actionWorkers)
+    run_context = RunContext(aws_account_id, clients, state_store,
+                             capabilities)
+    action_queue = get_actions_for_user(run_context, user_name)
+
+    account_name, account_email = get_account_contact(aws_account_id) \
+        if action_queue else (None, None)
+    action_results = apply_actions(context, run_context, account_name,
+                                   account_email, action_queue, dryrun)
+
+    log.info('Function has completed.')
+    return get_account_summary(aws_account_id, action_queue, dryrun,
+                               start, action_results)
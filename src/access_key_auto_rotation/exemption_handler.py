@@ -9,24 +9,27 @@ This module provides the functionality necessary to exclude users
 from key rotation based on user defined IAM Group.
 """
 
-from config import log
+from config import Config, log
 
 
 def get_exemption_group(groupName, iam_client):
     """
-    Gets the current list of exempt user accounts.
+    Gets the current set of exempt user accounts.
 
-    :return The current list of exempt user accounts.
+    :return The current frozenset of exempt user names.
     """
-    exemption_group_users = []
+    config = Config()
+    exemption_group_users = frozenset()
 
     try:
-        exemption_group_response = iam_client.get_group(GroupName=groupName)
-        exemption_group = exemption_group_response['Users']
-
-        for users in exemption_group:
-            user_name = users['UserName']
-            exemption_group_users.append(user_name)
+        paginator = iam_client.get_paginator('get_group')
+        page_iterator = paginator.paginate(
+            GroupName=groupName,
+            PaginationConfig={'PageSize': config.iamPageSize})
+        exemption_group_users = frozenset(
+            user['UserName']
+            for page in page_iterator
+            for user in page['Users'])
 
         if not exemption_group_users:
             log.info(f'The exempted users list [{groupName}] is empty.')
@@ -67,13 +70,13 @@ def validate_exemption_group(iamExemptionGroup, iam_client, log):
                 f'Please double check that the Assumed Role CloudFormation '
                 f'StackSet was deployed successfully to this account. '
                 f'Raw Error: {error}')
-            exempt_list = []
+            exempt_list = frozenset()
             exemption_group = False
     else:
         log.info(
             'An IAM Exemption Group name was not added to the CloudFormation '
             'Template. Please double check your CloudFormation deployment.')
-        exempt_list = []
+        exempt_list = frozenset()
         exemption_group = False
 
     return exemption_group, exempt_list
@@ -52,7 +52,11 @@ def check_force_rotate_users(event):
     force_rotate_user_name = force_rotate_array[1]
 
     if force_rotate and force_rotate_user_name:
-        force_rotate_users = [force_rotate_user_name]
+        # a list of users can be force rotated at once
+        if isinstance(force_rotate_user_name, list):
+            force_rotate_users = force_rotate_user_name
+        else:
+            force_rotate_users = [force_rotate_user_name]
     else:
         force_rotate_users = []
 
@@ -11,90 +11,106 @@ rotate, deactivate, and delete IAM Keys.
 
 import json
 
+from concurrent.futures import ThreadPoolExecutor
 from config import Config, log
-from aws_partitions import get_partition_for_region, get_iam_region,\
-    get_partition_regions
+from key_records import ActionKind
 
 config = Config()
 
 
+# Log messages by action kind, for dry runs and for real runs
+ACTION_LOG_FORMATS = {
+    ActionKind.ROTATE: ('Would create new key to replace {}',
+                        'Creating new key to replace {}'),
+    ActionKind.DEACTIVATE: ('Would deactivate {}', 'Deactivating {}'),
+    ActionKind.DELETE: ('Would delete {}', 'Deleting {}'),
+}
+
+
 def log_actions(action_queue, dryrun=False):
     if not action_queue:
         log.info("No actions to be taken on this account.")
         return
 
-    for action_spec in action_queue:
-        action = action_spec['action']
-        key_metadata = action_spec['key']
-        access_key_id = key_metadata["AccessKeyId"]
-        reason = action_spec['reason'].value
-
-        if action == 'ROTATE':
-            if dryrun:
-                log.info(
-                    f"Would create new key to replace {access_key_id}"
-                    f" -- {reason}")
-            else:
-                log.info(
-                    f"Creating new key to replace {access_key_id}"
-                    f" -- {reason}")
-        elif action == 'DEACTIVATE':
-            if dryrun:
-                log.info(
-                    f"Would deactivate {access_key_id}"
-                    f" -- {reason}")
-            else:
-                log.info(
-                    f"Deactivating {access_key_id}"
-                    f" -- {reason}")
-        elif action == 'DELETE':
-            if dryrun:
-                log.info(
-                    f"Would delete {access_key_id}"
-                    f" -- {reason}")
-            else:
-                log.info(
-                    f"Deleting {access_key_id}"
-                    f" -- {reason}")
-
-
-def execute_actions(action_queue, account_session):
-    for action_spec in action_queue:
-        action = action_spec['action']
-        key_metadata = action_spec['key']
-
-        if action == 'ROTATE':
-            rotate_key(key_metadata, account_session)
-        elif action == 'DEACTIVATE':
-            deactivate_key(key_metadata, account_session)
-        elif action == 'DELETE':
-            delete_key(key_metadata, account_session)
-
-
-def rotate_key(key_metadata, account_session):
-    user_name = key_metadata['UserName']
-    access_key_id = key_metadata['AccessKeyId']
+    for key_action in action_queue:
+        log_formats = ACTION_LOG_FORMATS.get(key_action.kind)
+        if log_formats is None:
+            continue
+        message = log_formats[0 if dryrun else 1].format(
+            key_action.key.access_key_id)
+        log.info(f"{message} -- {key_action.reason.value}")
+
+
+def execute_user_actions(user_actions, run_context):
+    """
+    Executes the actions of a single user in queue order. Later actions of
+    a user depend on earlier ones, e.g. a rotation after a failed delete
+    would exceed the two key limit, so they are skipped after a failure.
+
+    :return List of results, each with the 'action_spec' and an 'error'.
+    """
+    results = []
+    for index, key_action in enumerate(user_actions):
+        kind = key_action.kind.name
+        key = key_action.key
+        try:
+            ACTION_HANDLERS[key_action.kind](key, run_context)
+        except Exception as error:
+            log.error(f'Failed to {kind} {key.user_name}:'
+                      f' {key.access_key_id}. Raw Error: {error}')
+            results.append({'action_spec': key_action, 'error': str(error)})
+            results += [{
+                'action_spec': skipped_action,
+                'error': f'Skipped because {kind} of '
+                         f'{key.access_key_id} failed.'
+            } for skipped_action in user_actions[index + 1:]]
+            break
+        results.append({'action_spec': key_action, 'error': None})
+    return results
+
+
+def execute_actions(action_queue, run_context):
+    """
+    Executes the actions of different users concurrently, while the
+    actions of each user run one after another in queue order.
+
+    :return List of results in queue order, each with the 'action_spec'
+        and an 'error'.
+    """
+    # dicts keep insertion order, so users are executed in queue order
+    actions_by_user = {}
+    for key_action in action_queue:
+        if key_action.kind not in ACTION_HANDLERS:
+            continue
+        actions_by_user.setdefault(
+            key_action.key.user_name, []).append(key_action)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=config.actionWorkers) as executor:
+        for user_results in executor.map(
+                lambda user_actions: execute_user_actions(
+                    user_actions, run_context),
+                actions_by_user.values()):
+            results += user_results
+    # users interleaved in the queue finish grouped by user
+    queue_positions = {id(key_action): position
+                       for position, key_action in enumerate(action_queue)}
+    results.sort(key=lambda result: queue_positions[id(result['action_spec'])])
+
+    failed = [result for result in results if result['error']]
+    log.info(f'Executed {len(results) - len(failed)} actions,'
+             f' {len(failed)} failed.')
+    return results
+
+
+def rotate_key(key, run_context):
+    user_name = key.user_name
+    access_key_id = key.access_key_id
     log.info(f'Rotating user {user_name} key {access_key_id}')
 
-    iam_client = account_session.client('iam')
-    sts_client = account_session.client('sts')
-
-    # get account id and region from session
-    account_id = sts_client.get_caller_identity()["Account"]
-    my_region = account_session.region_name
-
-    # use default iam regions to store secret
-    partition = get_partition_for_region(my_region)
-    iam_region = get_iam_region(partition)
-    sm_client = account_session.client(
-        'secretsmanager', region_name=iam_region)
-    replication_regions = get_partition_regions(partition)
-
-    # TODO: parameterize this instead of hardcoding
-    if partition == 'aws-us-gov':
-        replication_regions = ['us-gov-east-1']
-    elif partition == 'aws':
-        replication_regions = ['us-east-2', 'us-west-1', 'us-west-2']
+    iam_client = run_context.clients.client('iam')
+    account_id = run_context.account_id
+    secret_sync = run_context.get_secret_sync()
 
     # Create new access key
     new_access_key = iam_client.create_access_key(
@@ -104,50 +120,19 @@ def rotate_key(key_metadata, account_session):
 
     secret_name = config.secretNameFormat.format(user_name)
     secret_arn = config.secretArnFormat.format(
-        partition=partition, account_id=account_id, secret_name=secret_name,
-        region_name=iam_region)
+        partition=run_context.partition, account_id=account_id,
+        secret_name=secret_name, region_name=run_context.iam_region)
 
-    # Create new secret, or store in existing
-    try:
-        # will throw error if secret does not yet exist
-        secret = sm_client.describe_secret(
-            SecretId=secret_name)
-        # update secret
-        sm_client.put_secret_value(SecretId=secret_name,
-                                   SecretString=new_access_key_str)
-        # make sure secret is replicated to all regions
-        replication_status = secret.get('ReplicationStatus', [])
-        current_replication_regions = [x['Region'] for x in replication_status]
-        missing_regions = [x for x in replication_regions
-                           if x not in current_replication_regions]
-        if missing_regions:
-            sm_client.replicate_secret_to_regions(
-                SecretId=secret_name,
-                AddReplicaRegions=[{'Region': x} for x in missing_regions],
-                ForceOverwriteReplicaSecret=True
-            )
-    except sm_client.exceptions.ClientError as error:
-        # create if we caught an error on describe
-        if error.response['Error']['Code'] == 'ResourceNotFoundException':
-            sm_client.create_secret(
-                Name=secret_name, Description='Auto-created secret',
-                SecretString=new_access_key_str,
-                AddReplicaRegions=[{'Region': x} for x in replication_regions],
-                ForceOverwriteReplicaSecret=True
-            )
-        else:
-            raise error
-
-    user = iam_client.get_user(
-        UserName=user_name
-    )['User']
-    user_arn = user['Arn']
+    # the scan records user arns, only look up users it did not list
+    user_arn = run_context.user_arns.get(user_name)
+    if user_arn is None:
+        user_arn = iam_client.get_user(UserName=user_name)['User']['Arn']
 
+    # Create new secret, or store in existing
     resource_policy_document = config.secretPolicyFormat.format(
         user_arn=user_arn)
-    sm_client.put_resource_policy(SecretId=secret_name,
-                                  ResourcePolicy=resource_policy_document,
-                                  BlockPublicPolicy=True)
+    secret_sync.sync_secret(secret_name, new_access_key_str,
+                            resource_policy_document)
 
     policy_name = 'SecretsAccessPolicy'
     try:
@@ -168,22 +153,30 @@ def rotate_key(key_metadata, account_session):
     return
 
 
-def deactivate_key(key_metadata, account_session):
-    user_name = key_metadata['UserName']
-    access_key_id = key_metadata['AccessKeyId']
+def deactivate_key(key, run_context):
+    user_name = key.user_name
+    access_key_id = key.access_key_id
     log.info(f'Deactivating user {user_name} key {access_key_id}')
 
-    iam_client = account_session.client('iam')
+    iam_client = run_context.clients.client('iam')
     iam_client.update_access_key(UserName=user_name,
                                  AccessKeyId=access_key_id,
                                  Status='Inactive')
 
 
-def delete_key(key_metadata, account_session):
-    user_name = key_metadata['UserName']
-    access_key_id = key_metadata['AccessKeyId']
+def delete_key(key, run_context):
+    user_name = key.user_name
+    access_key_id = key.access_key_id
     log.info(f'Deleting user {user_name} key {access_key_id}')
 
-    iam_client = account_session.client('iam')
+    iam_client = run_context.clients.client('iam')
     iam_client.delete_access_key(UserName=user_name,
                                  AccessKeyId=access_key_id)
+
+
+# Handlers by action kind, warnings only need a notification
+ACTION_HANDLERS = {
+    ActionKind.ROTATE: rotate_key,
+    ActionKind.DEACTIVATE: deactivate_key,
+    ActionKind.DELETE: delete_key,
+}
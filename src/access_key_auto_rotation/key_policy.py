@@ -0,0 +1,427 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Key Policy - Mapping of Action Reasons.
+
+This module provides the key rotation policy. The keys of an account are
+collected into a columnar batch, with dates as int64 epoch microseconds
+and the key status as a bitmask, and every user is classified in a single
+pass through a table of rules keyed by the number of keys and active keys.
+"""
+
+import datetime
+
+from array import array
+from enum import Enum
+from config import log
+from key_records import ActionKind, KeyAction
+
+
+class ActionReasons(Enum):
+    UNUSED_EXPIRED_KEY = 'Expired key has never been used.'
+    EXPIRED_ACTIVE_KEY = 'Active key has expired.'
+    FORCED_ROTATION = 'Forced active key rotation.'
+    EXPIRED_ACTIVE_KEY_CONFLICT_LRU = 'Expired active key with conflict, ' \
+                                      'least recently used.'
+    EXPIRED_INACTIVE_KEY_CONFLICT = 'Expired key with conflict, already ' \
+                                    'inactive.'
+    FORCED_ROTATION_CONFLICT_LRU = 'Forced active key rotation with conflict, ' \
+                                   'least recently used.'
+    FORCED_INACTIVE_KEY_CONFLICT = 'Forced rotation with conflict, already ' \
+                                   'inactive.'
+    INSTALL_GRACE_PERIOD_END = 'Installation grace period has ended.'
+    RECOVER_GRACE_PERIOD_END = 'Recovery grace period has ended.'
+    KEY_PENDING_ROTATION = 'Key will be rotated soon.'
+    KEY_PENDING_DEACTIVATION = 'Key will be deactivated soon, ' \
+                               'please install new key.'
+    KEY_PENDING_DELETION = 'Key will be permanently deleted soon, ' \
+                           'please validate new key.'
+    KEY_PENDING_EXPIRATION_CONFLICT = 'Key will expire soon, cannot be ' \
+                                      'rotated due to presence of other key.'
+    KEY_PENDING_DELETION_CONFLICT = 'Key will be permanently deleted soon, ' \
+                                    'due to conflict.'
+    UNUSED_KEY_PENDING_DELETION = 'Key will be permanently deleted soon, ' \
+                                  'key is about to expire and has never' \
+                                  ' been used.'
+
+
+# Key status bits
+ACTIVE = 1
+USED = 2
+EXPIRED = 4
+EXPIRING = 8
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+DAY = 86400 * 1000000
+
+
+def to_epoch(date):
+    return (date - EPOCH) // MICROSECOND
+
+
+def from_epoch(value):
+    return EPOCH + datetime.timedelta(microseconds=value)
+
+
+class KeyBatch:
+    """Columnar batch of the access keys of an account, grouped by user."""
+
+    def __init__(self):
+        self.keys = []
+        self.create = array('q')
+        self.last_used = array('q')
+        self.expire = array('q')
+        # 0 where the deactivation date of a key was not recorded
+        self.deactivated = array('q')
+        self.status = array('B')
+        # keys of user i are keys[user_offsets[i]:user_offsets[i + 1]]
+        self.user_offsets = array('q', [0])
+        self.user_names = []
+        self.force_rotate = []
+
+    def add_user(self, user_name, key_records, force_rotate):
+        for key in key_records:
+            self.keys.append(key)
+            self.create.append(to_epoch(key.create_date))
+            self.expire.append(to_epoch(key.expire_date))
+            self.deactivated.append(
+                to_epoch(key.deactivate_date) if key.deactivate_date else 0)
+            status = ACTIVE if key.active else 0
+            if key.last_used_date is None:
+                self.last_used.append(0)
+            else:
+                self.last_used.append(to_epoch(key.last_used_date))
+                status |= USED
+            self.status.append(status)
+        self.user_offsets.append(len(self.keys))
+        self.user_names.append(user_name)
+        self.force_rotate.append(force_rotate)
+
+
+class _Evaluation:
+    """Thresholds and output of one pass over a KeyBatch."""
+
+    def __init__(self, batch, now, config):
+        self.batch = batch
+        self.now = to_epoch(now)
+        self.warn = self.now + config.pending_action_warn_period * DAY
+        self.installation_grace_period = \
+            config.installation_grace_period * DAY
+        self.recovery_grace_period = config.recovery_grace_period * DAY
+        self.action_queue = []
+
+    def emit(self, kind, index, reason, action_date=None):
+        key = self.batch.keys[index]
+        log.info(f'{kind.name} {key.user_name}: {key.access_key_id} '
+                 f'-- {reason.value}')
+        if action_date is not None:
+            action_date = from_epoch(action_date)
+        self.action_queue.append(KeyAction(kind, key, reason, action_date))
+
+    def warn_pending_rotation(self, rotate, rotate_date, conflict=None):
+        # the conflicting key will be deleted when the other one rotates
+        if conflict is not None:
+            self.emit(ActionKind.WARN, conflict,
+                      ActionReasons.KEY_PENDING_DELETION_CONFLICT,
+                      rotate_date)
+        self.emit(ActionKind.WARN, rotate, ActionReasons.KEY_PENDING_ROTATION,
+                  rotate_date)
+
+
+def _inactive_delete_date(evaluation, index, rotation_date):
+    """
+    Gets the date an inactive key is deleted, from its recorded deactivation
+    date, or else from the date it is guessed to have been rotated.
+
+    :return Epoch microseconds of the deletion date.
+    """
+    deactivated = evaluation.batch.deactivated[index]
+    if deactivated:
+        return deactivated + evaluation.recovery_grace_period
+    return rotation_date + evaluation.installation_grace_period + \
+        evaluation.recovery_grace_period
+
+
+def _least_recently_used(evaluation, first, second):
+    """
+    Picks the key to delete when one of two active keys must go: the least
+    recently used, the one never used, or else the one created first.
+
+    :return Tuple of the key to delete and the key to rotate.
+    """
+    batch = evaluation.batch
+    first_used = batch.status[first] & USED
+    second_used = batch.status[second] & USED
+    if first_used and second_used:
+        if batch.last_used[second] < batch.last_used[first]:
+            return second, first
+        return first, second
+    if first_used:
+        return second, first
+    if second_used:
+        return first, second
+    if batch.create[first] <= batch.create[second]:
+        return first, second
+    return second, first
+
+
+def _rule_single_active(evaluation, keys, force_rotate):
+    log.info('--Key Logic: [Active, Null]')
+    key = keys[0]
+    expire = evaluation.batch.expire[key]
+    if expire <= evaluation.now:
+        evaluation.emit(ActionKind.ROTATE, key,
+                        ActionReasons.EXPIRED_ACTIVE_KEY)
+    elif force_rotate:
+        evaluation.emit(ActionKind.ROTATE, key, ActionReasons.FORCED_ROTATION)
+    elif expire <= evaluation.warn:
+        evaluation.emit(ActionKind.WARN, key,
+                        ActionReasons.KEY_PENDING_ROTATION, expire)
+
+
+def _rule_single_inactive(evaluation, keys, force_rotate):
+    log.info('--Key Logic: [Inactive, Null]')
+    key = keys[0]
+    # all we can do here is calculate grace period based on creation
+    delete_date = _inactive_delete_date(
+        evaluation, key, evaluation.batch.create[key])
+    if delete_date <= evaluation.now:
+        evaluation.emit(ActionKind.DELETE, key,
+                        ActionReasons.RECOVER_GRACE_PERIOD_END)
+    elif delete_date <= evaluation.warn:
+        evaluation.emit(ActionKind.WARN, key,
+                        ActionReasons.KEY_PENDING_DELETION, delete_date)
+
+
+def _rule_both_inactive(evaluation, keys, force_rotate):
+    log.info('--Key Logic: [Inactive,Inactive]')
+    batch = evaluation.batch
+    num_expired = sum(1 for k in keys if batch.status[k] & EXPIRED)
+
+    if num_expired == 2:
+        # both keys are inactive and expired, just delete them
+        for key in keys:
+            evaluation.emit(ActionKind.DELETE, key,
+                            ActionReasons.RECOVER_GRACE_PERIOD_END)
+    elif num_expired == 1:
+        # maybe someone deactivated the new key accidentally?
+        # respect the recovery grace period on the inactive key
+        expired_key, unexpired_key = sorted(
+            keys, key=lambda k: batch.create[k])
+        # use the creation date of the unexpired key
+        # to guess when the expired key was deactivated
+        delete_date = _inactive_delete_date(
+            evaluation, expired_key, batch.create[unexpired_key])
+        rotate_date = batch.expire[unexpired_key]
+
+        if delete_date <= evaluation.now:
+            evaluation.emit(ActionKind.DELETE, expired_key,
+                            ActionReasons.RECOVER_GRACE_PERIOD_END)
+            if rotate_date <= evaluation.warn:
+                evaluation.warn_pending_rotation(unexpired_key, rotate_date)
+        elif rotate_date <= evaluation.warn:
+            evaluation.warn_pending_rotation(unexpired_key, rotate_date,
+                                             expired_key)
+        elif delete_date <= evaluation.warn:
+            evaluation.emit(ActionKind.WARN, expired_key,
+                            ActionReasons.KEY_PENDING_DELETION, delete_date)
+    else:
+        # pending expirations don't need warnings,
+        # nothing will change until end of grace period
+        log.info('Skipping, keys are both valid.')
+
+
+def _rule_active_inactive(evaluation, keys, force_rotate):
+    # we have a key in the recycle bin, waiting to be deleted
+    log.info('--Key Logic: [Active, Inactive]')
+    batch = evaluation.batch
+    if batch.status[keys[0]] & ACTIVE:
+        active_key, inactive_key = keys
+    else:
+        inactive_key, active_key = keys
+    rotate_date = batch.expire[active_key]
+
+    # the inactive key has to be deleted so the active one can rotate,
+    # the rotation is queued with the conflict reason of the deletion
+    if rotate_date <= evaluation.now:
+        # we should only encounter this on first deploy
+        reason = ActionReasons.EXPIRED_INACTIVE_KEY_CONFLICT
+        evaluation.emit(ActionKind.DELETE, inactive_key, reason)
+        evaluation.emit(ActionKind.ROTATE, active_key, reason)
+    elif force_rotate:
+        reason = ActionReasons.FORCED_INACTIVE_KEY_CONFLICT
+        evaluation.emit(ActionKind.DELETE, inactive_key, reason)
+        evaluation.emit(ActionKind.ROTATE, active_key, reason)
+    else:
+        # use the creation date of the active key, or a more recent last
+        # used date, to guess when the inactive key was deactivated
+        rotation_date = batch.create[active_key]
+        if batch.status[inactive_key] & USED:
+            rotation_date = max(rotation_date, batch.last_used[inactive_key])
+        delete_date = _inactive_delete_date(
+            evaluation, inactive_key, rotation_date)
+
+        if delete_date <= evaluation.now:
+            evaluation.emit(ActionKind.DELETE, inactive_key,
+                            ActionReasons.RECOVER_GRACE_PERIOD_END)
+            if rotate_date <= evaluation.warn:
+                evaluation.warn_pending_rotation(active_key, rotate_date)
+        elif rotate_date <= evaluation.warn:
+            evaluation.warn_pending_rotation(active_key, rotate_date,
+                                             inactive_key)
+        elif delete_date <= evaluation.warn:
+            evaluation.emit(ActionKind.WARN, inactive_key,
+                            ActionReasons.KEY_PENDING_DELETION, delete_date)
+
+
+def _rule_both_active(evaluation, keys, force_rotate):
+    # either a key has been rotated and we are in the install period,
+    # or the user has two active keys that need to be evaluated
+    log.info('--Key Logic: [Active, Active]')
+    batch = evaluation.batch
+    num_expired = sum(1 for k in keys if batch.status[k] & EXPIRED)
+
+    if num_expired == 2 or force_rotate:
+        # we have to pick one key to delete and rotate the other
+        if num_expired == 2:
+            delete_reason = ActionReasons.EXPIRED_ACTIVE_KEY_CONFLICT_LRU
+            rotate_reason = ActionReasons.EXPIRED_ACTIVE_KEY
+        else:
+            delete_reason = ActionReasons.FORCED_ROTATION_CONFLICT_LRU
+            rotate_reason = ActionReasons.FORCED_ROTATION
+        key_to_delete, key_to_rotate = _least_recently_used(
+            evaluation, keys[0], keys[1])
+        evaluation.emit(ActionKind.DELETE, key_to_delete, delete_reason)
+        evaluation.emit(ActionKind.ROTATE, key_to_rotate, rotate_reason)
+
+    elif num_expired == 1:
+        if batch.status[keys[0]] & EXPIRED:
+            expired_key, unexpired_key = keys
+        else:
+            unexpired_key, expired_key = keys
+        # we assume the creation date of the other key
+        # is the date the key was rotated
+        deactivate_date = batch.create[unexpired_key] + \
+            evaluation.installation_grace_period
+        rotate_date = batch.expire[unexpired_key]
+
+        if deactivate_date <= evaluation.now:
+            evaluation.emit(ActionKind.DEACTIVATE, expired_key,
+                            ActionReasons.INSTALL_GRACE_PERIOD_END)
+            if rotate_date <= evaluation.warn:
+                evaluation.warn_pending_rotation(unexpired_key, rotate_date)
+        elif rotate_date <= evaluation.warn:
+            evaluation.warn_pending_rotation(unexpired_key, rotate_date,
+                                             expired_key)
+        elif deactivate_date <= evaluation.warn:
+            evaluation.emit(ActionKind.WARN, expired_key,
+                            ActionReasons.KEY_PENDING_DEACTIVATION,
+                            deactivate_date)
+
+    else:
+        log.info('Keys are both valid.')
+        older_key, newer_key = sorted(keys, key=lambda k: batch.expire[k])
+        rotate_date = batch.expire[newer_key]
+        if rotate_date <= evaluation.warn:
+            evaluation.warn_pending_rotation(newer_key, rotate_date,
+                                             older_key)
+        # the older key can't be rotated due to the conflict
+        elif batch.status[older_key] & EXPIRING:
+            evaluation.emit(ActionKind.WARN, older_key,
+                            ActionReasons.KEY_PENDING_EXPIRATION_CONFLICT,
+                            batch.expire[older_key])
+
+
+def _rule_no_keys(evaluation, keys, force_rotate):
+    log.info('Skipping, no keys to evaluate.')
+
+
+# Rules by (number of keys, number of active keys)
+RULES = {
+    (0, 0): _rule_no_keys,
+    (1, 0): _rule_single_inactive,
+    (1, 1): _rule_single_active,
+    (2, 0): _rule_both_inactive,
+    (2, 1): _rule_active_inactive,
+    (2, 2): _rule_both_active,
+}
+
+
+def evaluate_batch(batch, now, config):
+    """
+    Classifies all keys of a batch in one pass.
+
+    :return The action queue for the keys of the batch, in user order.
+    """
+    evaluation = _Evaluation(batch, now, config)
+    status = batch.status
+    expire = batch.expire
+
+    # expiry bits depend on the time of the evaluation
+    for index in range(len(batch.keys)):
+        if expire[index] <= evaluation.now:
+            status[index] |= EXPIRED
+        if expire[index] <= evaluation.warn:
+            status[index] |= EXPIRING
+
+    offsets = batch.user_offsets
+    for user in range(len(offsets) - 1):
+        log.info(f'--Evaluating keys for user [{batch.user_names[user]}].')
+        keys = []
+        for index in range(offsets[user], offsets[user + 1]):
+            # unused keys are deleted once expired and warned about before
+            if not status[index] & USED:
+                if status[index] & EXPIRED:
+                    evaluation.emit(ActionKind.DELETE, index,
+                                    ActionReasons.UNUSED_EXPIRED_KEY)
+                    continue
+                if status[index] & EXPIRING:
+                    evaluation.emit(ActionKind.WARN, index,
+                                    ActionReasons.UNUSED_KEY_PENDING_DELETION,
+                                    expire[index])
+            keys.append(index)
+
+        num_active = sum(1 for k in keys if status[k] & ACTIVE)
+        rule = RULES.get((len(keys), num_active))
+        if rule is not None:
+            rule(evaluation, keys, batch.force_rotate[user])
+
+    # Return compiled list of remediation options
+    return evaluation.action_queue
+
+
+def get_next_check(key_records, now, config):
+    """
+    Gets the date the actions for the keys of a user can change next, which
+    is when the warn period of the first upcoming deadline starts. Deadlines
+    are the expiry of a key and the end of the grace periods counted from
+    its creation, its last use or its recorded deactivation.
+
+    :return The date the keys need to be evaluated again, or None if no
+        deadline is coming up.
+    """
+    installation_grace_period = datetime.timedelta(
+        days=config.installation_grace_period)
+    recovery_grace_period = datetime.timedelta(
+        days=config.recovery_grace_period)
+
+    deadlines = []
+    for key in key_records:
+        deadlines += [key.expire_date,
+                      key.create_date + installation_grace_period,
+                      key.create_date + installation_grace_period +
+                      recovery_grace_period]
+        if not key.active and key.last_used_date is not None:
+            deadlines.append(key.last_used_date + installation_grace_period +
+                             recovery_grace_period)
+        if key.deactivate_date is not None:
+            deadlines.append(key.deactivate_date + recovery_grace_period)
+
+    upcoming = [deadline for deadline in deadlines if deadline > now]
+    if not upcoming:
+        return None
+    return min(upcoming) - datetime.timedelta(
+        days=config.pending_action_warn_period)
@@ -0,0 +1,101 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Key Records.
+
+This module provides the compact, immutable records for access keys and
+the actions taken on them, which are passed from the scan to the execution
+of actions and the notifications.
+"""
+
+import datetime
+
+from enum import IntEnum
+
+
+class ActionKind(IntEnum):
+    ROTATE = 1
+    DEACTIVATE = 2
+    DELETE = 3
+    WARN = 4
+
+
+class _Record:
+    """Base of records with fixed fields that cannot be changed."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}'
+                           for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class KeyRecord(_Record):
+    """Access key of a user as evaluated by the scan.
+
+    :param user_name: Name of the user the key belongs to
+    :param access_key_id: Id of the access key
+    :param active: Whether the key is active
+    :param create_date: Date the key was created
+    :param last_used_date: Date the key was last used, None if never used
+    :param expire_date: Date the key is due for rotation
+    :param deactivate_date: Date the rotation deactivated the key, None if
+        it is active or was not deactivated by a recorded run
+    """
+
+    __slots__ = ('user_name', 'access_key_id', 'active', 'create_date',
+                 'last_used_date', 'expire_date', 'deactivate_date')
+
+    def __init__(self, user_name, access_key_id, active, create_date,
+                 last_used_date, expire_date, deactivate_date=None):
+        set_field = object.__setattr__
+        set_field(self, 'user_name', user_name)
+        set_field(self, 'access_key_id', access_key_id)
+        set_field(self, 'active', active)
+        set_field(self, 'create_date', create_date)
+        set_field(self, 'last_used_date', last_used_date)
+        set_field(self, 'expire_date', expire_date)
+        set_field(self, 'deactivate_date', deactivate_date)
+
+    @classmethod
+    def from_metadata(cls, key_metadata, last_used_date, rotation_period,
+                      deactivate_date=None):
+        """
+        Creates a record from a list_access_keys AccessKeyMetadata entry.
+
+        :return KeyRecord of the access key.
+        """
+        create_date = key_metadata['CreateDate']
+        active = key_metadata['Status'] == 'Active'
+        return cls(key_metadata['UserName'], key_metadata['AccessKeyId'],
+                   active, create_date, last_used_date,
+                   create_date + datetime.timedelta(days=rotation_period),
+                   None if active else deactivate_date)
+
+
+class KeyAction(_Record):
+    """Action to be taken on an access key.
+
+    :param kind: ActionKind of the action
+    :param key: KeyRecord the action applies to
+    :param reason: ActionReasons member explaining the action
+    :param action_date: Date a warned action will happen, only set for WARN
+    """
+
+    __slots__ = ('kind', 'key', 'reason', 'action_date')
+
+    def __init__(self, kind, key, reason, action_date=None):
+        set_field = object.__setattr__
+        set_field(self, 'kind', kind)
+        set_field(self, 'key', key)
+        set_field(self, 'reason', reason)
+        set_field(self, 'action_date', action_date)
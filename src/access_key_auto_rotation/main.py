@@ -9,12 +9,14 @@ import time
 
 from config import Config, log
 from sts_connection_handler import get_account_session
+from client_registry import ClientRegistry
+from run_context import RunContext
+from state_store import get_state_store
 from force_rotation_handler import check_force_rotate_users
+from user_filter import UserFilter
 from account_scan import get_actions_for_account
-from notification_handler import send_to_notifier
-from key_actions import log_actions, execute_actions
-
-timestamp = int(round(time.time() * 1000))
+from account_run import apply_actions, get_account_summary
+from capabilities import Capabilities, check_dryrun
 
 config = Config()
 
@@ -22,12 +24,48 @@ config = Config()
 def lambda_handler(event, context):
     """Handler for Lambda.
 
-    :param event: Dictionary account object (Account ID and Email) sent to Lambda via 'Account Inventory' Lambda Function
+    :param event: Dictionary account object (Account ID and Email) sent to Lambda via 'Account Inventory' Lambda Function,
+        or a batch of them under "accounts"
     :param context: Lambda context object
     """
 
     log.info('Function starting.')
 
+    if "accounts" in event:
+        # several accounts are sent per invoke to save cold starts
+        log.info(f'Evaluating a batch of {len(event["accounts"])} accounts.')
+        summaries = []
+        for account_event in event['accounts']:
+            start = time.monotonic()
+            try:
+                summaries.append(process_account(account_event, context))
+            except Exception as error:
+                # keep going so one account cannot fail the whole batch
+                log.error(f'Failed to evaluate Account ID:'
+                          f' {account_event.get("account")}. Raw Error: {error}')
+                summaries.append({
+                    'account': account_event.get('account'),
+                    'error': str(error),
+                    'duration_ms': int((time.monotonic() - start) * 1000)
+                })
+        result = {'accounts': summaries}
+    else:
+        result = process_account(event, context)
+
+    log.info('---------------------------')
+    log.info('Function has completed.')
+    return result
+
+
+def process_account(event, context):
+    """Evaluates and rotates the keys of a single account.
+
+    :param event: Dictionary account object (Account ID and Email)
+    :param context: Lambda context object
+    :return Dictionary summary of the account run.
+    """
+    start = time.monotonic()
+
     # Error handling - Ensure that the correct object is getting passed
     # to the function
     if "account" not in event and "email" not in event and "name" not in event:
@@ -39,8 +77,18 @@ def lambda_handler(event, context):
     # check for users to be force rotated via test event
     force_rotate_users = check_force_rotate_users(event)
 
-    # check for dryrun flag
+    # actions the account inventory found denied to the assumed role
+    capabilities = Capabilities.from_event(event)
+
+    # check for dryrun flag, forced if the assumed role may not change keys
     dryrun = str(event.get('dryrun')).lower() == 'true' or config.dryrun
+    dryrun = check_dryrun(capabilities, dryrun)
+
+    # a reconcile scans every user regardless of the stored key state
+    reconcile = str(event.get('reconcile')).lower() == 'true'
+
+    # only look up selected users, e.g. for a rotation requested for a user
+    user_filter = UserFilter.from_event(event, force_rotate_users)
 
     # Parse event to get Account ID and Email
     aws_account_id = event['account']
@@ -49,17 +97,16 @@ def lambda_handler(event, context):
     log.info(f'Currently evaluating Account ID: {aws_account_id} | Account Name: {account_name}')
 
     account_session = get_account_session(aws_account_id)
-    action_queue = get_actions_for_account(account_session, force_rotate_users)
-
-    if action_queue:
-        log_actions(action_queue, dryrun)
-        if dryrun:
-            send_to_notifier(context, aws_account_id, account_name, account_email,
-                             action_queue, dryrun, config.emailTemplateAudit)
-        else:
-            execute_actions(action_queue, account_session)
-            send_to_notifier(context, aws_account_id, account_name, account_email,
-                             action_queue, dryrun, config.emailTemplateEnforce)
-
-    log.info('---------------------------')
-    log.info('Function has completed.')
+    # clients are created once and shared by the scan and the actions
+    clients = ClientRegistry(account_session,
+                             max(config.scanWorkers, config.actionWorkers))
+    run_context = RunContext(aws_account_id, clients, get_state_store(),
+                             capabilities)
+    action_queue = get_actions_for_account(run_context, force_rotate_users,
+                                           reconcile, user_filter)
+
+    action_results = apply_actions(context, run_context, account_name,
+                                   account_email, action_queue, dryrun)
+
+    return get_account_summary(aws_account_id, action_queue, dryrun, start,
+                               action_results)
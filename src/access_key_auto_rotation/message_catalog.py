@@ -0,0 +1,172 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Message Catalog.
+
+This module provides the messages of the actions listed in notifications.
+Every ActionReasons member maps to a format template that is resolved once
+per run, and catalogs for other languages can be registered by locale.
+"""
+
+import re
+import string
+
+from key_policy import ActionReasons
+from key_records import ActionKind
+
+# fields of the action and warning format templates, in the order the
+# compiled messages take them
+ACTION_FIELDS = ('action', 'user_name', 'access_key_id', 'reason', 'error')
+WARNING_FIELDS = ('user_name', 'access_key_id', 'days')
+
+# Messages of executed, dryrun and failed rotate, deactivate and delete
+# actions, by outcome
+ACTION_FORMATS = {
+    'FAILED': 'FAILED: {action} key {user_name}:{access_key_id}.'
+              '  {reason}  {error}',
+    'DRYRUN': 'DRYRUN: {action} key {user_name}:{access_key_id}.  {reason}',
+    'ACTION': 'ACTION: {action} key {user_name}:{access_key_id}.  {reason}'
+}
+
+# Messages of warnings of upcoming actions, by reason
+WARNING_FORMATS = {
+    ActionReasons.KEY_PENDING_ROTATION:
+        'WARNING: Key {user_name}:{access_key_id} will expire in {days} days'
+        ' and will be rotated.  Please be ready to install the new key.',
+    ActionReasons.KEY_PENDING_DEACTIVATION:
+        'WARNING: Key {user_name}:{access_key_id} installation grace period'
+        ' will end in {days} days and will be deactivated.  Please verify'
+        ' the new key is installed.',
+    ActionReasons.KEY_PENDING_DELETION:
+        'WARNING: Key {user_name}:{access_key_id} recovery grace period will'
+        ' end in {days} days and will be permanently deleted.  Please verify'
+        ' the new key is installed and working.',
+    ActionReasons.UNUSED_KEY_PENDING_DELETION:
+        'WARNING: Key {user_name}:{access_key_id} will expire in {days} days'
+        ' and has never been used.  Key will be permanently deleted.',
+    ActionReasons.KEY_PENDING_EXPIRATION_CONFLICT:
+        'CRITICAL: Key {user_name}:{access_key_id} will expire in {days} days'
+        ' and cannot be rotated because another key exists for the user!'
+        '  It will be permanently deleted when the other key expires or the'
+        ' grace period ends!  Please make sure this key is not being used!',
+    ActionReasons.KEY_PENDING_DELETION_CONFLICT:
+        'CRITICAL: Key {user_name}:{access_key_id} will be permanently'
+        ' deleted in {days} days due to a conflict with another key for the'
+        ' user!  It may be deactivated sooner if the grace period ends!'
+        '  Please make sure this key is not being used!'
+}
+
+
+def compile_message(template, fields):
+    """
+    Compiles a format template into a function taking its fields as
+    positional arguments. The field names are resolved to their positions
+    once, so formatting a message is a single str.format call without
+    building a dictionary of the fields.
+
+    :return Function formatting the message.
+    """
+    source = []
+    for literal, field, format_spec, conversion in \
+            string.Formatter().parse(template):
+        source.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        # attribute and index lookups follow the name of the field
+        name, lookup = re.match(r'([^.[]*)(.*)', field).groups()
+        if name not in fields:
+            raise KeyError(name)
+        source.append('{' + str(fields.index(name)) + lookup
+                      + ('!' + conversion if conversion else '')
+                      + (':' + format_spec if format_spec else '') + '}')
+    return ''.join(source).format
+
+
+class MessageCatalog:
+    """Messages of the actions in one language.
+
+    :param action_formats: Dictionary of the 'FAILED', 'DRYRUN' and 'ACTION'
+        format templates
+    :param warning_formats: Dictionary of ActionReasons to the format
+        templates of warnings
+    :param reasons: Dictionary of ActionReasons to their text, the English
+        value of the member if missing
+    :param action_names: Dictionary of ActionKind to their name, the name
+        of the member if missing
+    """
+
+    def __init__(self, action_formats, warning_formats, reasons=None,
+                 action_names=None):
+        self.action_formats = action_formats
+        self.warning_formats = warning_formats
+        self.reasons = reasons or {}
+        self.action_names = action_names or {}
+
+    def format_actions(self, action_queue, dryrun, action_errors, now):
+        """
+        Formats the messages of the actions of a run. The format templates
+        are looked up once, and the days until a warned action are computed
+        once per action date.
+
+        :param action_errors: Dictionary of id of a KeyAction to its error
+        :param now: Date the days until warned actions are counted from
+        :return Generator of the action messages.
+        """
+        action_format = compile_message(
+            self.action_formats['DRYRUN' if dryrun else 'ACTION'],
+            ACTION_FIELDS)
+        failed_format = compile_message(self.action_formats['FAILED'],
+                                        ACTION_FIELDS)
+        warning_formats = {
+            reason: compile_message(message_format, WARNING_FIELDS)
+            for reason, message_format in self.warning_formats.items()}
+        reasons = {reason: self.reasons.get(reason, reason.value)
+                   for reason in ActionReasons}
+        action_names = {kind: self.action_names.get(kind, kind.name)
+                        for kind in ActionKind}
+        days_until = {}
+
+        for key_action in action_queue:
+            kind = key_action.kind
+            key = key_action.key
+            if kind == ActionKind.WARN:
+                message_format = warning_formats.get(key_action.reason)
+                if message_format is None:
+                    yield ''
+                    continue
+                action_date = key_action.action_date
+                days = days_until.get(action_date)
+                if days is None:
+                    days = round((action_date - now).total_seconds() / 86400)
+                    days_until[action_date] = days
+                yield message_format(key.user_name, key.access_key_id, days)
+            else:
+                error = action_errors.get(id(key_action))
+                message_format = action_format \
+                    if error is None else failed_format
+                yield message_format(action_names[kind], key.user_name,
+                                     key.access_key_id,
+                                     reasons[key_action.reason], error)
+
+
+# catalogs by locale, other languages are added with register_catalog
+_catalogs = {'en': MessageCatalog(ACTION_FORMATS, WARNING_FORMATS)}
+
+
+def register_catalog(locale, catalog):
+    """
+    Registers the messages of a language, used for the notifications when
+    NOTIFICATION_LOCALE is set to its locale.
+    """
+    _catalogs[locale] = catalog
+
+
+def get_catalog(locale):
+    """
+    Gets the messages of a language, falling back to English.
+
+    :return MessageCatalog of the locale.
+    """
+    return _catalogs.get(locale) or _catalogs['en']
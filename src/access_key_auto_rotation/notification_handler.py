@@ -7,20 +7,35 @@
 
 Function for formatting JSON object and invoking the Notifier Module's Lambda.
 """
-import json
+import functools
 import boto3
 import datetime
-import dateutil.tz
 
 from aws_partitions import get_partition_name
-from account_scan import ActionReasons
+from message_catalog import get_catalog
+from payload_encoder import PayloadEncoder
 from config import Config, log
 
 config = Config()
 
 
+def iter_action_messages(action_queue, dryrun, action_results=(), now=None):
+    """
+    Formats the messages of the actions of a run as they are consumed, so
+    large action queues are not held in memory twice.
+
+    :return Generator of the action messages.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    # errors of actions that could not be executed
+    action_errors = {id(result['action_spec']): result['error']
+                     for result in action_results if result['error']}
+    return get_catalog(config.notificationLocale).format_actions(
+        action_queue, dryrun, action_errors, now)
+
+
 def format_notifier_payload(context, account_id, account_name, account_email, action_queue,
-                            dryrun, email_template):
+                            dryrun, email_template, action_results=()):
     lambdaArn = str(context.invoked_function_arn)
     partition = lambdaArn.split(':')[1]
     partition_name = get_partition_name(partition)
@@ -31,70 +46,15 @@ def format_notifier_payload(context, account_id, account_name, account_email, ac
     subject = "[IMPORTANT] AWS IAM Access Key Security Violation" \
               " Detected in your Account."
 
-    actions_formatted = []
-    for action_spec in action_queue:
-        action = action_spec['action']
-        key_metadata = action_spec['key']
-        user_name = key_metadata['UserName']
-        access_key_id = key_metadata["AccessKeyId"]
-        reason = action_spec['reason']
-        message = ''
-        if action != 'WARN':
-            if dryrun:
-                message = f'DRYRUN: {action} key {user_name}:{access_key_id}.' \
-                          f'  {reason.value}'
-            else:
-                message = f'ACTION: {action} key {user_name}:{access_key_id}.' \
-                          f'  {reason.value}'
-        else:
-            action_date = action_spec['action_date']
-            delta = action_date - now
-            delta_days = round(delta.total_seconds() / 86400)
-
-            if reason == ActionReasons.KEY_PENDING_ROTATION:
-                message = f'WARNING: Key {user_name}:{access_key_id} ' \
-                          f'will expire in {delta_days} days and will be ' \
-                          f'rotated.  Please be ready to install the new key.'
-            elif reason == ActionReasons.KEY_PENDING_DEACTIVATION:
-                message = f'WARNING: Key {user_name}:{access_key_id} ' \
-                          f'installation grace period will end in' \
-                          f' {delta_days} days and will be deactivated.' \
-                          f'  Please verify the new key is installed.'
-            elif reason == ActionReasons.KEY_PENDING_DELETION:
-                message = f'WARNING: Key {user_name}:{access_key_id} ' \
-                          f'recovery grace period will end in' \
-                          f' {delta_days} days and will be permanently ' \
-                          f'deleted.  Please verify the new key is ' \
-                          f'installed and working.'
-            elif reason == ActionReasons.UNUSED_KEY_PENDING_DELETION:
-                message = f'WARNING: Key {user_name}:{access_key_id} ' \
-                          f'will expire in {delta_days} days and has never ' \
-                          f'been used.  Key will be permanently deleted.'
-            elif reason == ActionReasons.KEY_PENDING_EXPIRATION_CONFLICT:
-                message = f'CRITICAL: Key {user_name}:{access_key_id} ' \
-                          f'will expire in {delta_days} days and cannot ' \
-                          f'be rotated because another key exists for the ' \
-                          f'user!  It will be permanently deleted when the' \
-                          f' other key expires or the grace period ends!  ' \
-                          f'Please make sure this key is not being used!'
-            elif reason == ActionReasons.KEY_PENDING_DELETION_CONFLICT:
-                message = f'CRITICAL: Key {user_name}:{access_key_id} ' \
-                          f'will be permanently deleted in {delta_days} days' \
-                          f' due to a conflict with another key for the ' \
-                          f'user!  It may be deactivated sooner if the grace' \
-                          f' period ends!  Please make sure this key is not' \
-                          f' being used!'
-
-        actions_formatted.append(message)
+    action_messages = iter_action_messages(action_queue, dryrun,
+                                           action_results, now)
 
     # Timestamp for function runtime/invoked date
-    now = datetime.datetime.now(tz=dateutil.tz.gettz('UTC'))
     timestamp = now.isoformat()
     template_values = {
         'account_id': account_id,
         'account_name': account_name,
         'timestamp': timestamp,
-        'actions': actions_formatted,
         'rotation_period': config.rotationPeriod,
         'installation_grace_period': config.installation_grace_period,
         'recovery_grace_period': config.recovery_grace_period,
@@ -109,27 +69,109 @@ def format_notifier_payload(context, account_id, account_name, account_email, ac
         "template_values": template_values
     }
 
-    lambdaPayloadEncoded = json.dumps(jsonPayload).encode('utf-8')
+    # the action list is measured while it is encoded and spilled to S3
+    # when the payload would exceed the invoke size limit
+    lambdaPayloadEncoded = get_payload_encoder().encode(
+        jsonPayload, action_messages,
+        f'{account_id}/{now.strftime("%Y%m%dT%H%M%S")}')
 
     return lambdaPayloadEncoded
 
 
+# payload bytes written to the log, the full payload can be large for
+# accounts with many actions
+PAYLOAD_LOG_LIMIT = 512
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(service_name):
+    """
+    Creates a client of the primary account once per container.
+
+    :return boto3 client of the service.
+    """
+    return boto3.client(service_name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_payload_encoder():
+    """
+    Creates the payload encoder once per container.
+
+    :return PayloadEncoder spilling to the configured bucket or directory.
+    """
+    return PayloadEncoder(config.payloadSpillSize,
+                          get_client('s3') if config.notificationBucket else None,
+                          config.notificationBucket, config.payloadSpillDir)
+
+
+def summarize_payload(lambdaPayloadEncoded, account_id, action_queue):
+    """
+    Summarizes a payload for the log, capped to PAYLOAD_LOG_LIMIT bytes.
+
+    :return String summary of the payload.
+    """
+    preview = lambdaPayloadEncoded[:PAYLOAD_LOG_LIMIT].decode('utf-8', 'ignore')
+    if len(lambdaPayloadEncoded) > PAYLOAD_LOG_LIMIT:
+        preview += '...'
+    return f'Account={account_id}, Actions={len(action_queue)},' \
+           f' Size={len(lambdaPayloadEncoded)} bytes, Payload={preview}'
+
+
 def send_to_notifier(context, account_id, account_name, account_email, action_queue, dryrun,
-                     email_template):
+                     email_template, action_results=()):
     lambdaPayloadEncoded = format_notifier_payload(context, account_id, account_name,
                                                    account_email, action_queue,
-                                                   dryrun, email_template)
+                                                   dryrun, email_template,
+                                                   action_results)
+    summary = summarize_payload(lambdaPayloadEncoded, account_id, action_queue)
+
+    if config.notificationDigest and config.digestQueueUrl:
+        # the digest sends the actions of all accounts of a recipient in
+        # one email per day
+        return send_to_queue(config.digestQueueUrl, lambdaPayloadEncoded,
+                             summary)
+
+    if config.notificationBatching and config.notificationQueueUrl:
+        # the Notifier sends the queued notifications in batches
+        return send_to_queue(config.notificationQueueUrl,
+                             lambdaPayloadEncoded, summary)
 
     # AWS Lambda Client
-    lambda_client = boto3.client('lambda')
+    lambda_client = get_client('lambda')
 
+    # the actions are already taken, a lost notification does not fail the
+    # run
     try:
         response = lambda_client.invoke(FunctionName=config.notifierLambdaArn,
                                         InvocationType='Event',
                                         Payload=lambdaPayloadEncoded)
-        log.info(
-            f"--Invoked Lambda Function={config.notifierLambdaArn},"
-            f" InvocationType=Event, Payload={str(lambdaPayloadEncoded)}")
     except lambda_client.exceptions.ClientError as error:
-        print(error)
+        log.error(f"--Unable to invoke Lambda Function="
+                  f"{config.notifierLambdaArn}, {summary}. Error: {error}")
+        return None
+    log.info(
+        f"--Invoked Lambda Function={config.notifierLambdaArn},"
+        f" InvocationType=Event, {summary}")
+    return response
+
+
+def send_to_queue(queue_url, lambdaPayloadEncoded, summary):
+    """
+    Queues a notification for the Notifier or the digest.
+
+    :return Response from SendMessage, None if the notification could not
+        be queued.
+    """
+    sqs_client = get_client('sqs')
+
+    try:
+        response = sqs_client.send_message(
+            QueueUrl=queue_url,
+            MessageBody=lambdaPayloadEncoded.decode('utf-8'))
+    except sqs_client.exceptions.ClientError as error:
+        log.error(f"--Unable to queue notification to {queue_url},"
+                  f" {summary}. Error: {error}")
+        return None
+    log.info(f"--Queued notification to {queue_url}, {summary}")
     return response
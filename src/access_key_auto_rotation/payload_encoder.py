@@ -0,0 +1,117 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Payload Encoder.
+
+This module provides the encoding of Notifier payloads within the size
+limit of asynchronous Lambda invokes and SQS messages. The size of the
+action list is measured while it is built, and lists that do not fit are
+written to S3, or a local directory when testing, and passed by reference
+with a short preview.
+"""
+
+import itertools
+import json
+import os
+import tempfile
+import uuid
+
+from config import log
+
+# actions kept in the payload of a spilled action list
+PREVIEW_ACTIONS = 20
+
+
+class PayloadEncoder:
+    """Encodes Notifier payloads up to a maximum size.
+
+    :param spill_size: Maximum payload size in bytes before the action list
+        is spilled
+    :param s3_client: S3 client of the bucket spilled action lists are
+        written to
+    :param bucket: Name of the bucket spilled action lists are written to
+    :param spill_dir: Local directory spilled action lists are written to
+        instead of S3, for testing
+    """
+
+    def __init__(self, spill_size, s3_client=None, bucket=None,
+                 spill_dir=None):
+        self.spill_size = spill_size
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.spill_dir = spill_dir
+
+    def encode(self, payload, actions, name):
+        """
+        Encodes a payload with the action list of its template values. The
+        action list is only kept in the payload while the payload fits in
+        the spill size.
+
+        :param payload: Dictionary payload without the action list
+        :param actions: Iterable of action messages
+        :param name: Name the action list is spilled under
+        :return Bytes of the JSON payload.
+        """
+        template_values = payload['template_values']
+        template_values['actions'] = []
+        size = len(json.dumps(payload))
+
+        actions = iter(actions)
+        buffered = []
+        for action in actions:
+            # the encoded action and its ", " separator
+            size += len(json.dumps(action)) + 2
+            buffered.append(action)
+            if size > self.spill_size:
+                count, reference = self._spill(
+                    name, itertools.chain(buffered, actions))
+                template_values['actions'] = buffered[:PREVIEW_ACTIONS]
+                payload['actions_count'] = count
+                if reference is not None:
+                    payload['actions_ref'] = reference
+                break
+        else:
+            template_values['actions'] = buffered
+
+        return json.dumps(payload).encode('utf-8')
+
+    @staticmethod
+    def _write(file, actions):
+        count = 0
+        for action in actions:
+            file.write(json.dumps(action).encode('utf-8') + b'\n')
+            count += 1
+        return count
+
+    def _spill(self, name, actions):
+        """
+        Writes the action list as one JSON string per line.
+
+        :return Tuple of the number of actions and the reference to the
+            written list, None if no spill location is configured.
+        """
+        key = f'notifications/{name}-{uuid.uuid4().hex[:8]}.jsonl'
+        if self.spill_dir:
+            path = os.path.join(self.spill_dir, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                count = self._write(file, actions)
+            reference = {'path': path}
+        elif self.bucket:
+            # streamed through a file so the list is not held in memory
+            with tempfile.TemporaryFile() as file:
+                count = self._write(file, actions)
+                file.seek(0)
+                self.s3_client.upload_fileobj(file, self.bucket, key)
+            reference = {'bucket': self.bucket, 'key': key}
+        else:
+            count = sum(1 for _ in actions)
+            log.error(f'--Payload of {name} exceeds {self.spill_size} bytes'
+                      f' and no spill location is configured, only the'
+                      f' first {PREVIEW_ACTIONS} of {count} actions are'
+                      f' notified.')
+            return count, None
+        log.info(f'--Spilled {count} actions of {name} to {reference}')
+        return count, reference
@@ -0,0 +1,74 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Run Context.
+
+This module provides the per account run context that carries what is
+already known about an account from the scan phase into the execution of
+actions, so rotations do not need to look it up again.
+"""
+
+import threading
+
+from aws_partitions import get_partition_for_region, get_iam_region,\
+    get_partition_regions
+from secret_sync import SecretSync
+from capabilities import Capabilities
+
+
+def get_replication_regions(partition):
+    # TODO: parameterize this instead of hardcoding
+    if partition == 'aws-us-gov':
+        return ['us-gov-east-1']
+    elif partition == 'aws':
+        return ['us-east-2', 'us-west-1', 'us-west-2']
+    return list(get_partition_regions(partition))
+
+
+class RunContext:
+    """State of a single account run.
+
+    :param account_id: Id of the account being evaluated
+    :param clients: ClientRegistry of the assumed role session
+    :param state_store: StateStore for incremental scans, None to scan
+        every user
+    :param capabilities: Capabilities of the assumed role, every action is
+        allowed if None
+    """
+
+    def __init__(self, account_id, clients, state_store=None,
+                 capabilities=None):
+        self.account_id = account_id
+        self.clients = clients
+        self.state_store = state_store
+        self.capabilities = capabilities or Capabilities()
+
+        # use default iam regions to store secrets
+        self.partition = get_partition_for_region(clients.region_name)
+        self.iam_region = get_iam_region(self.partition)
+        self.replication_regions = get_replication_regions(self.partition)
+
+        # user name to user arn, filled in by the scan
+        self.user_arns = {}
+        # user name to stored state of the users scanned in this run
+        self.user_states = {}
+
+        self._secret_sync = None
+        self._lock = threading.Lock()
+
+    def get_secret_sync(self):
+        """
+        Gets the secret sync stage of the run, created on first use so
+        runs without rotations do not create a Secrets Manager client.
+
+        :return SecretSync for the account.
+        """
+        with self._lock:
+            if self._secret_sync is None:
+                self._secret_sync = SecretSync(
+                    self.clients.client('secretsmanager',
+                                        region_name=self.iam_region),
+                    self.replication_regions)
+            return self._secret_sync
@@ -0,0 +1,122 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Secret Sync.
+
+This module provides the functionality to store rotated access keys in
+Secrets Manager with as few writes as possible. The managed secrets of an
+account are listed once per run. The replica regions and resource policy of
+a rotated secret are read back from Secrets Manager and only written when
+they differ, so changes made outside the rotation are corrected as well.
+"""
+
+import json
+import threading
+
+from config import Config, log
+
+
+def _parse_policy(policy_document):
+    try:
+        return json.loads(policy_document)
+    except (TypeError, ValueError):
+        return None
+
+
+class SecretSync:
+    """Syncs access key secrets of one account run.
+
+    :param sm_client: Secrets Manager client in the region the secrets are
+        stored in
+    :param replication_regions: Regions every secret is replicated to
+    """
+
+    def __init__(self, sm_client, replication_regions):
+        self.sm_client = sm_client
+        self.replication_regions = frozenset(replication_regions)
+        self._secret_names = None
+        self._lock = threading.Lock()
+
+    def _list_secrets(self):
+        config = Config()
+        prefix, suffix = config.secretNameFormat.split('{}')
+
+        secret_names = set()
+        paginator = self.sm_client.get_paginator('list_secrets')
+        page_iterator = paginator.paginate(
+            Filters=[{'Key': 'name', 'Values': [prefix]}])
+        for page in page_iterator:
+            for secret in page['SecretList']:
+                name = secret['Name']
+                if name.startswith(prefix) and name.endswith(suffix):
+                    secret_names.add(name)
+        log.info(f'Found {len(secret_names)} managed access key secrets.')
+        return secret_names
+
+    def _secret_exists(self, secret_name):
+        with self._lock:
+            # one paginated listing per account run
+            if self._secret_names is None:
+                self._secret_names = self._list_secrets()
+            return secret_name in self._secret_names
+
+    def _add_secret(self, secret_name):
+        with self._lock:
+            self._secret_names.add(secret_name)
+
+    def _sync_replication(self, secret_name):
+        replication_status = self.sm_client.describe_secret(
+            SecretId=secret_name).get('ReplicationStatus', [])
+        current_replication_regions = [
+            x['Region'] for x in replication_status]
+        missing_regions = [x for x in self.replication_regions
+                           if x not in current_replication_regions]
+        if missing_regions:
+            self.sm_client.replicate_secret_to_regions(
+                SecretId=secret_name,
+                AddReplicaRegions=[{'Region': x} for x in missing_regions],
+                ForceOverwriteReplicaSecret=True
+            )
+
+    def _sync_policy(self, secret_name, policy_document):
+        current_policy = self.sm_client.get_resource_policy(
+            SecretId=secret_name).get('ResourcePolicy')
+        if _parse_policy(current_policy) != _parse_policy(policy_document):
+            self._put_policy(secret_name, policy_document)
+
+    def _put_policy(self, secret_name, policy_document):
+        self.sm_client.put_resource_policy(
+            SecretId=secret_name, ResourcePolicy=policy_document,
+            BlockPublicPolicy=True)
+
+    def sync_secret(self, secret_name, secret_string, policy_document):
+        """
+        Stores the secret value and makes sure the secret is replicated to
+        all regions and has the resource policy. The replication and policy
+        of an existing secret are read on every rotation and only written
+        when they differ.
+        """
+        if not self._secret_exists(secret_name):
+            try:
+                self.sm_client.create_secret(
+                    Name=secret_name, Description='Auto-created secret',
+                    SecretString=secret_string,
+                    AddReplicaRegions=[
+                        {'Region': x} for x in self.replication_regions],
+                    ForceOverwriteReplicaSecret=True
+                )
+                self._put_policy(secret_name, policy_document)
+                self._add_secret(secret_name)
+                return
+            except self.sm_client.exceptions.ResourceExistsException:
+                # created since the listing, sync it like an existing secret
+                pass
+
+        self.sm_client.put_secret_value(SecretId=secret_name,
+                                        SecretString=secret_string)
+        # make sure secret is replicated to all regions
+        self._sync_replication(secret_name)
+        self._sync_policy(secret_name, policy_document)
+        self._add_secret(secret_name)
@@ -0,0 +1,504 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Key State Store.
+
+This module provides the stores that persist the access key state of every
+user between runs, so a daily run only needs to scan the users whose keys
+have a deadline coming up, while a periodic full scan catches everything
+else.
+
+A user state is a dict with the 'user_name', the 'next_check' date the
+user has to be scanned again (None if no deadline is coming up) and the
+'keys' of the user by access key id. Each key records its 'status',
+'create_date', 'last_used_date' and, once the rotation deactivated it, the
+'deactivate_date'.
+"""
+
+import datetime
+import functools
+import json
+import random
+import threading
+import time
+
+from config import Config, log
+from key_records import ActionKind
+
+# Sort key of the item holding the time of the last full scan, IAM user
+# names cannot contain '#'
+WATERMARK_KEY = '#WATERMARK'
+
+# Partition key of the items holding the date each account is due next, read
+# by the account inventory to only dispatch accounts with something due
+SCHEDULE_PARTITION = '#SCHEDULE'
+
+# DynamoDB accepts at most 25 items per BatchWriteItem request
+BATCH_WRITE_SIZE = 25
+
+# Unprocessed items of a BatchWriteItem request are not retried by the
+# client, they are resent with full jitter exponential backoff
+BATCH_WRITE_MAX_ATTEMPTS = 8
+BATCH_WRITE_BASE_BACKOFF = 0.05
+BATCH_WRITE_MAX_BACKOFF = 5
+
+KEY_DATE_FIELDS = ('create_date', 'last_used_date', 'deactivate_date')
+
+
+def _encode_date(date):
+    # fixed width UTC strings, so stored dates also sort chronologically
+    if date is None:
+        return None
+    return date.astimezone(datetime.timezone.utc).isoformat(
+        timespec='microseconds')
+
+
+def _decode_date(value):
+    return datetime.datetime.fromisoformat(value) \
+        if value is not None else None
+
+
+def encode_keys(keys):
+    return json.dumps({
+        access_key_id: dict(key, **{
+            field: _encode_date(key.get(field)) for field in KEY_DATE_FIELDS})
+        for access_key_id, key in keys.items()})
+
+
+def decode_keys(value):
+    return {
+        access_key_id: dict(key, **{
+            field: _decode_date(key.get(field)) for field in KEY_DATE_FIELDS})
+        for access_key_id, key in json.loads(value).items()}
+
+
+class StateStore:
+    """Interface of the key state stores."""
+
+    def get_account_state(self, account_id):
+        """
+        Loads the state of all users of an account.
+
+        :return Tuple of the user states by user name and the time of the
+            last full scan, or None if the account was never fully scanned.
+        """
+        raise NotImplementedError
+
+    def get_user(self, account_id, user_name):
+        """
+        Loads the state of a single user.
+
+        :return Dict user state, or None if the user is not stored.
+        """
+        raise NotImplementedError
+
+    def put_users(self, account_id, user_states):
+        raise NotImplementedError
+
+    def delete_users(self, account_id, user_names):
+        raise NotImplementedError
+
+    def set_watermark(self, account_id, timestamp):
+        raise NotImplementedError
+
+    def set_next_due(self, account_id, next_due):
+        raise NotImplementedError
+
+    def lower_next_due(self, account_id, next_due):
+        """
+        Moves the next due date of a scheduled account forward to next_due
+        if it is earlier. Accounts that were never scheduled are left as
+        they are, they are always due.
+        """
+        raise NotImplementedError
+
+    def get_schedule(self):
+        """
+        Loads the date each account is due to be evaluated next.
+
+        :return Dict of account id to next due date.
+        """
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    """Keeps the state in memory, for tests and local runs."""
+
+    def __init__(self):
+        self._users = {}
+        self._watermarks = {}
+        self._schedule = {}
+        self._lock = threading.Lock()
+
+    def get_account_state(self, account_id):
+        with self._lock:
+            users = {user_name: dict(user_state, keys=decode_keys(keys))
+                     for user_name, (user_state, keys)
+                     in self._users.get(account_id, {}).items()}
+            return users, self._watermarks.get(account_id)
+
+    def get_user(self, account_id, user_name):
+        with self._lock:
+            stored = self._users.get(account_id, {}).get(user_name)
+            if stored is None:
+                return None
+            return dict(stored[0], keys=decode_keys(stored[1]))
+
+    def put_users(self, account_id, user_states):
+        with self._lock:
+            users = self._users.setdefault(account_id, {})
+            for user_state in user_states:
+                # keys are encoded so callers cannot change stored state
+                users[user_state['user_name']] = (
+                    {'user_name': user_state['user_name'],
+                     'next_check': user_state['next_check']},
+                    encode_keys(user_state['keys']))
+
+    def delete_users(self, account_id, user_names):
+        with self._lock:
+            users = self._users.get(account_id, {})
+            for user_name in user_names:
+                users.pop(user_name, None)
+
+    def set_watermark(self, account_id, timestamp):
+        with self._lock:
+            self._watermarks[account_id] = timestamp
+
+    def set_next_due(self, account_id, next_due):
+        with self._lock:
+            self._schedule[account_id] = next_due
+
+    def lower_next_due(self, account_id, next_due):
+        with self._lock:
+            if account_id in self._schedule:
+                self._schedule[account_id] = min(
+                    self._schedule[account_id], next_due)
+
+    def get_schedule(self):
+        with self._lock:
+            return dict(self._schedule)
+
+
+class SQLiteStateStore(StateStore):
+    """Keeps the state in a local SQLite database.
+
+    :param path: Path of the database file, ':memory:' for a private one
+    """
+
+    def __init__(self, path):
+        # only loaded when the sqlite store is selected
+        import sqlite3
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS user_state ('
+                'account_id TEXT, user_name TEXT, next_check TEXT, '
+                'keys TEXT, PRIMARY KEY (account_id, user_name))')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS watermark ('
+                'account_id TEXT PRIMARY KEY, full_scan TEXT)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS schedule ('
+                'account_id TEXT PRIMARY KEY, next_due TEXT)')
+
+    def get_account_state(self, account_id):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT user_name, next_check, keys FROM user_state '
+                'WHERE account_id = ?', (account_id,)).fetchall()
+            watermark = self._connection.execute(
+                'SELECT full_scan FROM watermark WHERE account_id = ?',
+                (account_id,)).fetchone()
+        users = {user_name: {'user_name': user_name,
+                             'next_check': _decode_date(next_check),
+                             'keys': decode_keys(keys)}
+                 for user_name, next_check, keys in rows}
+        return users, _decode_date(watermark[0]) if watermark else None
+
+    def get_user(self, account_id, user_name):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT next_check, keys FROM user_state '
+                'WHERE account_id = ? AND user_name = ?',
+                (account_id, user_name)).fetchone()
+        if row is None:
+            return None
+        return {'user_name': user_name, 'next_check': _decode_date(row[0]),
+                'keys': decode_keys(row[1])}
+
+    def put_users(self, account_id, user_states):
+        rows = [(account_id, user_state['user_name'],
+                 _encode_date(user_state['next_check']),
+                 encode_keys(user_state['keys']))
+                for user_state in user_states]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO user_state VALUES (?, ?, ?, ?)', rows)
+
+    def delete_users(self, account_id, user_names):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'DELETE FROM user_state WHERE account_id = ? '
+                'AND user_name = ?',
+                [(account_id, user_name) for user_name in user_names])
+
+    def set_watermark(self, account_id, timestamp):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO watermark VALUES (?, ?)',
+                (account_id, _encode_date(timestamp)))
+
+    def set_next_due(self, account_id, next_due):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO schedule VALUES (?, ?)',
+                (account_id, _encode_date(next_due)))
+
+    def lower_next_due(self, account_id, next_due):
+        # dates are stored as UTC ISO strings, which sort chronologically
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE schedule SET next_due = ? '
+                'WHERE account_id = ? AND next_due > ?',
+                (_encode_date(next_due), account_id, _encode_date(next_due)))
+
+    def get_schedule(self):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT account_id, next_due FROM schedule').fetchall()
+        return {account_id: _decode_date(next_due)
+                for account_id, next_due in rows}
+
+
+class DynamoDBStateStore(StateStore):
+    """Keeps the state in a DynamoDB table with an 'account_id' partition
+    key and a 'user_name' sort key, one item per user.
+
+    :param table_name: Name of the table
+    :param dynamodb_client: DynamoDB client of the rotation function
+    """
+
+    def __init__(self, table_name, dynamodb_client):
+        self.table_name = table_name
+        self.dynamodb_client = dynamodb_client
+
+    def get_account_state(self, account_id):
+        users = {}
+        watermark = None
+        paginator = self.dynamodb_client.get_paginator('query')
+        page_iterator = paginator.paginate(
+            TableName=self.table_name,
+            KeyConditionExpression='account_id = :account_id',
+            ExpressionAttributeValues={':account_id': {'S': account_id}},
+            ConsistentRead=True)
+        for page in page_iterator:
+            for item in page['Items']:
+                user_name = item['user_name']['S']
+                if user_name == WATERMARK_KEY:
+                    watermark = _decode_date(item['full_scan']['S'])
+                    continue
+                next_check = item.get('next_check', {}).get('S')
+                users[user_name] = {
+                    'user_name': user_name,
+                    'next_check': _decode_date(next_check),
+                    'keys': decode_keys(item['keys']['S'])
+                }
+        return users, watermark
+
+    def get_user(self, account_id, user_name):
+        item = self.dynamodb_client.get_item(
+            TableName=self.table_name,
+            Key={'account_id': {'S': account_id},
+                 'user_name': {'S': user_name}},
+            ConsistentRead=True).get('Item')
+        if item is None:
+            return None
+        return {'user_name': user_name,
+                'next_check': _decode_date(
+                    item.get('next_check', {}).get('S')),
+                'keys': decode_keys(item['keys']['S'])}
+
+    def _batch_write(self, requests):
+        """
+        Writes the requests in batches, resending unprocessed items with
+        backoff. A lost write could leave a stale state that hides a user
+        from incremental scans, so items still unprocessed fail the run.
+        """
+        for start in range(0, len(requests), BATCH_WRITE_SIZE):
+            request_items = {
+                self.table_name: requests[start:start + BATCH_WRITE_SIZE]}
+            for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+                if attempt:
+                    backoff = min(BATCH_WRITE_MAX_BACKOFF,
+                                  BATCH_WRITE_BASE_BACKOFF * 2 ** attempt)
+                    time.sleep(random.uniform(0, backoff))
+                response = self.dynamodb_client.batch_write_item(
+                    RequestItems=request_items)
+                request_items = response.get('UnprocessedItems')
+                if not request_items:
+                    break
+            else:
+                unprocessed = request_items.get(self.table_name, [])
+                log.error(f'{len(unprocessed)} key state items were not'
+                          f' written after {BATCH_WRITE_MAX_ATTEMPTS}'
+                          f' attempts: {unprocessed}')
+                raise RuntimeError(f'Unable to write {len(unprocessed)} key'
+                                   f' state items to {self.table_name}')
+
+    def put_users(self, account_id, user_states):
+        requests = []
+        for user_state in user_states:
+            item = {
+                'account_id': {'S': account_id},
+                'user_name': {'S': user_state['user_name']},
+                'keys': {'S': encode_keys(user_state['keys'])}
+            }
+            if user_state['next_check'] is not None:
+                item['next_check'] = {
+                    'S': _encode_date(user_state['next_check'])}
+            requests.append({'PutRequest': {'Item': item}})
+        self._batch_write(requests)
+
+    def delete_users(self, account_id, user_names):
+        self._batch_write([{'DeleteRequest': {'Key': {
+            'account_id': {'S': account_id},
+            'user_name': {'S': user_name}}}} for user_name in user_names])
+
+    def set_watermark(self, account_id, timestamp):
+        self.dynamodb_client.put_item(
+            TableName=self.table_name,
+            Item={'account_id': {'S': account_id},
+                  'user_name': {'S': WATERMARK_KEY},
+                  'full_scan': {'S': _encode_date(timestamp)}})
+
+    def set_next_due(self, account_id, next_due):
+        # the sort key of schedule items is the account id
+        self.dynamodb_client.put_item(
+            TableName=self.table_name,
+            Item={'account_id': {'S': SCHEDULE_PARTITION},
+                  'user_name': {'S': account_id},
+                  'next_due': {'S': _encode_date(next_due)}})
+
+    def lower_next_due(self, account_id, next_due):
+        # dates are stored as UTC ISO strings, which sort chronologically
+        try:
+            self.dynamodb_client.update_item(
+                TableName=self.table_name,
+                Key={'account_id': {'S': SCHEDULE_PARTITION},
+                     'user_name': {'S': account_id}},
+                UpdateExpression='SET next_due = :next_due',
+                ConditionExpression='next_due > :next_due',
+                ExpressionAttributeValues={
+                    ':next_due': {'S': _encode_date(next_due)}})
+        except self.dynamodb_client.exceptions.\
+                ConditionalCheckFailedException:
+            pass
+
+    def get_schedule(self):
+        schedule = {}
+        paginator = self.dynamodb_client.get_paginator('query')
+        page_iterator = paginator.paginate(
+            TableName=self.table_name,
+            KeyConditionExpression='account_id = :account_id',
+            ExpressionAttributeValues={
+                ':account_id': {'S': SCHEDULE_PARTITION}})
+        for page in page_iterator:
+            for item in page['Items']:
+                schedule[item['user_name']['S']] = _decode_date(
+                    item['next_due']['S'])
+        return schedule
+
+
+@functools.lru_cache(maxsize=None)
+def get_state_store():
+    """
+    Creates the state store selected by STATE_STORE once per container.
+
+    :return StateStore, or None if incremental scans are disabled.
+    """
+    config = Config()
+    if config.stateStore == 'dynamodb':
+        import boto3
+
+        return DynamoDBStateStore(config.stateTableName,
+                                  boto3.client('dynamodb'))
+    if config.stateStore == 'sqlite':
+        return SQLiteStateStore(config.stateDbPath)
+    if config.stateStore == 'memory':
+        return MemoryStateStore()
+    if config.stateStore != 'none':
+        log.error(f'Unknown STATE_STORE [{config.stateStore}], '
+                  f'scanning every user.')
+    return None
+
+
+def is_user_current(user_state, now, report_keys=None):
+    """
+    Checks whether a stored user state can be used instead of a scan,
+    which is the case until its next check is due. With a credential report
+    the keys it lists must also match the stored keys.
+
+    :return True if the user does not need to be scanned.
+    """
+    if user_state is None:
+        return False
+    if user_state['next_check'] is not None \
+            and user_state['next_check'] <= now:
+        return False
+    if report_keys is not None:
+        stored_keys = sorted(
+            (key['create_date'].replace(microsecond=0), key['status'])
+            for key in user_state['keys'].values())
+        listed_keys = sorted(
+            (key['CreateDate'].replace(microsecond=0), key['Status'])
+            for key in report_keys)
+        return stored_keys == listed_keys
+    return True
+
+
+def get_user_state(user_name, key_records, next_check):
+    """
+    Builds the state of a scanned user from its key records.
+
+    :return Dict user state.
+    """
+    return {
+        'user_name': user_name,
+        'next_check': next_check,
+        'keys': {key.access_key_id: {
+            'status': 'Active' if key.active else 'Inactive',
+            'create_date': key.create_date,
+            'last_used_date': key.last_used_date,
+            'deactivate_date': key.deactivate_date
+        } for key in key_records}
+    }
+
+
+def record_action_results(run_context, action_results, timestamp):
+    """
+    Records the deactivation dates of keys the rotation deactivated and
+    makes sure every user with executed actions is scanned on the next run.
+    """
+    store = run_context.state_store
+    if store is None or not action_results:
+        return
+
+    changed_users = {}
+    for result in action_results:
+        key_action = result['action_spec']
+        user_state = run_context.user_states.get(key_action.key.user_name)
+        if user_state is None:
+            continue
+        user_state['next_check'] = timestamp
+        changed_users[user_state['user_name']] = user_state
+        key_state = user_state['keys'].get(key_action.key.access_key_id)
+        if key_state is not None and result['error'] is None \
+                and key_action.kind == ActionKind.DEACTIVATE:
+            key_state['status'] = 'Inactive'
+            key_state['deactivate_date'] = timestamp
+
+    store.put_users(run_context.account_id, list(changed_users.values()))
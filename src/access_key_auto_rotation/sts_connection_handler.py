@@ -9,34 +9,46 @@ This module provides the functionality to establish connections to
 different AWS accounts.
 """
 
+import functools
+import threading
+from collections import OrderedDict
+
 import boto3
+import botocore.session
+from botocore.credentials import RefreshableCredentials
 
 from aws_partitions import get_partition_for_region
 from config import Config, log
 
+# Assumed role sessions reused across invocations of a warm container,
+# keyed by (account id, role arn) and least recently used first
+_session_cache = OrderedDict()
+_session_cache_lock = threading.Lock()
 
-def get_account_session(aws_account_id):
-    config = Config()
+# Number of assumed role sessions kept, a warm container may be sent every
+# account of the organization over time
+SESSION_CACHE_SIZE = 32
 
-    # Create an STS client object that represents a live connection to the
-    # STS service
-    base_sts_client = boto3.client('sts')
 
-    iam_assumed_role_name = config.iamAssumedRoleName
+@functools.lru_cache(maxsize=None)
+def _get_base_sts_client():
+    # Use the STS endpoint of the function's own region instead of the
+    # global endpoint to cut assume role latency
+    botocore_session = botocore.session.get_session()
+    botocore_session.set_config_variable('sts_regional_endpoints', 'regional')
+    session = boto3.session.Session(botocore_session=botocore_session)
+    return session.client('sts')
 
-    my_session = boto3.session.Session()
-    my_region = my_session.region_name
-    partition = get_partition_for_region(my_region)
+
+def _assume_role(aws_account_id, role_arn, role_session_name):
+    base_sts_client = _get_base_sts_client()
 
     # Call the assume_role method of the STSConnection object and pass the
     # role ARN and a role session name.
-    roleArnString = f"arn:{partition}:iam::{aws_account_id}:" \
-                    f"role/{iam_assumed_role_name}"
-
     try:
         credentials = base_sts_client.assume_role(
-            RoleArn=roleArnString,
-            RoleSessionName=config.roleSessionName
+            RoleArn=role_arn,
+            RoleSessionName=role_session_name
         )['Credentials']
     except base_sts_client.exceptions.ClientError as error:
         log.error(
@@ -45,11 +57,50 @@ def get_account_session(aws_account_id):
             f' Template. Raw Error: {error}')
         raise
 
-    # From the response that contains the assumed role, get the temporary
-    # credentials that can be used to make subsequent API calls
-    assumed_session = boto3.Session(
-        aws_access_key_id=credentials['AccessKeyId'],
-        aws_secret_access_key=credentials['SecretAccessKey'],
-        aws_session_token=credentials['SessionToken']
-    )
-    return assumed_session
+    return {
+        'access_key': credentials['AccessKeyId'],
+        'secret_key': credentials['SecretAccessKey'],
+        'token': credentials['SessionToken'],
+        'expiry_time': credentials['Expiration'].isoformat()
+    }
+
+
+def get_account_session(aws_account_id):
+    config = Config()
+
+    iam_assumed_role_name = config.iamAssumedRoleName
+
+    my_region = _get_base_sts_client().meta.region_name
+    partition = get_partition_for_region(my_region)
+
+    roleArnString = f"arn:{partition}:iam::{aws_account_id}:" \
+                    f"role/{iam_assumed_role_name}"
+
+    cache_key = (aws_account_id, roleArnString)
+    with _session_cache_lock:
+        if cache_key in _session_cache:
+            log.info(f'Reusing assumed role session for {roleArnString}')
+            _session_cache.move_to_end(cache_key)
+            return _session_cache[cache_key]
+
+        # The temporary credentials are refreshed by botocore shortly
+        # before they expire, so long scans never use expired tokens
+        refresh = functools.partial(
+            _assume_role, aws_account_id, roleArnString,
+            config.roleSessionName)
+        credentials = RefreshableCredentials.create_from_metadata(
+            metadata=refresh(),
+            refresh_using=refresh,
+            method='sts-assume-role'
+        )
+
+        botocore_session = botocore.session.get_session()
+        botocore_session._credentials = credentials
+        assumed_session = boto3.Session(
+            botocore_session=botocore_session,
+            region_name=my_region
+        )
+        _session_cache[cache_key] = assumed_session
+        if len(_session_cache) > SESSION_CACHE_SIZE:
+            _session_cache.popitem(last=False)
+        return assumed_session
@@ -0,0 +1,81 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Throttling.
+
+This module provides a thread safe, adaptive token bucket used to keep
+concurrent API calls under the per account request rate of a service.
+"""
+
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+THROTTLING_ERROR_CODES = ('Throttling', 'ThrottlingException',
+                          'TooManyRequestsException',
+                          'RequestLimitExceeded')
+
+
+class TokenBucket:
+    """Token bucket that halves its rate when throttled and slowly recovers.
+
+    :param rate: Maximum number of requests per second
+    :param min_rate: Lowest rate the bucket will back off to
+    :param max_attempts: Number of times a throttled call is attempted
+    """
+
+    def __init__(self, rate, min_rate=1.0, max_attempts=5):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.max_attempts = max_attempts
+        self._tokens = self.max_rate
+        self._timestamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.max_rate,
+                    self._tokens + (now - self._timestamp) * self.rate)
+                self._timestamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def call(self, method, **kwargs):
+        """
+        Calls an API method once a token is available, retrying throttled
+        calls at the reduced rate.
+
+        :return The response of the API method.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self.acquire()
+            try:
+                response = method(**kwargs)
+            except ClientError as error:
+                code = error.response['Error']['Code']
+                if code not in THROTTLING_ERROR_CODES \
+                        or attempt == self.max_attempts:
+                    raise
+                self.throttled()
+                continue
+            self.succeeded()
+            return response
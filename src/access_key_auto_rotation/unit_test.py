@@ -12,3 +12,17 @@
   "name": "ACCOUNT NAME",
   "email": "EMAIL ADDRESS"
 }
+
+# Targeted Test for Lambda Test Event, evaluates only the selected users.
+# "UserPathPrefix": "/PATH/" and "UserTags": {"TAG KEY": "TAG VALUE"}
+# select users by path and tags instead of by name
+{
+  "Users": ["USERNAME"],
+  "account": "AWS ACCOUNT ID",
+  "name": "ACCOUNT NAME",
+  "email": "EMAIL ADDRESS"
+}
+
+# CloudTrail CreateAccessKey, UpdateAccessKey, DeleteAccessKey and DeleteUser
+# events for the Event Handler Lambda are recorded in EVENTS of
+# tests/test_event_handler.py
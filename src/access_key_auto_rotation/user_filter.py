@@ -0,0 +1,113 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""User Filter.
+
+This module provides the functionality to limit a run to a subset of the
+users of an account, e.g. for a rotation requested for a single user, so
+only those users are looked up instead of listing the whole account.
+"""
+
+from config import log
+
+
+class UserFilter:
+    """Selects the users a run evaluates.
+
+    :param user_names: Explicit list of user names
+    :param path_prefix: IAM path prefix the users must have, e.g. '/dev/'
+    :param tags: Dict of tag keys to values the users must have, a value of
+        '*' only requires the tag key
+    """
+
+    def __init__(self, user_names=None, path_prefix=None, tags=None):
+        self.user_names = list(user_names) if user_names else None
+        self.path_prefix = path_prefix
+        self.tags = dict(tags) if tags else None
+
+    @classmethod
+    def from_event(cls, event, force_rotate_users=()):
+        """
+        Builds the filter from the "Users", "UserPathPrefix" and "UserTags"
+        of an event. A ForceRotate without any of these only evaluates the
+        users that are force rotated.
+
+        :return UserFilter, or None to evaluate every user.
+        """
+        user_names = event.get('Users')
+        if isinstance(user_names, str):
+            user_names = [user_names]
+        path_prefix = event.get('UserPathPrefix')
+        tags = event.get('UserTags')
+        if not (user_names or path_prefix or tags):
+            if not force_rotate_users:
+                return None
+            user_names = force_rotate_users
+        return cls(user_names, path_prefix, tags)
+
+    def matches_path(self, user):
+        return not self.path_prefix \
+            or user.get('Path', '/').startswith(self.path_prefix)
+
+    def matches_tags(self, user_tags):
+        tags = {tag['Key']: tag['Value'] for tag in user_tags}
+        return all(key in tags and value in ('*', tags[key])
+                   for key, value in self.tags.items())
+
+    def __repr__(self):
+        return f'UserFilter(user_names={self.user_names!r}, ' \
+               f'path_prefix={self.path_prefix!r}, tags={self.tags!r})'
+
+
+def _iter_pages(limiter, method, **kwargs):
+    # pages are requested one by one, so each call waits for a token and
+    # throttled calls are retried
+    while True:
+        page = limiter.call(method, **kwargs)
+        yield page
+        if not page.get('IsTruncated'):
+            return
+        kwargs['Marker'] = page['Marker']
+
+
+def _get_user_tags(user_name, iam_client, limiter):
+    return [tag for page in _iter_pages(limiter, iam_client.list_user_tags,
+                                        UserName=user_name)
+            for tag in page['Tags']]
+
+
+def iter_filtered_users(iam_client, limiter, user_filter, page_size):
+    """
+    Looks up the users selected by a filter. Explicit users are fetched
+    directly, other filters list the users under the path prefix and,
+    for a tag selector, read the tags of each of them. Every call is made
+    through the limiter, so iam_client should be a limited client of the
+    ClientRegistry.
+
+    :return Generator of the IAM users matching the filter.
+    """
+    if user_filter.user_names is not None:
+        for user_name in user_filter.user_names:
+            try:
+                # GetUser also returns the tags of the user
+                user = limiter.call(iam_client.get_user,
+                                    UserName=user_name)['User']
+            except iam_client.exceptions.NoSuchEntityException:
+                log.info(f'--User [{user_name}] does not exist.')
+                continue
+            if user_filter.matches_path(user) and (
+                    not user_filter.tags
+                    or user_filter.matches_tags(user.get('Tags', []))):
+                yield user
+        return
+
+    page_iterator = _iter_pages(limiter, iam_client.list_users,
+                                PathPrefix=user_filter.path_prefix or '/',
+                                MaxItems=page_size)
+    for page in page_iterator:
+        for user in page['Users']:
+            if not user_filter.tags or user_filter.matches_tags(
+                    _get_user_tags(user['UserName'], iam_client, limiter)):
+                yield user
@@ -7,47 +7,152 @@
 
 This module provides the functionality to dynamically query AWS Organizations 
 for a full list of account IDs and emails. This script kicks off the 
-access_key_auto_rotation function.
+access_key_auto_rotation function, either by invoking it for every account
+or by handing the account list to the RotationFleet state machine.
 """
 
-import boto3
+import datetime
+import functools
+import heapq
 import os
 import json
 import logging
+import math
+import random
+import threading
+import time
+import uuid
 
+from concurrent.futures import ThreadPoolExecutor
+
+from check_permissions import get_blocked_actions
 
 # setup script logging
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
-# AWS Organizations Client
-org_client = boto3.client('organizations')
+# Number of concurrent invokes of the rotation function
+INVOKE_WORKERS = int(os.getenv('INVOKE_WORKERS', 10))
+
+# Number of accounts sent to the rotation function per invoke
+ACCOUNTS_PER_INVOKE = int(os.getenv('ACCOUNTS_PER_INVOKE', 1))
+
+# Number of OUs listed concurrently when walking an OU tree
+OU_TRAVERSAL_WORKERS = int(os.getenv('OU_TRAVERSAL_WORKERS', 4))
+
+# Seconds an OU tree is reused by later runs, longer than the weekly
+# schedule of the reconcile, which always lists it again
+OU_TREE_CACHE_TTL = int(os.getenv('OU_TREE_CACHE_TTL', 8 * 86400))
+
+# OU trees by root OU id, only used without FLEET_BUCKET
+_ou_tree_cache = {}
+
+# Invoke errors that are retried with jittered backoff
+RETRYABLE_INVOKE_ERRORS = ('TooManyRequestsException', 'ThrottlingException',
+                           'ServiceException')
+INVOKE_MAX_ATTEMPTS = 5
+INVOKE_BASE_BACKOFF = 0.5
+INVOKE_MAX_BACKOFF = 10
+
+# Only dispatch accounts the rotation function scheduled as due, requires
+# the 'dynamodb' state store
+DEADLINE_SCHEDULING = os.getenv('DEADLINE_SCHEDULING', 'false').lower() \
+    == 'true'
+
+# Table the rotation function keeps the key state and account schedule in
+STATE_TABLE_NAME = os.getenv('STATE_TABLE_NAME')
+
+# Partition key of the schedule items, the sort key is the account id
+SCHEDULE_PARTITION = '#SCHEDULE'
+
+# Bucket the RotationFleet state machine reads the rotation payloads from,
+# so large organizations stay under the state payload limit
+FLEET_BUCKET = os.getenv('FLEET_BUCKET')
+FLEET_ACCOUNTS_PREFIX = 'fleet/accounts/'
 
-# AWS Lambda Client
-lambda_client = boto3.client('lambda')
+# OU trees are kept in the fleet bucket, so later runs share them
+FLEET_OU_TREES_PREFIX = 'fleet/ou-trees/'
 
-iam_client = boto3.client('iam')
+# Seconds a permission check is reused instead of simulating it again
+PERMISSION_CACHE_TTL = int(os.getenv('PERMISSION_CACHE_TTL', 3600))
+
+# SSM parameter the permission check is shared in with later runs and the
+# rotation function, only cached in the container if unset
+PERMISSION_CACHE_PARAMETER = os.getenv('PERMISSION_CACHE_PARAMETER')
+
+# Actions of the rotation function's assumed role, used on all resources
+# unless listed in ASSUMED_ROLE_SECRET_ACTIONS
+ASSUMED_ROLE_ACTIONS = (
+    'iam:ListUsers', 'iam:ListAccessKeys', 'iam:GetAccessKeyLastUsed',
+    'iam:GenerateCredentialReport', 'iam:GetCredentialReport',
+    'iam:GetUser', 'iam:CreateAccessKey', 'iam:UpdateAccessKey',
+    'iam:DeleteAccessKey', 'iam:GetUserPolicy', 'iam:PutUserPolicy',
+    'secretsmanager:ListSecrets')
+
+# Actions of the assumed role on the secrets of the rotated keys
+ASSUMED_ROLE_SECRET_ACTIONS = (
+    'secretsmanager:CreateSecret', 'secretsmanager:PutSecretValue',
+    'secretsmanager:DescribeSecret', 'secretsmanager:GetResourcePolicy',
+    'secretsmanager:PutResourcePolicy',
+    'secretsmanager:ReplicateSecretToRegions')
+
+
+# Creating clients from several threads at once is not thread safe
+_client_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(service_name):
+    """
+    Creates a client on first use and reuses it in a warm container. boto3
+    is only imported then, so the fleet summary never loads it.
+
+    :return boto3 client of the service.
+    """
+    with _client_lock:
+        import boto3
+        from botocore.config import Config
+
+        # clients are shared by the concurrent invokes and OU listings
+        return boto3.client(
+            service_name, config=Config(max_pool_connections=INVOKE_WORKERS))
 
 
 # main Python Function, parses events sent to lambda
 def lambda_handler(event, context):
+    """Handler for Lambda.
+
+    :param event: Scheduled event, or {"mode": "orchestrate"} when called by
+        the RotationFleet state machine. {"reconcile": true} dispatches every
+        account for a full scan regardless of the schedule
+    :param context: Lambda context object
+    :return Dispatch summary, or the S3 location of the rotation payloads
+        for the state machine.
+    """
 
     # environment Variables
     lambdaRotationFunction = os.environ['ROTATION_FUNCTION_ARN']
     policySourceArn = os.environ['ACCOUNT_INVENTORY_ROLE_ARN']
     ou_id = os.getenv('InventoryOU')
     
-    list_accounts_permission_check = iam_client.simulate_principal_policy(
-        PolicySourceArn=policySourceArn,  # Your IAM user's ARN goes here
-        ActionNames=["organizations:ListAccounts"],
-        ResourceArns=["*"],
-    )['EvaluationResults']
-    
-    can_list_accounts = all([result['EvalDecision'] == "allowed" for result in list_accounts_permission_check])
-    
+    blocked_actions = get_blocked_actions(
+        get_client('iam'),
+        get_required_actions(policySourceArn, lambdaRotationFunction),
+        PERMISSION_CACHE_TTL,
+        get_client('ssm') if PERMISSION_CACHE_PARAMETER else None,
+        PERMISSION_CACHE_PARAMETER)
+    inventory_blocked = blocked_actions.get(policySourceArn, [])
+    can_list_accounts = 'organizations:ListAccounts' not in inventory_blocked
+    # the assumed role is only checked in the primary account, member
+    # accounts deploy their own copy of it
+    primary_blocked = blocked_actions.get(
+        get_assumed_role_arn(policySourceArn), [])
+
     # get AWS account details from AWS Organizations
+    reconcile = bool(event) and \
+        str(event.get('reconcile')).lower() == 'true'
     if ou_id:
-        account_list = list_aws_accounts_for_ou(ou_id)
+        account_list = list_aws_accounts_for_ou(ou_id, refresh=reconcile)
     elif can_list_accounts:
         account_list = list_all_aws_accounts()
     else:
@@ -57,8 +162,66 @@ def lambda_handler(event, context):
             'Email': os.environ['RECIPIENT_EMAIL'],
             'Status': 'ACTIVE'
         }]
-    # loop through all accounts and trigger the IAM Rotation Lambda
-    run_lambda_function(account_list, lambdaRotationFunction)
+    if DEADLINE_SCHEDULING and not reconcile:
+        account_list = get_due_accounts(account_list)
+
+    # the state machine maps the rotation function over the payloads
+    if event and event.get('mode') == 'orchestrate':
+        return write_rotation_payloads(
+            get_rotation_payloads(account_list, reconcile, primary_blocked))
+
+    if 'lambda:InvokeFunction' in inventory_blocked:
+        failed = [account['Id'] for account in account_list
+                  if account['Status'] == 'ACTIVE']
+        log.error(f'Not allowed to invoke {lambdaRotationFunction},'
+                  f' {len(failed)} accounts not dispatched.')
+        return {'dispatched': [], 'failed': failed}
+
+    # trigger the IAM Rotation Lambda for all accounts
+    return run_lambda_function(account_list, lambdaRotationFunction,
+                               reconcile, primary_blocked)
+
+
+def get_assumed_role_arn(policySourceArn):
+    """
+    Gets the rotation function's assumed role in the primary account, in
+    the partition of the inventory role.
+
+    :return ARN of the assumed role.
+    """
+    partition = policySourceArn.split(':')[1]
+    return (f"arn:{partition}:iam::{os.environ['PRIMARY_ACCOUNT_ID']}:role/"
+            f"{os.environ['IAM_ASSUMED_ROLE_NAME']}")
+
+
+def get_required_actions(policySourceArn, lambdaRotationFunction):
+    """
+    Gets the actions the inventory and the rotation function need, for a
+    single permission check per principal. The assumed role is checked in
+    the primary account.
+
+    :return Dict of principal ARN to the actions it needs, mapped to the
+        resource ARN each is used on.
+    """
+    partition, account_id = policySourceArn.split(':')[1:5:3]
+    region = os.environ['AWS_REGION']
+    primary_account_id = os.environ['PRIMARY_ACCOUNT_ID']
+    # secrets are named after the rotated user, any user stands for them
+    secret_arn = (f'arn:{partition}:secretsmanager:{region}:'
+                  f'{primary_account_id}:secret:User_probe_AccessKey')
+
+    assumed_role_actions = dict.fromkeys(ASSUMED_ROLE_ACTIONS, '*')
+    assumed_role_actions.update(
+        dict.fromkeys(ASSUMED_ROLE_SECRET_ACTIONS, secret_arn))
+    return {
+        policySourceArn: {
+            'organizations:ListAccounts': '*',
+            'lambda:InvokeFunction':
+                f'arn:{partition}:lambda:{region}:{account_id}:function:'
+                f'{lambdaRotationFunction}'
+        },
+        get_assumed_role_arn(policySourceArn): assumed_role_actions
+    }
 
 
 def list_all_aws_accounts():
@@ -67,6 +230,7 @@ def list_all_aws_accounts():
 
     :return The current dict of all AWS Accounts.
     """
+    org_client = get_client('organizations')
     account_list = []
     try:
         # max limit of 20 users per listing
@@ -82,74 +246,485 @@ def list_all_aws_accounts():
     return account_list
 
 
-def list_aws_accounts_for_ou(ou_id):
+def list_accounts_for_parent(parent_id):
     """
-    Gets the current list of AWS Accounts in an OU from AWS Organizations.
+    Gets the accounts directly in an OU from AWS Organizations.
 
-    :return The current dict of all AWS Accounts.
+    :return The list of AWS Accounts in the OU.
     """
-    log.info(f"Searching for accounts in OU {ou_id}")
+    org_client = get_client('organizations')
     account_list = []
-
-    # first add accounts directly in the ou
     try:
         # max limit of 20 accounts per listing
         # use paginator to iterate through each page
         lafp_paginator = org_client.get_paginator('list_accounts_for_parent')
-        lafp_page_iterator = lafp_paginator.paginate(ParentId=ou_id)
+        lafp_page_iterator = lafp_paginator.paginate(ParentId=parent_id)
         for page in lafp_page_iterator:
-            for acct in page['Accounts']:
-                account_list.append(acct)
+            account_list += page['Accounts']
     except org_client.exceptions.ClientError as error:
         log.error(f'Error: {error}')
+    return account_list
+
+
+def list_child_ous(parent_id):
+    """
+    Gets the child OUs of an OU from AWS Organizations.
 
-    # next add accounts in child ous
+    :return The list of child OU ids, or None if they could not be listed.
+    """
+    org_client = get_client('organizations')
+    child_ids = []
     try:
         # max limit of 20 children per listing
         # use paginator to iterate through each page
         lc_paginator = org_client.get_paginator('list_children')
         ou_page_iterator = lc_paginator.paginate(
-            ParentId=ou_id,
+            ParentId=parent_id,
             ChildType='ORGANIZATIONAL_UNIT'
         )
         for page in ou_page_iterator:
-            for child in page['Children']:
-                # recurse over child ous and add the accounts they contain
-                log.info(f"Adding accounts from child OU {child['Id']}")
-                account_list += list_aws_accounts_for_ou(child['Id'])
+            child_ids += [child['Id'] for child in page['Children']]
     except org_client.exceptions.ClientError as error:
         log.error(f'Error: {error}')
+        return None
+    return child_ids
 
-    log.info(f"Found {len(account_list)} accounts in OU {ou_id}")
 
-    return account_list
+def list_ou(ou_id):
+    """
+    Gets the accounts and child OUs of an OU.
+
+    :return Tuple of the accounts and the child OU ids of the OU.
+    """
+    return list_accounts_for_parent(ou_id), list_child_ous(ou_id)
+
+
+def load_ou_tree(ou_id):
+    """
+    Gets the OU tree of an OU listed by an earlier run, from the fleet
+    bucket or, without FLEET_BUCKET, the warm container.
+
+    :return List of the OU ids of the tree, or None if it was not listed in
+        the last OU_TREE_CACHE_TTL seconds.
+    """
+    if FLEET_BUCKET:
+        s3_client = get_client('s3')
+        try:
+            ou_tree = read_json_object(
+                FLEET_BUCKET, f'{FLEET_OU_TREES_PREFIX}{ou_id}.json')
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        except (s3_client.exceptions.ClientError, ValueError) as error:
+            log.error(f'Unable to read OU tree of {ou_id}: {error}')
+            return None
+    else:
+        ou_tree = _ou_tree_cache.get(ou_id)
+    if not ou_tree or \
+            time.time() - ou_tree['listed_at'] >= OU_TREE_CACHE_TTL:
+        return None
+    return ou_tree['ous']
+
+
+def store_ou_tree(ou_id, ou_ids):
+    """
+    Keeps the OU tree of an OU for later runs, in the fleet bucket or,
+    without FLEET_BUCKET, the warm container.
+    """
+    ou_tree = {'listed_at': time.time(), 'ous': ou_ids}
+    if not FLEET_BUCKET:
+        _ou_tree_cache[ou_id] = ou_tree
+        return
+    s3_client = get_client('s3')
+    try:
+        s3_client.put_object(
+            Bucket=FLEET_BUCKET, Key=f'{FLEET_OU_TREES_PREFIX}{ou_id}.json',
+            Body=json.dumps(ou_tree).encode('utf-8'),
+            ContentType='application/json')
+    except s3_client.exceptions.ClientError as error:
+        log.error(f'Unable to write OU tree of {ou_id}: {error}')
+
+
+def list_aws_accounts_for_ou(ou_id, refresh=False):
+    """
+    Gets the current list of AWS Accounts in an OU and all its child OUs
+    from AWS Organizations.
+
+    The OU tree is walked breadth first, listing the OUs of each level
+    concurrently. The OU ids found are kept for OU_TREE_CACHE_TTL seconds
+    so later runs only need to list the accounts of each OU. OUs created
+    in the meantime are found once the tree is listed again.
+
+    :param ou_id: Id of the root OU
+    :param refresh: List the OU tree again even if it was kept
+    :return Generator of the AWS Accounts, without duplicates.
+    """
+    log.info(f"Searching for accounts in OU {ou_id}")
+    seen_accounts = set()
+
+    def new_accounts(accounts):
+        for acct in accounts:
+            if acct['Id'] not in seen_accounts:
+                seen_accounts.add(acct['Id'])
+                yield acct
+
+    with ThreadPoolExecutor(max_workers=OU_TRAVERSAL_WORKERS) as executor:
+        cached = None if refresh else load_ou_tree(ou_id)
+        if cached:
+            log.info(f"Using cached tree of {len(cached)} OUs")
+            for accounts in executor.map(list_accounts_for_parent, cached):
+                yield from new_accounts(accounts)
+        else:
+            ou_tree = []
+            visited = {ou_id}
+            complete = True
+            level = [ou_id]
+            while level:
+                ou_tree += level
+                next_level = []
+                for accounts, child_ids in executor.map(list_ou, level):
+                    yield from new_accounts(accounts)
+                    if child_ids is None:
+                        complete = False
+                        continue
+                    next_level += [child_id for child_id in child_ids
+                                   if child_id not in visited]
+                    visited.update(child_ids)
+                if next_level:
+                    log.info(f"Adding accounts from child OUs {next_level}")
+                level = next_level
+
+            # only cache trees that were listed without errors
+            if complete:
+                store_ou_tree(ou_id, ou_tree)
+
+    log.info(f"Found {len(seen_accounts)} accounts in OU {ou_id}")
+
 
+class DeadlineIndex:
+    """Min-heap of accounts by the date they are due next.
 
-def run_lambda_function(awsAccountArray, lambdaFunction):
+    :param schedule: Dict of account id to next due date
     """
-    Invokes the Lambda Function that evaluates key rotation.
+
+    def __init__(self, schedule):
+        self._heap = [(next_due, account_id)
+                      for account_id, next_due in schedule.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """
+        Removes the accounts that are due from the index.
+
+        :return Generator of the ids of accounts due at or before now.
+        """
+        while self._heap and self._heap[0][0] <= now:
+            yield heapq.heappop(self._heap)[1]
+
+
+def load_account_schedule():
+    """
+    Gets the date each account is due next from the rotation function's
+    state table.
+
+    :return Dict of account id to next due date.
+    """
+    dynamodb_client = get_client('dynamodb')
+    schedule = {}
+    paginator = dynamodb_client.get_paginator('query')
+    page_iterator = paginator.paginate(
+        TableName=STATE_TABLE_NAME,
+        KeyConditionExpression='account_id = :account_id',
+        ExpressionAttributeValues={':account_id': {'S': SCHEDULE_PARTITION}})
+    for page in page_iterator:
+        for item in page['Items']:
+            schedule[item['user_name']['S']] = \
+                datetime.datetime.fromisoformat(item['next_due']['S'])
+    return schedule
+
+
+def get_due_accounts(awsAccountArray):
+    """
+    Filters the accounts down to those with a key deadline or a full scan
+    due. Accounts that were never scheduled are always due.
+
+    :param awsAccountArray: Iterable of the AWS Accounts, e.g. the generator
+        of an OU listing
+    :return List of the AWS Accounts to dispatch.
+    """
+    # the accounts are read twice, OU listings are generators
+    awsAccountArray = list(awsAccountArray)
+    try:
+        schedule = load_account_schedule()
+    except get_client('dynamodb').exceptions.ClientError as error:
+        log.error(f'Unable to load account schedule, dispatching all'
+                  f' accounts. Error: {error}')
+        return awsAccountArray
+
+    account_ids = {account['Id'] for account in awsAccountArray}
+    index = DeadlineIndex({account_id: next_due
+                           for account_id, next_due in schedule.items()
+                           if account_id in account_ids})
+    now = datetime.datetime.now(datetime.timezone.utc)
+    due_ids = set(index.pop_due(now))
+    due_accounts = [account for account in awsAccountArray
+                    if account['Id'] in due_ids
+                    or account['Id'] not in schedule]
+
+    next_due = index.next_due()
+    log.info(f'{len(due_accounts)} of {len(awsAccountArray)} accounts are'
+             f' due, next account due at'
+             f' {next_due.isoformat() if next_due else "n/a"}.')
+    return due_accounts
+
+
+def invoke_with_backoff(lambdaFunction, payload):
+    """
+    Invokes a Lambda Function asynchronously, retrying throttled invokes
+    with full jitter exponential backoff.
 
     :return Response from Invoke command.
     """
-    for account in awsAccountArray:
+    lambda_client = get_client('lambda')
+    for attempt in range(INVOKE_MAX_ATTEMPTS):
+        try:
+            return lambda_client.invoke(
+                FunctionName=lambdaFunction, InvocationType='Event',
+                Payload=payload)
+        except lambda_client.exceptions.ClientError as error:
+            code = error.response['Error']['Code']
+            if code not in RETRYABLE_INVOKE_ERRORS \
+                    or attempt == INVOKE_MAX_ATTEMPTS - 1:
+                raise
+            backoff = min(INVOKE_MAX_BACKOFF,
+                          INVOKE_BASE_BACKOFF * 2 ** attempt)
+            log.info(f'Invoke throttled ({code}), retrying in up to'
+                     f' {backoff} seconds.')
+            time.sleep(random.uniform(0, backoff))
+
+
+def get_rotation_payloads(awsAccountArray, reconcile=False,
+                          primary_blocked_actions=None):
+    """
+    Builds the rotation function payloads for all active accounts.
+
+    :param primary_blocked_actions: Actions the permission check found
+        denied to the assumed role of the primary account, passed on so the
+        rotation of that account skips what it cannot do
+
+    :return List of payloads, each for one account or a batch of accounts.
+    """
+    accounts = [{
+        "account": account['Id'],
+        "name": account['Name'],
+        "email": account['Email']
+    } for account in awsAccountArray
         # skip accounts that are suspended
-        if account['Status'] != 'ACTIVE':
-            continue
-        jsonPayload = {
-            "account": account['Id'],
-            "name": account['Name'],
-            "email": account['Email']
-        }
+        if account['Status'] == 'ACTIVE']
+    if reconcile:
+        for account in accounts:
+            account['reconcile'] = True
+    if primary_blocked_actions:
+        for account in accounts:
+            if account['account'] == os.environ.get('PRIMARY_ACCOUNT_ID'):
+                account['blocked_actions'] = primary_blocked_actions
+
+    # several accounts can share one invoke to save cold starts
+    return [accounts[i] if ACCOUNTS_PER_INVOKE == 1
+            else {"accounts": accounts[i:i + ACCOUNTS_PER_INVOKE]}
+            for i in range(0, len(accounts), ACCOUNTS_PER_INVOKE)]
+
+
+def write_rotation_payloads(payloads):
+    """
+    Writes the rotation payloads for the RotationFleet state machine, whose
+    map state reads them from S3. Without FLEET_BUCKET they are returned
+    inline.
+
+    :return Dictionary of the 'bucket' and 'key' of the payloads, or the
+        payloads under 'accounts'.
+    """
+    if not FLEET_BUCKET:
+        return {'accounts': payloads}
+
+    key = (f'{FLEET_ACCOUNTS_PREFIX}'
+           f'{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S}-'
+           f'{uuid.uuid4()}.json')
+    get_client('s3').put_object(
+        Bucket=FLEET_BUCKET, Key=key,
+        Body=json.dumps(payloads).encode('utf-8'),
+        ContentType='application/json')
+    log.info(f'Wrote {len(payloads)} rotation payloads to'
+             f' s3://{FLEET_BUCKET}/{key}')
+    return {'bucket': FLEET_BUCKET, 'key': key, 'payloads': len(payloads)}
+
+
+def get_payload_account_ids(payload):
+    return [account['account']
+            for account in payload.get('accounts', [payload])]
+
+
+def run_lambda_function(awsAccountArray, lambdaFunction, reconcile=False,
+                        primary_blocked_actions=None):
+    """
+    Invokes the Lambda Function that evaluates key rotation for every
+    active account, using a bounded pool of concurrent invokes.
+
+    :return Summary of the account ids that were and were not dispatched.
+    """
+    payloads = get_rotation_payloads(awsAccountArray, reconcile,
+                                     primary_blocked_actions)
+    lambda_client = get_client('lambda')
+
+    def dispatch(jsonPayload):
         lambdaPayloadEncoded = json.dumps(jsonPayload).encode('utf-8')
         try:
-            response = lambda_client.invoke(
-                FunctionName=lambdaFunction, InvocationType='Event',
-                Payload=lambdaPayloadEncoded)
+            invoke_with_backoff(lambdaFunction, lambdaPayloadEncoded)
             lambdaPayloadEncoded_str = str(lambdaPayloadEncoded)
             log.info(f'Invoked: FunctionName= {lambdaFunction},'
                      f' InvocationType=Event,'
                      f' Payload= {lambdaPayloadEncoded_str}')
+            return True
         except lambda_client.exceptions.ClientError as error:
             log.error(f'Error: {error}')
-    return response
+            return False
+
+    summary = {'dispatched': [], 'failed': []}
+    with ThreadPoolExecutor(max_workers=INVOKE_WORKERS) as executor:
+        for payload, dispatched in zip(payloads,
+                                       executor.map(dispatch, payloads)):
+            status = 'dispatched' if dispatched else 'failed'
+            summary[status] += get_payload_account_ids(payload)
+
+    log.info(f"Dispatched {len(summary['dispatched'])} accounts,"
+             f" {len(summary['failed'])} failed: {summary['failed']}")
+    return summary
+
+
+def _percentile(sorted_values, percent):
+    # nearest rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_fleet(results):
+    """
+    Aggregates the account summaries returned by the rotation function.
+
+    :param results: Rotation function results, either account summaries,
+        batches of them under "accounts", or errors caught by the state
+        machine with an "account" and an "error"
+    :return Fleet level summary of the rotation run.
+    """
+    summaries = []
+    for result in results:
+        if 'accounts' in result and result.get('error'):
+            # the state machine caught an error for a whole batch
+            summaries += [{'account': account.get('account'),
+                           'error': result['error']}
+                          for account in result['accounts']]
+        else:
+            summaries += result.get('accounts', [result])
+
+    failed = [summary.get('account') for summary in summaries
+              if summary.get('error')]
+    succeeded = [summary for summary in summaries
+                 if not summary.get('error')]
+    durations = sorted(summary['duration_ms'] for summary in summaries
+                       if summary.get('duration_ms') is not None)
+
+    fleet_summary = {
+        'accounts_scanned': len(succeeded),
+        'accounts_failed': len(failed),
+        'failed_accounts': failed,
+        'keys_rotated': sum(s['keys_rotated'] for s in succeeded),
+        'keys_deactivated': sum(s['keys_deactivated'] for s in succeeded),
+        'keys_deleted': sum(s['keys_deleted'] for s in succeeded),
+        'warnings': sum(s['warnings'] for s in succeeded),
+        'duration_p50_ms': _percentile(durations, 50),
+        'duration_p95_ms': _percentile(durations, 95)
+    }
+    log.info(f'Fleet summary: {json.dumps(fleet_summary)}')
+    return fleet_summary
+
+
+def read_json_object(bucket, key):
+    body = get_client('s3').get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        return json.load(body)
+    finally:
+        body.close()
+
+
+def iter_map_results(result_writer_details):
+    """
+    Reads the rotation function results the map state wrote to S3, one
+    result file at a time. Child executions that failed or never ran are
+    reported as errors of their accounts.
+
+    :param result_writer_details: Dictionary of the 'Bucket' and 'Key' of
+        the manifest of the map run
+    :return Generator of rotation function results.
+    """
+    manifest = read_json_object(result_writer_details['Bucket'],
+                                result_writer_details['Key'])
+    bucket = manifest['DestinationBucket']
+    for status, result_files in manifest['ResultFiles'].items():
+        for result_file in result_files:
+            for execution in read_json_object(bucket, result_file['Key']):
+                if status == 'SUCCEEDED' and execution.get('Output'):
+                    yield json.loads(execution['Output'])
+                    continue
+                payload = json.loads(execution['Input'])
+                yield {'accounts': [{'account': account_id} for account_id
+                                    in get_payload_account_ids(payload)],
+                       'error': execution.get('Error') or status}
+
+
+def summarize_handler(event, context):
+    """
+    Handler for the final state of the RotationFleet state machine.
+
+    :param event: Output of the map state, the 'ResultWriterDetails' of the
+        results it wrote to S3, or a list of rotation function results
+    :param context: Lambda context object
+    :return Fleet level summary of the rotation run.
+    """
+    if isinstance(event, dict) and 'ResultWriterDetails' in event:
+        return summarize_fleet(iter_map_results(event['ResultWriterDetails']))
+    return summarize_fleet(event)
+
+
+def run_local_map(awsAccountArray, rotation_handler, context=None,
+                  max_concurrency=10):
+    """
+    Local stand-in for the RotationFleet state machine. Runs the same map
+    over a thread pool, e.g. with the rotation function's lambda_handler.
+
+    :return Fleet level summary of the rotation run.
+    """
+    payloads = get_rotation_payloads(awsAccountArray)
+
+    def rotate(payload):
+        start = time.monotonic()
+        try:
+            return rotation_handler(payload, context)
+        except Exception as error:
+            # same shape as the state machine's Catch
+            duration_ms = int((time.monotonic() - start) * 1000)
+            return {'accounts': [{
+                'account': account_id,
+                'error': str(error),
+                'duration_ms': duration_ms
+            } for account_id in get_payload_account_ids(payload)]}
 
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        results = list(executor.map(rotate, payloads))
+    return summarize_fleet(results)
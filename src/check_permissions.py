@@ -1,16 +1,52 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Check Permissions.
+
+This module provides the permission pre-flight of the account inventory.
+The actions a principal needs are simulated in one SimulatePrincipalPolicy
+call per principal, and the actions that are denied are cached for a TTL in
+the warm container and optionally in an SSM parameter, which the rotation
+function reads into its Capabilities as well.
+"""
+
+import hashlib
+import json
+import logging
+import time
 from typing import Dict, List, Optional
 
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# Permission checks by the hash of the actions they were probed for
+_check_cache: Dict[str, Dict] = {}
+
+
+def is_fresh(check: Dict, ttl: int) -> bool:
+    return time.time() - check['checked_at'] < ttl
+
+
 def blocked(
+    iam_client,
+    policy_source_arn: str,
     actions: List[str],
-    resources: Optional[List[str]] = None,
+    resources: Optional[Dict[str, str]] = None,
     context: Optional[Dict[str, List]] = None
 ) -> List[str]:
-    """test whether IAM user is able to use specified AWS action(s)
+    """test whether a principal is able to use specified AWS action(s)
+
+    All actions are simulated in a single call. Actions limited to specific
+    resources are judged by the result for their own resource.
 
     Args:
-        actions (list): AWS action(s) to validate IAM user can use.
-        resources (list): Check if action(s) can be used on resource(s).
-            If None, action(s) must be usable on all resources ("*").
+        iam_client: IAM client of the account of the principal.
+        policy_source_arn (str): ARN of the user or role to simulate.
+        actions (list): AWS action(s) to validate the principal can use.
+        resources (dict): Resource ARN each action is used on. Actions
+            without a resource must be usable on all resources ("*").
         context (dict): Check if action(s) can be used with context(s).
             If None, it is expected that no context restrictions were set.
 
@@ -19,27 +55,117 @@ def blocked(
     """
     if not actions:
         return []
-    actions = list(set(actions))
-
-    if resources is None:
-        resources = ["*"]
+    actions = sorted(set(actions))
+    resources = resources or {}
+    action_resources = {action: resources.get(action, '*')
+                        for action in actions}
 
-    _context: List[Dict] = [{}]
+    kwargs = {
+        'PolicySourceArn': policy_source_arn,
+        'ActionNames': actions,
+        'ResourceArns': sorted(set(action_resources.values()))
+    }
     if context is not None:
         # Convert context dict to list[dict] expected by ContextEntries.
-        _context = [{
+        kwargs['ContextEntries'] = [{
             'ContextKeyName': context_key,
             'ContextKeyValues': [str(val) for val in context_values],
             'ContextKeyType': "string"
         } for context_key, context_values in context.items()]
 
-    # You'll need to create an IAM client here
-    results = aws.iam_client().simulate_principal_policy(
-        PolicySourceArn=consts.IAM_ARN,  # Your IAM user's ARN goes here
-        ActionNames=actions,
-        ResourceArns=resources,
-        ContextEntries=_context
-    )['EvaluationResults']
+    denied = []
+    paginator = iam_client.get_paginator('simulate_principal_policy')
+    for page in paginator.paginate(**kwargs):
+        for result in page['EvaluationResults']:
+            action = result['EvalActionName']
+            decision = result['EvalDecision']
+            resource = action_resources.get(action, '*')
+            for specific in result.get('ResourceSpecificResults', []):
+                if specific['EvalResourceName'] == resource:
+                    decision = specific['EvalResourceDecision']
+            if decision != 'allowed':
+                denied.append(action)
+    return sorted(set(denied))
+
+
+def _load_parameter(ssm_client, parameter_name: str) -> Optional[Dict]:
+    try:
+        value = ssm_client.get_parameter(Name=parameter_name)['Parameter']['Value']
+        check = json.loads(value)
+        if not isinstance(check['blocked'], dict):
+            # written before the actions were kept by principal
+            return None
+        return {'blocked': check['blocked'], 'checked_at': check['checked_at'],
+                'required_hash': check['required_hash']}
+    except ssm_client.exceptions.ParameterNotFound:
+        return None
+    except (ssm_client.exceptions.ClientError, ValueError, KeyError,
+            TypeError) as error:
+        log.error(f'Unable to read permission cache {parameter_name}: {error}')
+        return None
+
+
+def _store_parameter(ssm_client, parameter_name: str, check: Dict) -> None:
+    try:
+        ssm_client.put_parameter(Name=parameter_name, Type='String',
+                                 Value=json.dumps(check), Overwrite=True)
+    except ssm_client.exceptions.ClientError as error:
+        log.error(f'Unable to write permission cache {parameter_name}: {error}')
+
+
+def get_blocked_actions(
+    iam_client,
+    required: Dict[str, Dict[str, str]],
+    ttl: int,
+    ssm_client=None,
+    parameter_name: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """probe the actions of one or more principals, cached for a TTL
+
+    The warm container is checked first, then the SSM parameter, and only
+    if neither holds a fresh result for the same actions each principal is
+    simulated once. The parameter holds the denied actions by principal
+    ARN under "blocked" and the epoch seconds of the check under
+    "checked_at".
+
+    Args:
+        iam_client: IAM client of the account of the principals.
+        required (dict): Actions of each principal ARN, mapped to the
+            resource ARN they are used on.
+        ttl (int): Seconds a result is reused.
+        ssm_client: SSM client of the parameter the result is shared in.
+        parameter_name (str): Name of the SSM parameter, None to only
+            cache in the container.
+
+    Returns:
+        dict: Actions denied to each principal ARN.
+    """
+    required_hash = hashlib.sha256(
+        json.dumps(required, sort_keys=True).encode('utf-8')).hexdigest()
+
+    check = _check_cache.get(required_hash)
+    if check is not None and is_fresh(check, ttl):
+        return check['blocked']
+
+    if ssm_client is not None and parameter_name:
+        check = _load_parameter(ssm_client, parameter_name)
+        if check is not None and is_fresh(check, ttl) \
+                and check['required_hash'] == required_hash:
+            log.info(f'Using permission check cached in {parameter_name}')
+            _check_cache[required_hash] = check
+            return check['blocked']
+
+    check = {
+        'blocked': {principal_arn: blocked(iam_client, principal_arn,
+                                           list(actions), actions)
+                    for principal_arn, actions in required.items()},
+        'checked_at': time.time(),
+        'required_hash': required_hash
+    }
+    log.info(f'Simulated {sum(map(len, required.values()))} actions of'
+             f' {len(required)} principals, blocked: {check["blocked"]}')
 
-    return sorted([result['EvalActionName'] for result in results
-        if result['EvalDecision'] != "allowed"])
\ No newline at end of file
+    _check_cache[required_hash] = check
+    if ssm_client is not None and parameter_name:
+        _store_parameter(ssm_client, parameter_name, check)
+    return check['blocked']
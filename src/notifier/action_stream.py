@@ -0,0 +1,73 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Action Stream.
+
+Provides the action lists that the rotation wrote to S3, or a local file
+when testing, because they did not fit in the notification payload. The
+lists are read line by line while the email is rendered.
+"""
+
+import json
+import logging
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+_s3_client = None
+
+
+def get_s3_client():
+    """
+    Gets the S3 client of the container, creating it on first use.
+
+    :return S3 client.
+    """
+    global _s3_client
+    if _s3_client is None:
+        # most notifications carry their actions, boto3 is loaded by the
+        # SES sender when the email is sent
+        import boto3
+
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+def iter_actions(reference: dict):
+    """
+    Streams a spilled action list, one JSON string per line.
+
+    :param reference: Dictionary with the 'bucket' and 'key' of the list in
+        S3, or the 'path' of a local file
+    :return Generator of the action messages.
+    """
+    log.info(f'Streaming actions from {reference}')
+    if 'path' in reference:
+        with open(reference['path'], 'rb') as actions_file:
+            for line in actions_file:
+                yield json.loads(line)
+        return
+
+    body = get_s3_client().get_object(Bucket=reference['bucket'],
+                                      Key=reference['key'])['Body']
+    try:
+        for line in body.iter_lines():
+            if line:
+                yield json.loads(line)
+    finally:
+        body.close()
+
+
+def get_actions(notification: dict):
+    """
+    Gets the actions of a notification, streamed from its reference when
+    the list was spilled.
+
+    :return Iterable of the action messages.
+    """
+    reference = notification.get('actions_ref')
+    if reference:
+        return iter_actions(reference)
+    return notification['template_values'].get('actions', [])
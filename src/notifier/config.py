@@ -20,3 +20,4 @@ class Config:
     sender_email: str = os.getenv('SENDER_EMAIL')
     s3_bucket_name = os.getenv('S3_BUCKET_NAME')
     s3_bucket_prefix = os.getenv('S3_BUCKET_PREFIX')
+    digest_queue_url = os.getenv('DIGEST_QUEUE_URL')
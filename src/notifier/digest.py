@@ -0,0 +1,160 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Digest.
+
+Provides the daily digest of the Notifier. Rotation runs queue their
+notifications instead of sending them, and the digest sends one email per
+recipient with the actions of every account that shares the recipient.
+"""
+
+import itertools
+import json
+import logging
+from datetime import datetime, timezone
+
+import boto3
+
+from config import Config
+from notifier import Notifier
+from action_stream import get_actions
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# time left in milliseconds at which the digest stops receiving messages,
+# leaving time to send the emails
+SEND_TIME_RESERVE = 120000
+
+# SQS accepts at most 10 messages per receive and delete call
+SQS_BATCH_SIZE = 10
+
+
+def receive_notifications(sqs, queue_url, context):
+    """
+    Receives the queued notifications until the queue is drained or the
+    time reserved for sending is reached.
+
+    :return List of (receipt handle, notification) tuples.
+    """
+    messages = []
+    while context is None or \
+            context.get_remaining_time_in_millis() > SEND_TIME_RESERVE:
+        response = sqs.receive_message(QueueUrl=queue_url,
+                                       MaxNumberOfMessages=SQS_BATCH_SIZE,
+                                       WaitTimeSeconds=1)
+        if not response.get('Messages'):
+            break
+        for message in response['Messages']:
+            try:
+                notification = json.loads(message['Body'])
+            except ValueError as err:
+                # left on the queue for the dead letter queue
+                log.error(f'Skipping malformed message'
+                          f' {message["MessageId"]} - {err}')
+                continue
+            messages.append((message['ReceiptHandle'], notification))
+    return messages
+
+
+def group_by_recipient(messages):
+    """
+    Groups notifications by recipient email, template and subject.
+
+    :return Dictionary of the receipt handles and notifications of each
+        recipient.
+    """
+    groups = {}
+    for receipt_handle, notification in messages:
+        key = (notification.get('email'), notification.get('email_template'),
+               notification.get('subject'))
+        group = groups.setdefault(key, ([], []))
+        group[0].append(receipt_handle)
+        group[1].append(notification)
+    return groups
+
+
+def prefix_actions(prefix, actions):
+    for action in actions:
+        yield prefix + str(action)
+
+
+def merge_template_values(notifications, timestamp):
+    """
+    Merges the template values of the notifications of a recipient. The
+    actions of each account are prefixed with the account when the digest
+    covers more than one account.
+
+    :return Dictionary of template values of the digest.
+    """
+    template_values = dict(notifications[0]['template_values'])
+    accounts = {}
+    for notification in notifications:
+        values = notification['template_values']
+        accounts.setdefault(values['account_id'], values.get('account_name'))
+
+    actions = []
+    for notification in notifications:
+        values = notification['template_values']
+        if len(accounts) > 1:
+            prefix = f'{values["account_name"]} ({values["account_id"]}): '
+            actions.append(prefix_actions(prefix, get_actions(notification)))
+        else:
+            actions.append(get_actions(notification))
+
+    template_values['account_id'] = ', '.join(map(str, accounts))
+    template_values['account_name'] = ', '.join(map(str, accounts.values()))
+    template_values['timestamp'] = timestamp
+    # spilled action lists are only streamed while rendering
+    template_values['actions'] = itertools.chain.from_iterable(actions)
+    return template_values
+
+
+def delete_messages(sqs, queue_url, receipt_handles):
+    for start in range(0, len(receipt_handles), SQS_BATCH_SIZE):
+        entries = [{'Id': str(index), 'ReceiptHandle': receipt_handle}
+                   for index, receipt_handle in enumerate(
+                       receipt_handles[start:start + SQS_BATCH_SIZE])]
+        sqs.delete_message_batch(QueueUrl=queue_url, Entries=entries)
+
+
+def lambda_handler(event: dict = None, context=None):
+    """Lambda Handler.
+
+    Sends the daily digest of the queued notifications. Notifications of a
+    recipient whose email fails stay on the queue for the next digest.
+
+    :return Dictionary summary of the digest.
+    """
+    config = Config()
+    sqs = boto3.client('sqs')
+    timestamp = datetime.now(timezone.utc).isoformat()
+
+    messages = receive_notifications(sqs, config.digest_queue_url, context)
+    groups = group_by_recipient(messages)
+    log.info(f'Sending a digest of {len(messages)} notifications to'
+             f' {len(groups)} recipients')
+
+    failed = 0
+    for (email, email_template, subject), (receipt_handles, notifications) \
+            in groups.items():
+        template_values = merge_template_values(notifications, timestamp)
+        template_values['sender_email'] = config.sender_email
+        notifier = Notifier(config.sender_email, email,
+                            config.s3_bucket_name, config.s3_bucket_prefix,
+                            email_template, subject, config.lambda_task_root)
+        try:
+            notifier.send_email(template_values)
+        except Exception as err:
+            log.error(f'Failed to send the digest to {email} - {err}')
+            failed += 1
+            continue
+        delete_messages(sqs, config.digest_queue_url, receipt_handles)
+
+    return {
+        'notifications': len(messages),
+        'recipients': len(groups),
+        'failed_recipients': failed
+    }
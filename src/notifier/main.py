@@ -14,20 +14,57 @@ from datetime import datetime
 
 from config import Config
 from notifier import Notifier
+from action_stream import get_actions
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
+# characters of an event written to the log
+EVENT_LOG_LIMIT = 512
+
 
 def lambda_handler(event: dict = None, context=None):
-    """Lambda Handler."""
+    """Lambda Handler.
+
+    Sends the email of a single notification, or of every notification in
+    an SQS batch.
+
+    :return Dictionary of the SQS messages that failed for a batch, so only
+        those are retried.
+    """
     config = Config()
-    log.info(f'Event: {json.dumps(event, indent=2)}')
 
+    if 'Records' in event:
+        return send_batch(event['Records'], config)
+
+    log.info(f'Event: {summarize_event(event)}')
+    send_notification(event, config)
+
+
+def summarize_event(event: dict):
+    """
+    Summarizes a notification for the log, capped to EVENT_LOG_LIMIT
+    characters since the action list can be large.
+
+    :return String summary of the notification.
+    """
+    payload = json.dumps(event)
+    actions_count = event.get('actions_count') or \
+        len((event.get('template_values') or {}).get('actions') or [])
+    preview = payload[:EVENT_LOG_LIMIT]
+    if len(payload) > EVENT_LOG_LIMIT:
+        preview += '...'
+    return f'email={event.get("email")}, actions={actions_count},' \
+           f' size={len(payload)}, payload={preview}'
+
+
+def send_notification(event: dict, config: Config):
     email = event.get('email')
     email_template = event.get('email_template')
     subject = event.get('subject')
     template_values = event.get('template_values')
+    # spilled action lists are streamed while rendering
+    template_values['actions'] = get_actions(event)
 
     # add invocation parameters
     template_values['sender_email'] = config.sender_email
@@ -37,6 +74,27 @@ def lambda_handler(event: dict = None, context=None):
     notifier.send_email(template_values)
 
 
+def send_batch(records: list, config: Config):
+    """
+    Sends the notifications of an SQS batch. A failed notification does not
+    stop the batch, its message is reported back to SQS instead.
+
+    :return Dictionary of the batch item failures.
+    """
+    log.info(f'Sending a batch of {len(records)} notifications')
+    failures = []
+    for record in records:
+        try:
+            send_notification(json.loads(record['body']), config)
+        except Exception as err:
+            log.error(f'Failed to send notification of message'
+                      f' {record["messageId"]} - {err}')
+            failures.append({'itemIdentifier': record['messageId']})
+    log.info(f'Sent {len(records) - len(failures)} of {len(records)}'
+             f' notifications')
+    return {'batchItemFailures': failures}
+
+
 def parse_template_values(event, config):
     account_id = event.get('account')
     action_queue = event.get('action_queue')
@@ -9,10 +9,12 @@ Provies core logic for the Notifier Lambda Function.
 """
 
 import logging
-import boto3
 
 from botocore.exceptions import ClientError
 
+from template import get_template
+from ses_sender import get_ses_client, get_send_rate
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
 
@@ -53,28 +55,14 @@ class Notifier:
     def __get_template(self, template_name):
         # log.info(f'Getting template {template_name} from S3')
         # s3 = boto3.client('s3')
+        # obj = s3.get_object(
+        #     Bucket=self.template_s3_bucket,
+        #     Key=f'{self.template_s3_prefix}/Template/{template_name}'
+        # )
 
-        try:
-            # obj = s3.get_object(
-            #     Bucket=self.template_s3_bucket,
-            #     Key=f'{self.template_s3_prefix}/Template/{template_name}'
-            # )
-
-            # data = obj['Body'].read()
-            # template = data.decode('utf-8')
-            # log.info(f'Successfully retrieved content for {template_name}')
-            # return template
-
-            f = open(f'{self.lambda_task_root}/templates/{template_name}','r')
-            data = f.read()
-            f.close()
-            # template = data.decode('utf-8')
-            return data
-        except ClientError as err:
-            log.error(
-                f'Error while getting file contents for {template_name}'
-                f' - {err}'
-            )
+        # compiled once per container and reused by warm invocations
+        return get_template(
+            f'{self.lambda_task_root}/templates/{template_name}')
 
     def __render_email_body(self, template_values: dict):
         subject = self.subject
@@ -84,37 +72,26 @@ class Notifier:
             log.error(f'Unable to get template for {subject}')
             raise ValueError(f'Unable to get template for {subject}')
         else:
-            # stream the template contents from S3
-            email = self.__get_template(template_s3_key)
+            template = self.__get_template(template_s3_key)
 
             log.info('Rendering email contents')
-            for k, v in template_values.items():
-                placeholder = '{{' + f'{k}' + '}}'
-                if isinstance(v, list):
-                    value = self.__format_html_list(v)
-                else:
-                    value = str(v)
-                email = email.replace(placeholder, value)
+            email = template.render(template_values)
 
-            log.info(f'Rendered Email: {email}')
+            log.info(f'Rendered Email: {len(email)} characters')
 
             return email
 
-    @staticmethod
-    def __format_html_list(value):
-        value_formatted = ''
-        for line in value:
-            value_formatted += f'&bull; {str(line)}<br>'
-        return value_formatted
-
     def send_email(self, template_values):
-        ses = boto3.client('ses')
+        # the client and send rate are shared by all emails of the container
+        ses = get_ses_client()
+        send_rate = get_send_rate()
 
         email_body = self.__render_email_body(template_values)
 
         try:
             log.info(f'Sending email to {self.recipient_email}')
-            resp = ses.send_email(
+            resp = send_rate.call(
+                ses.send_email,
                 Source=self.sender_email,
                 Destination={
                     'ToAddresses': [
@@ -0,0 +1,106 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""SES Sender.
+
+Provides the SES client and send rate limit shared by every email a warm
+Notifier container sends, so a batch of notifications stays under the
+maximum send rate of the account instead of being throttled.
+"""
+
+import logging
+import time
+
+import boto3
+
+from botocore.exceptions import ClientError
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+# SES reports an exceeded send rate as a Throttling error
+THROTTLING_ERROR_CODES = ('Throttling', 'ThrottlingException')
+
+_ses_client = None
+_send_rate = None
+
+
+class SendRate:
+    """Token bucket sized to the maximum send rate of the SES account.
+
+    :param rate: Maximum number of emails per second
+    :param max_attempts: Number of times a throttled send is attempted
+    """
+
+    def __init__(self, rate: float, max_attempts: int = 4) -> None:
+        self.rate = max(float(rate), 1.0)
+        self.max_attempts = max_attempts
+        self._tokens = self.rate
+        self._timestamp = time.monotonic()
+
+    def acquire(self) -> None:
+        """Blocks until an email may be sent."""
+        now = time.monotonic()
+        self._tokens = min(self.rate,
+                           self._tokens + (now - self._timestamp) * self.rate)
+        self._timestamp = now
+        if self._tokens < 1:
+            time.sleep((1 - self._tokens) / self.rate)
+            self._timestamp = time.monotonic()
+            self._tokens = 1
+        self._tokens -= 1
+
+    def call(self, method, **kwargs):
+        """
+        Calls an SES method once a token is available, backing off and
+        retrying when SES throttles the call.
+
+        :return The response of the SES method.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self.acquire()
+            try:
+                return method(**kwargs)
+            except ClientError as err:
+                code = err.response['Error']['Code']
+                if code not in THROTTLING_ERROR_CODES \
+                        or attempt == self.max_attempts:
+                    raise
+                log.info(f'Send throttled, retrying - {err}')
+                # give the bucket time to refill before the next attempt
+                self._tokens = 1 - self.rate * (2 ** (attempt - 1))
+
+
+def get_ses_client():
+    """
+    Gets the SES client of the container, creating it on first use.
+
+    :return SES client.
+    """
+    global _ses_client
+    if _ses_client is None:
+        _ses_client = boto3.client('ses')
+    return _ses_client
+
+
+def get_send_rate() -> SendRate:
+    """
+    Gets the send rate limit of the container, sized from the SES send
+    quota of the account on first use.
+
+    :return SendRate of the account.
+    """
+    global _send_rate
+    if _send_rate is None:
+        try:
+            quota = get_ses_client().get_send_quota()
+            rate = quota['MaxSendRate']
+        except ClientError as err:
+            log.error(f'Unable to get the SES send quota, sending one email'
+                      f' per second - {err}')
+            rate = 1
+        log.info(f'Sending at most {rate} emails per second')
+        _send_rate = SendRate(rate)
+    return _send_rate
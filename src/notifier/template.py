@@ -0,0 +1,83 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Template.
+
+Provides the compiled email templates of the Notifier. Templates are read
+and split into literal and placeholder segments once per container, so warm
+invocations only join the segments with the escaped template values.
+"""
+
+import html
+import logging
+import re
+
+from collections.abc import Iterator
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+PLACEHOLDER_PATTERN = re.compile(r'{{(\w+)}}')
+
+# compiled templates by path, kept for the lifetime of the container
+_template_cache = {}
+
+
+class Template:
+    """Email template split into literal and placeholder segments.
+
+    :param source: Template text with {{key}} placeholders
+    """
+
+    def __init__(self, source: str) -> None:
+        # even indices hold literals, odd indices hold placeholder names
+        self.segments = PLACEHOLDER_PATTERN.split(source)
+
+    def render(self, template_values: dict) -> str:
+        """
+        Renders the template in a single pass. Values are HTML escaped,
+        placeholders without a value are left as they are.
+
+        :return String rendered template.
+        """
+        values = {key: format_value(value)
+                  for key, value in template_values.items()}
+        segments = self.segments
+        parts = [segments[0]]
+        for index in range(1, len(segments), 2):
+            key = segments[index]
+            value = values.get(key)
+            parts.append('{{' + key + '}}' if value is None else value)
+            parts.append(segments[index + 1])
+        return ''.join(parts)
+
+
+def format_value(value) -> str:
+    """
+    Formats a template value as HTML. Lists and streamed iterators are
+    rendered as one bulleted line per item. Values may contain IAM user
+    names and are escaped.
+
+    :return String HTML of the value.
+    """
+    if isinstance(value, (list, Iterator)):
+        return ''.join([f'&bull; {html.escape(str(line))}<br>'
+                        for line in value])
+    return html.escape(str(value))
+
+
+def get_template(path: str) -> Template:
+    """
+    Gets the compiled template of a file, reading it on first use only.
+
+    :return Template of the file.
+    """
+    template = _template_cache.get(path)
+    if template is None:
+        log.info(f'Compiling template {path}')
+        with open(path, 'r') as template_file:
+            template = Template(template_file.read())
+        _template_cache[path] = template
+    return template
@@ -0,0 +1,51 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Test Configuration.
+
+The Lambda handlers import their modules flat from their own directory, so
+the rotation function and the account inventory directories are put on the
+path the same way Lambda does. The configuration without a default is set
+before the modules read it on import. The notifier has modules of the
+same names, so its modules are only imported through the notifier fixture.
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOTIFIER_DIR = os.path.join(ROOT, 'src', 'notifier')
+
+ENVIRONMENT = {
+    'ROTATION_PERIOD': '90',
+    'INSTALLATION_GRACE_PERIOD': '10',
+    'RECOVERY_GRACE_PERIOD': '10',
+    'PENDING_ACTION_WARN_PERIOD': '7',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+}
+
+for name, value in ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
+
+sys.path[:0] = [os.path.join(ROOT, 'src', 'access_key_auto_rotation'),
+                os.path.join(ROOT, 'src')]
+
+
+@pytest.fixture
+def notifier(monkeypatch):
+    """
+    Puts the notifier directory first on the path for a test, hiding the
+    rotation function modules of the same names until the test ends.
+
+    :return Function importing a notifier module by name.
+    """
+    monkeypatch.syspath_prepend(NOTIFIER_DIR)
+    for file_name in os.listdir(NOTIFIER_DIR):
+        if file_name.endswith('.py'):
+            monkeypatch.delitem(sys.modules, file_name[:-3], raising=False)
+    return importlib.import_module
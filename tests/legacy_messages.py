@@ -0,0 +1,75 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Legacy Messages.
+
+Frozen copy of the f-string action messages that the message catalog
+replaced, used as the reference of the message catalog test and benchmark.
+"""
+
+from key_policy import ActionReasons
+from key_records import ActionKind
+
+
+def format_action_message(key_action, dryrun, action_errors, now):
+    """
+    Formats the message of an action for the notification.
+
+    :return String message of the action.
+    """
+    action = key_action.kind.name
+    user_name = key_action.key.user_name
+    access_key_id = key_action.key.access_key_id
+    reason = key_action.reason
+    message = ''
+    if key_action.kind != ActionKind.WARN:
+        if id(key_action) in action_errors:
+            message = f'FAILED: {action} key {user_name}:{access_key_id}.' \
+                      f'  {reason.value}  {action_errors[id(key_action)]}'
+        elif dryrun:
+            message = f'DRYRUN: {action} key {user_name}:{access_key_id}.' \
+                      f'  {reason.value}'
+        else:
+            message = f'ACTION: {action} key {user_name}:{access_key_id}.' \
+                      f'  {reason.value}'
+    else:
+        delta = key_action.action_date - now
+        delta_days = round(delta.total_seconds() / 86400)
+
+        if reason == ActionReasons.KEY_PENDING_ROTATION:
+            message = f'WARNING: Key {user_name}:{access_key_id} ' \
+                      f'will expire in {delta_days} days and will be ' \
+                      f'rotated.  Please be ready to install the new key.'
+        elif reason == ActionReasons.KEY_PENDING_DEACTIVATION:
+            message = f'WARNING: Key {user_name}:{access_key_id} ' \
+                      f'installation grace period will end in' \
+                      f' {delta_days} days and will be deactivated.' \
+                      f'  Please verify the new key is installed.'
+        elif reason == ActionReasons.KEY_PENDING_DELETION:
+            message = f'WARNING: Key {user_name}:{access_key_id} ' \
+                      f'recovery grace period will end in' \
+                      f' {delta_days} days and will be permanently ' \
+                      f'deleted.  Please verify the new key is ' \
+                      f'installed and working.'
+        elif reason == ActionReasons.UNUSED_KEY_PENDING_DELETION:
+            message = f'WARNING: Key {user_name}:{access_key_id} ' \
+                      f'will expire in {delta_days} days and has never ' \
+                      f'been used.  Key will be permanently deleted.'
+        elif reason == ActionReasons.KEY_PENDING_EXPIRATION_CONFLICT:
+            message = f'CRITICAL: Key {user_name}:{access_key_id} ' \
+                      f'will expire in {delta_days} days and cannot ' \
+                      f'be rotated because another key exists for the ' \
+                      f'user!  It will be permanently deleted when the' \
+                      f' other key expires or the grace period ends!  ' \
+                      f'Please make sure this key is not being used!'
+        elif reason == ActionReasons.KEY_PENDING_DELETION_CONFLICT:
+            message = f'CRITICAL: Key {user_name}:{access_key_id} ' \
+                      f'will be permanently deleted in {delta_days} days' \
+                      f' due to a conflict with another key for the ' \
+                      f'user!  It may be deactivated sooner if the grace' \
+                      f' period ends!  Please make sure this key is not' \
+                      f' being used!'
+
+    return message
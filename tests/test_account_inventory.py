@@ -0,0 +1,233 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the account inventory and the fleet summary."""
+
+import datetime
+import io
+import json
+import types
+
+import pytest
+
+import account_inventory
+
+
+class ClientError(Exception):
+    pass
+
+
+class NoSuchKey(ClientError):
+    pass
+
+
+class StubS3Client:
+    """In memory S3 put_object and get_object."""
+
+    exceptions = types.SimpleNamespace(NoSuchKey=NoSuchKey,
+                                       ClientError=ClientError)
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey(Key)
+        body = self.objects[(Bucket, Key)]
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return {'Body': io.BytesIO(body)}
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    client = StubS3Client()
+    monkeypatch.setattr(account_inventory, 'get_client',
+                        lambda service_name: client)
+    return client
+
+
+def account_summary(account_id, **counts):
+    summary = {'account': account_id, 'keys_rotated': 0,
+               'keys_deactivated': 0, 'keys_deleted': 0, 'warnings': 0,
+               'duration_ms': 100}
+    summary.update(counts)
+    return summary
+
+
+def test_rotation_payloads_are_written_to_the_fleet_bucket(s3_client,
+                                                           monkeypatch):
+    monkeypatch.setattr(account_inventory, 'FLEET_BUCKET', 'fleet')
+    payloads = [{'account': '1'}, {'account': '2'}]
+
+    location = account_inventory.write_rotation_payloads(payloads)
+
+    assert location['bucket'] == 'fleet'
+    assert location['key'].startswith(account_inventory.FLEET_ACCOUNTS_PREFIX)
+    assert json.loads(s3_client.objects[('fleet', location['key'])]) == \
+        payloads
+
+
+def test_rotation_payloads_are_inline_without_fleet_bucket(monkeypatch):
+    monkeypatch.setattr(account_inventory, 'FLEET_BUCKET', None)
+    assert account_inventory.write_rotation_payloads([{'account': '1'}]) == \
+        {'accounts': [{'account': '1'}]}
+
+
+def test_summary_reads_map_results_from_s3(s3_client):
+    succeeded = [
+        {'Input': json.dumps({'account': '1'}),
+         'Output': json.dumps(account_summary('1', keys_rotated=2))},
+        {'Input': json.dumps({'accounts': [{'account': '2'},
+                                           {'account': '3'}]}),
+         'Output': json.dumps({'accounts': [
+             account_summary('2', warnings=1),
+             {'account': '3', 'error': 'AccessDenied'}]})},
+    ]
+    failed = [{'Input': json.dumps({'account': '4'}),
+               'Error': 'States.Timeout'}]
+    s3_client.put_object('fleet', 'results/SUCCEEDED_0.json',
+                         json.dumps(succeeded))
+    s3_client.put_object('fleet', 'results/FAILED_0.json',
+                         json.dumps(failed))
+    s3_client.put_object('fleet', 'results/manifest.json', json.dumps({
+        'DestinationBucket': 'fleet',
+        'ResultFiles': {
+            'SUCCEEDED': [{'Key': 'results/SUCCEEDED_0.json'}],
+            'FAILED': [{'Key': 'results/FAILED_0.json'}],
+            'PENDING': []}}))
+
+    summary = account_inventory.summarize_handler(
+        {'ResultWriterDetails': {'Bucket': 'fleet',
+                                 'Key': 'results/manifest.json'}}, None)
+
+    assert summary['accounts_scanned'] == 2
+    assert summary['failed_accounts'] == ['3', '4']
+    assert summary['keys_rotated'] == 2
+    assert summary['warnings'] == 1
+
+
+def test_deadline_index_pops_due_accounts_in_order():
+    now = datetime.datetime(2021, 6, 1, tzinfo=datetime.timezone.utc)
+    index = account_inventory.DeadlineIndex({
+        '1': now + datetime.timedelta(days=1),
+        '2': now - datetime.timedelta(days=1),
+        '3': now,
+        '4': now - datetime.timedelta(days=2)})
+
+    assert list(index.pop_due(now)) == ['4', '2', '3']
+    assert len(index) == 1
+    assert index.next_due() == now + datetime.timedelta(days=1)
+    assert list(index.pop_due(now)) == []
+
+
+def test_due_accounts_of_an_ou_listing(monkeypatch):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    monkeypatch.setattr(account_inventory, 'load_account_schedule', lambda: {
+        'due': now - datetime.timedelta(hours=1),
+        'later': now + datetime.timedelta(days=1),
+        'removed': now - datetime.timedelta(days=1)})
+    accounts = ({'Id': account_id}
+                for account_id in ('new', 'due', 'later'))
+
+    assert account_inventory.get_due_accounts(accounts) == [
+        {'Id': 'new'}, {'Id': 'due'}]
+
+
+def test_all_accounts_are_due_without_schedule(monkeypatch):
+    def load_account_schedule():
+        raise ClientError('AccessDenied')
+
+    client = types.SimpleNamespace(
+        exceptions=types.SimpleNamespace(ClientError=ClientError))
+    monkeypatch.setattr(account_inventory, 'get_client',
+                        lambda service_name: client)
+    monkeypatch.setattr(account_inventory, 'load_account_schedule',
+                        load_account_schedule)
+    accounts = ({'Id': account_id} for account_id in ('1', '2'))
+
+    assert account_inventory.get_due_accounts(accounts) == [
+        {'Id': '1'}, {'Id': '2'}]
+
+
+class StubOrganizationsClient:
+    """Organizations paginators of an OU tree, counting the child OU
+    listings and failing those of the OUs in failing."""
+
+    exceptions = types.SimpleNamespace(ClientError=ClientError)
+
+    def __init__(self, children, accounts):
+        self.children = children
+        self.accounts = accounts
+        self.child_listings = []
+        self.failing = set()
+
+    def get_paginator(self, operation_name):
+        return types.SimpleNamespace(paginate=getattr(self, operation_name))
+
+    def list_children(self, ParentId, ChildType):
+        self.child_listings.append(ParentId)
+        if ParentId in self.failing:
+            raise ClientError('AccessDenied')
+        return [{'Children': [{'Id': child_id} for child_id
+                              in self.children.get(ParentId, [])]}]
+
+    def list_accounts_for_parent(self, ParentId):
+        return [{'Accounts': [{'Id': account_id} for account_id
+                              in self.accounts.get(ParentId, [])]}]
+
+
+@pytest.fixture
+def org_client(monkeypatch):
+    client = StubOrganizationsClient(
+        children={'ou-root': ['ou-a', 'ou-b'], 'ou-a': ['ou-c']},
+        accounts={'ou-root': ['1'], 'ou-a': ['2'], 'ou-c': ['3', '1']})
+    s3_client = StubS3Client()
+    clients = {'organizations': client, 's3': s3_client}
+    monkeypatch.setattr(account_inventory, 'get_client',
+                        lambda service_name: clients[service_name])
+    monkeypatch.setattr(account_inventory, 'FLEET_BUCKET', 'fleet')
+    return client
+
+
+def list_account_ids(**kwargs):
+    return sorted(account['Id'] for account in
+                  account_inventory.list_aws_accounts_for_ou('ou-root',
+                                                             **kwargs))
+
+
+def test_second_ou_listing_is_served_from_the_cache(org_client):
+    assert list_account_ids() == ['1', '2', '3']
+    assert sorted(org_client.child_listings) == \
+        ['ou-a', 'ou-b', 'ou-c', 'ou-root']
+
+    # a later run only lists the accounts of the cached OUs
+    org_client.child_listings.clear()
+    org_client.accounts['ou-b'] = ['4']
+    assert list_account_ids() == ['1', '2', '3', '4']
+    assert org_client.child_listings == []
+
+
+def test_ou_tree_is_listed_again_when_stale_or_refreshed(org_client,
+                                                         monkeypatch):
+    list_account_ids()
+    org_client.children['ou-b'] = ['ou-d']
+    org_client.accounts['ou-d'] = ['5']
+
+    assert list_account_ids(refresh=True) == ['1', '2', '3', '5']
+    org_client.child_listings.clear()
+    monkeypatch.setattr(account_inventory, 'OU_TREE_CACHE_TTL', 0)
+    list_account_ids()
+    assert 'ou-root' in org_client.child_listings
+
+
+def test_ou_tree_is_only_cached_when_complete(org_client):
+    org_client.failing.add('ou-a')
+
+    assert list_account_ids() == ['1', '2']
+    assert account_inventory.load_ou_tree('ou-root') is None
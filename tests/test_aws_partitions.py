@@ -0,0 +1,41 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the partition index against the lookups it replaced."""
+
+import pytest
+from botocore.loaders import create_loader
+
+import aws_partitions
+import legacy_partitions
+
+PARTITIONS = create_loader().load_data('endpoints')['partitions']
+
+
+@pytest.mark.parametrize('partition', PARTITIONS,
+                         ids=[x['partition'] for x in PARTITIONS])
+def test_lookups_match_legacy(partition):
+    partition_id = partition['partition']
+
+    for region_name in partition['regions']:
+        assert aws_partitions.get_partition_for_region(region_name) == \
+            legacy_partitions.get_partition_for_region(region_name)
+    assert aws_partitions.get_partition_name(partition_id) == \
+        legacy_partitions.get_partition_name(partition_id)
+    assert list(aws_partitions.get_partition_regions(partition_id)) == \
+        list(legacy_partitions.get_partition_regions(partition_id))
+    if 'partitionEndpoint' in partition['services'].get('iam', {}):
+        assert aws_partitions.get_iam_region(partition_id) == \
+            legacy_partitions.get_iam_region(partition_id)
+    else:
+        with pytest.raises(ValueError):
+            aws_partitions.get_iam_region(partition_id)
+
+
+def test_unlisted_regions_match_the_region_pattern():
+    assert aws_partitions.get_partition_for_region('us-future-1') == \
+        legacy_partitions.get_partition_for_region('us-future-1') == 'aws'
+    with pytest.raises(ValueError):
+        aws_partitions.get_partition_for_region('moon-base-1')
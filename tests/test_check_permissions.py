@@ -0,0 +1,169 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the permission pre-flight and the capabilities of the rotation."""
+
+import json
+import sys
+import time
+import types
+
+import pytest
+
+import account_inventory
+import capabilities
+import check_permissions
+from capabilities import Capabilities, check_dryrun, load_capabilities
+
+INVENTORY_ROLE = 'arn:aws:iam::111111111111:role/inventory'
+ASSUMED_ROLE = 'arn:aws:iam::111111111111:role/assumed'
+SECRET_ARN = 'arn:aws:secretsmanager:us-east-1:111111111111:secret:probe'
+
+
+class StubIamClient:
+    """SimulatePrincipalPolicy stub denying the given actions, either on
+    all resources or only on a resource."""
+
+    def __init__(self, denied=(), denied_on_resource=()):
+        self.denied = set(denied)
+        self.denied_on_resource = dict(denied_on_resource)
+        self.calls = []
+
+    def get_paginator(self, operation_name):
+        assert operation_name == 'simulate_principal_policy'
+        return self
+
+    def paginate(self, **kwargs):
+        self.calls.append(kwargs)
+        results = []
+        for action in kwargs['ActionNames']:
+            result = {'EvalActionName': action,
+                      'EvalDecision': 'implicitDeny'
+                      if action in self.denied else 'allowed'}
+            if action in self.denied_on_resource:
+                result['ResourceSpecificResults'] = [{
+                    'EvalResourceName': self.denied_on_resource[action],
+                    'EvalResourceDecision': 'explicitDeny'}]
+            results.append(result)
+        yield {'EvaluationResults': results}
+
+
+class StubSsmClient:
+    exceptions = types.SimpleNamespace(ParameterNotFound=KeyError,
+                                       ClientError=RuntimeError)
+
+    def __init__(self):
+        self.parameters = {}
+
+    def get_parameter(self, Name):
+        return {'Parameter': {'Value': self.parameters[Name]}}
+
+    def put_parameter(self, Name, Value, **kwargs):
+        self.parameters[Name] = Value
+
+
+REQUIRED = {
+    INVENTORY_ROLE: {'organizations:ListAccounts': '*',
+                     'lambda:InvokeFunction': '*'},
+    ASSUMED_ROLE: {'iam:ListUsers': '*',
+                   'secretsmanager:CreateSecret': SECRET_ARN},
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_caches(monkeypatch):
+    monkeypatch.setattr(check_permissions, '_check_cache', {})
+    monkeypatch.setattr(capabilities, '_parameter_cache', None)
+
+
+def test_one_simulation_per_principal():
+    iam_client = StubIamClient(
+        denied=['lambda:InvokeFunction'],
+        denied_on_resource={'secretsmanager:CreateSecret': SECRET_ARN})
+
+    blocked = check_permissions.get_blocked_actions(iam_client, REQUIRED, 60)
+
+    assert blocked == {INVENTORY_ROLE: ['lambda:InvokeFunction'],
+                       ASSUMED_ROLE: ['secretsmanager:CreateSecret']}
+    assert [call['PolicySourceArn'] for call in iam_client.calls] == \
+        [INVENTORY_ROLE, ASSUMED_ROLE]
+    assert iam_client.calls[1]['ResourceArns'] == ['*', SECRET_ARN]
+
+
+def test_check_is_cached_in_container_and_parameter(monkeypatch):
+    iam_client = StubIamClient(denied=['iam:ListUsers'])
+    ssm_client = StubSsmClient()
+
+    first = check_permissions.get_blocked_actions(
+        iam_client, REQUIRED, 60, ssm_client, '/check')
+    assert check_permissions.get_blocked_actions(
+        iam_client, REQUIRED, 60, ssm_client, '/check') == first
+    assert len(iam_client.calls) == 2
+
+    # a new container reads the parameter instead of simulating again
+    monkeypatch.setattr(check_permissions, '_check_cache', {})
+    assert check_permissions.get_blocked_actions(
+        iam_client, REQUIRED, 60, ssm_client, '/check') == first
+    assert len(iam_client.calls) == 2
+
+    # until the check is older than the TTL
+    monkeypatch.setattr(check_permissions, '_check_cache', {})
+    later = time.time() + 120
+    monkeypatch.setattr(check_permissions.time, 'time', lambda: later)
+    check_permissions.get_blocked_actions(
+        iam_client, REQUIRED, 60, ssm_client, '/check')
+    assert len(iam_client.calls) == 4
+
+
+def test_assumed_role_check_only_limits_primary_account(monkeypatch):
+    monkeypatch.setenv('PRIMARY_ACCOUNT_ID', '111111111111')
+    accounts = [{'Id': account_id, 'Name': account_id, 'Email': 'e',
+                 'Status': 'ACTIVE'}
+                for account_id in ('111111111111', '222222222222')]
+
+    payloads = account_inventory.get_rotation_payloads(
+        accounts, primary_blocked_actions=['iam:CreateAccessKey'])
+
+    assert payloads[0]['blocked_actions'] == ['iam:CreateAccessKey']
+    assert 'blocked_actions' not in payloads[1]
+
+
+def test_blocked_key_actions_force_dryrun():
+    assert check_dryrun(Capabilities(['iam:CreateAccessKey']), False)
+    assert not check_dryrun(Capabilities(['iam:GetCredentialReport']), False)
+    assert not check_dryrun(Capabilities(), False)
+
+
+@pytest.fixture
+def shared_check(monkeypatch):
+    ssm_client = StubSsmClient()
+    monkeypatch.setitem(sys.modules, 'boto3', types.SimpleNamespace(
+        client=lambda service_name: ssm_client))
+    config = capabilities.Config
+    monkeypatch.setattr(config, 'permissionCacheParameter', '/check')
+    monkeypatch.setattr(config, 'primaryAccountId', '111111111111')
+    monkeypatch.setattr(config, 'iamAssumedRoleName', 'assumed')
+    monkeypatch.setattr(config, 'permissionCheckMaxAge', 86400)
+
+    def share(checked_at):
+        ssm_client.parameters['/check'] = json.dumps({
+            'blocked': {INVENTORY_ROLE: ['lambda:InvokeFunction'],
+                        ASSUMED_ROLE: ['iam:CreateAccessKey']},
+            'checked_at': checked_at, 'required_hash': ''})
+    return share
+
+
+def test_load_capabilities_of_primary_account(shared_check):
+    shared_check(time.time() - 3600)
+
+    assert load_capabilities('111111111111').blocked == \
+        {'iam:CreateAccessKey'}
+    assert load_capabilities('222222222222').blocked == set()
+
+
+def test_load_capabilities_ignores_stale_check(shared_check):
+    shared_check(time.time() - 2 * 86400)
+
+    assert load_capabilities('111111111111').blocked == set()
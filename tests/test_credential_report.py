@@ -0,0 +1,153 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the credential report scan mode with a recorded report."""
+
+import datetime
+import types
+
+import pytest
+
+import credential_report
+from account_scan import get_last_used_date
+from credential_report import get_credential_report, \
+    get_report_last_used_date, parse_credential_report
+from throttling import TokenBucket
+
+UTC = datetime.timezone.utc
+
+# Recorded report, alice uses both slots, bob only slot 2 and carol has no
+# keys
+REPORT = '''\
+user,arn,user_creation_time,password_enabled,password_last_used,\
+password_last_changed,password_next_rotation,mfa_active,\
+access_key_1_active,access_key_1_last_rotated,access_key_1_last_used_date,\
+access_key_1_last_used_region,access_key_1_last_used_service,\
+access_key_2_active,access_key_2_last_rotated,access_key_2_last_used_date,\
+access_key_2_last_used_region,access_key_2_last_used_service,\
+cert_1_active,cert_1_last_rotated,cert_2_active,cert_2_last_rotated
+<root_account>,arn:aws:iam::111111111111:root,2019-01-01T00:00:00+00:00,\
+not_supported,2021-05-30T08:00:00+00:00,not_supported,not_supported,true,\
+false,N/A,N/A,N/A,N/A,false,N/A,N/A,N/A,N/A,false,N/A,false,N/A
+alice,arn:aws:iam::111111111111:user/alice,2020-01-01T00:00:00+00:00,\
+true,no_information,2020-01-01T00:00:00+00:00,N/A,false,\
+true,2021-03-01T09:30:15+00:00,2021-05-31T18:00:00+00:00,us-east-1,iam,\
+false,2020-12-01T09:30:15+00:00,2021-02-01T10:00:00+00:00,us-west-2,s3,\
+false,N/A,false,N/A
+bob,arn:aws:iam::111111111111:user/bob,2020-06-01T00:00:00+00:00,\
+false,N/A,N/A,N/A,false,\
+false,N/A,N/A,N/A,N/A,\
+true,2021-04-15T12:00:00+00:00,N/A,N/A,N/A,\
+false,N/A,false,N/A
+carol,arn:aws:iam::111111111111:user/carol,2021-05-01T00:00:00+00:00,\
+false,N/A,N/A,N/A,false,\
+false,N/A,N/A,N/A,N/A,false,N/A,N/A,N/A,N/A,false,N/A,false,N/A
+'''.encode('utf-8')
+
+
+def test_report_keys_by_user():
+    report = parse_credential_report(REPORT)
+
+    assert '<root_account>' not in report
+    assert report == {
+        'alice': [
+            {'CreateDate': datetime.datetime(2021, 3, 1, 9, 30, 15,
+                                             tzinfo=UTC),
+             'Status': 'Active',
+             'LastUsedDate': datetime.datetime(2021, 5, 31, 18, tzinfo=UTC)},
+            {'CreateDate': datetime.datetime(2020, 12, 1, 9, 30, 15,
+                                             tzinfo=UTC),
+             'Status': 'Inactive',
+             'LastUsedDate': datetime.datetime(2021, 2, 1, 10, tzinfo=UTC)}],
+        # only the second slot is filled, and the key was never used
+        'bob': [
+            {'CreateDate': datetime.datetime(2021, 4, 15, 12, tzinfo=UTC),
+             'Status': 'Active',
+             'LastUsedDate': None}],
+        'carol': []}
+
+
+@pytest.mark.parametrize('value', ['', 'N/A', 'not_supported',
+                                   'no_information'])
+def test_empty_report_values(value):
+    assert credential_report._parse_report_date(value) is None
+
+
+def test_keys_are_matched_on_create_date_to_the_second():
+    report = parse_credential_report(REPORT)
+    # the API reports creation dates with sub second precision
+    key = {'AccessKeyId': 'AKIAALICE2',
+           'CreateDate': datetime.datetime(2020, 12, 1, 9, 30, 15, 812000,
+                                           tzinfo=UTC)}
+
+    assert get_report_last_used_date(key, report['alice']) == \
+        datetime.datetime(2021, 2, 1, 10, tzinfo=UTC)
+    key['CreateDate'] += datetime.timedelta(seconds=1)
+    assert get_report_last_used_date(key, report['alice']) is None
+    assert get_report_last_used_date(key, None) is None
+
+
+class StubIamClient:
+    """IAM stub serving the recorded report and the last used dates of
+    keys."""
+
+    exceptions = types.SimpleNamespace(ClientError=RuntimeError)
+
+    def __init__(self, report_age=datetime.timedelta(hours=1),
+                 states=('STARTED', 'COMPLETE')):
+        self.report_age = report_age
+        self.states = list(states)
+        self.last_used_requests = []
+
+    def generate_credential_report(self):
+        return {'State': self.states.pop(0)}
+
+    def get_credential_report(self):
+        return {'Content': REPORT, 'ReportFormat': 'text/csv',
+                'GeneratedTime': datetime.datetime.now(UTC) - self.report_age}
+
+    def get_access_key_last_used(self, AccessKeyId):
+        self.last_used_requests.append(AccessKeyId)
+        return {'AccessKeyLastUsed': {
+            'LastUsedDate': datetime.datetime(2021, 5, 1, tzinfo=UTC)}}
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(credential_report.time, 'sleep', lambda seconds: None)
+
+
+def test_fresh_report_is_used():
+    assert get_credential_report(StubIamClient(), 4) == \
+        parse_credential_report(REPORT)
+
+
+def test_stale_report_is_ignored():
+    iam_client = StubIamClient(report_age=datetime.timedelta(hours=5))
+    assert get_credential_report(iam_client, 4) is None
+
+
+def test_report_not_ready_is_ignored():
+    iam_client = StubIamClient(
+        states=['STARTED'] * credential_report.REPORT_POLL_ATTEMPTS)
+    assert get_credential_report(iam_client, 4) is None
+
+
+def test_unused_keys_are_looked_up_with_the_api():
+    report = parse_credential_report(REPORT)
+    iam_client = StubIamClient()
+    limiter = TokenBucket(1000)
+    used_key = {'AccessKeyId': 'AKIAALICE1', 'CreateDate': datetime.datetime(
+        2021, 3, 1, 9, 30, 15, tzinfo=UTC)}
+    unused_key = {'AccessKeyId': 'AKIABOB2', 'CreateDate': datetime.datetime(
+        2021, 4, 15, 12, tzinfo=UTC)}
+
+    assert get_last_used_date(used_key, iam_client, limiter,
+                              report['alice']) == \
+        datetime.datetime(2021, 5, 31, 18, tzinfo=UTC)
+    assert get_last_used_date(unused_key, iam_client, limiter,
+                              report['bob']) == \
+        datetime.datetime(2021, 5, 1, tzinfo=UTC)
+    assert iam_client.last_used_requests == ['AKIABOB2']
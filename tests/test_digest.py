@@ -0,0 +1,85 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the notification digest."""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def digest(notifier):
+    return notifier('digest')
+
+
+def notification(account_id, email='owner@example.com', actions=None,
+                 **fields):
+    return dict({
+        'email': email, 'email_template': 'template.html',
+        'subject': 'Keys rotated',
+        'template_values': {'account_id': account_id,
+                            'account_name': f'name-{account_id}',
+                            'actions': actions or [f'ACTION {account_id}']}},
+        **fields)
+
+
+def test_notifications_are_grouped_by_recipient(digest):
+    messages = [('r1', notification('1')),
+                ('r2', notification('2', email='other@example.com')),
+                ('r3', notification('3')),
+                ('r4', notification('4', subject='Keys deleted'))]
+
+    groups = digest.group_by_recipient(messages)
+
+    assert {key: receipt_handles
+            for key, (receipt_handles, _) in groups.items()} == {
+        ('owner@example.com', 'template.html', 'Keys rotated'): ['r1', 'r3'],
+        ('other@example.com', 'template.html', 'Keys rotated'): ['r2'],
+        ('owner@example.com', 'template.html', 'Keys deleted'): ['r4']}
+
+
+def test_single_account_actions_are_not_prefixed(digest):
+    values = digest.merge_template_values(
+        [notification('1', actions=['a', 'b']),
+         notification('1', actions=['c'])], 'now')
+
+    assert values['account_id'] == '1'
+    assert values['timestamp'] == 'now'
+    assert list(values['actions']) == ['a', 'b', 'c']
+
+
+def test_actions_of_several_accounts_are_prefixed(digest, tmp_path):
+    spilled = tmp_path / 'actions.jsonl'
+    spilled.write_text('"c"\n"d"\n')
+    notifications = [
+        notification('1', actions=['a', 'b']),
+        notification('2', actions=['c'], actions_ref={'path': str(spilled)})]
+
+    values = digest.merge_template_values(notifications, 'now')
+
+    assert values['account_id'] == '1, 2'
+    assert values['account_name'] == 'name-1, name-2'
+    assert list(values['actions']) == [
+        'name-1 (1): a', 'name-1 (1): b', 'name-2 (2): c', 'name-2 (2): d']
+    # the first notification is not changed by the merge
+    assert notifications[0]['template_values']['account_id'] == '1'
+
+
+def test_malformed_messages_are_left_on_the_queue(digest):
+    class StubSqsClient:
+        def __init__(self):
+            self.responses = [{'Messages': [
+                {'MessageId': 'm1', 'ReceiptHandle': 'r1',
+                 'Body': json.dumps(notification('1'))},
+                {'MessageId': 'm2', 'ReceiptHandle': 'r2', 'Body': '{'}]},
+                {}]
+
+        def receive_message(self, **kwargs):
+            return self.responses.pop(0)
+
+    messages = digest.receive_notifications(StubSqsClient(), 'queue', None)
+
+    assert messages == [('r1', notification('1'))]
@@ -0,0 +1,115 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the concurrent execution of key actions."""
+
+import datetime
+import random
+import threading
+import time
+
+import pytest
+
+import config
+import key_actions
+from key_policy import ActionReasons
+from key_records import ActionKind, KeyAction, KeyRecord
+
+NOW = datetime.datetime(2021, 6, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+class FakeHandlers:
+    """Action handlers recording the order actions run in, failing the
+    given keys and checking no two actions of a user overlap."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self.running = set()
+        self.overlaps = []
+        self._lock = threading.Lock()
+
+    def handler(self, kind):
+        def handle(key, run_context):
+            with self._lock:
+                if key.user_name in self.running:
+                    self.overlaps.append(key.user_name)
+                self.running.add(key.user_name)
+                self.calls.append((kind, key.user_name, key.access_key_id))
+            # let other users run while this action is in flight
+            time.sleep(random.uniform(0, 0.002))
+            with self._lock:
+                self.running.discard(key.user_name)
+            if key.access_key_id in self.failing:
+                raise RuntimeError(f'{kind.name} failed')
+        return handle
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    fake = FakeHandlers()
+    for kind in (ActionKind.ROTATE, ActionKind.DEACTIVATE, ActionKind.DELETE):
+        monkeypatch.setitem(key_actions.ACTION_HANDLERS, kind,
+                            fake.handler(kind))
+    monkeypatch.setattr(key_actions.config, 'actionWorkers', 4)
+    return fake
+
+
+def action(kind, user_name, access_key_id):
+    key = KeyRecord(user_name, access_key_id, True, NOW, None, NOW)
+    return KeyAction(kind, key, ActionReasons.EXPIRED_ACTIVE_KEY, NOW
+                     if kind == ActionKind.WARN else None)
+
+
+def test_actions_of_each_user_run_in_queue_order(handlers):
+    random.seed(1)
+    kinds = (ActionKind.DELETE, ActionKind.DEACTIVATE, ActionKind.ROTATE,
+             ActionKind.WARN)
+    # users interleaved across the queue
+    action_queue = [action(kinds[i % 4], f'user{i % 7}', f'AKIA{i:04d}')
+                    for i in range(200)]
+
+    results = key_actions.execute_actions(action_queue, None)
+
+    executed = [key_action for key_action in action_queue
+                if key_action.kind != ActionKind.WARN]
+    assert [result['action_spec'] for result in results] == executed
+    assert all(result['error'] is None for result in results)
+    assert handlers.overlaps == []
+    for user in range(7):
+        assert [call[2] for call in handlers.calls
+                if call[1] == f'user{user}'] == \
+            [key_action.key.access_key_id for key_action in executed
+             if key_action.key.user_name == f'user{user}']
+
+
+def test_failed_action_skips_the_rest_of_the_user(handlers):
+    handlers.failing.add('AKIAALICE1')
+    action_queue = [action(ActionKind.DELETE, 'alice', 'AKIAALICE1'),
+                    action(ActionKind.DELETE, 'bob', 'AKIABOB1'),
+                    action(ActionKind.ROTATE, 'alice', 'AKIAALICE2'),
+                    action(ActionKind.ROTATE, 'bob', 'AKIABOB2')]
+
+    results = key_actions.execute_actions(action_queue, None)
+
+    assert [result['action_spec'] for result in results] == action_queue
+    assert [result['error'] for result in results] == [
+        'DELETE failed', None,
+        'Skipped because DELETE of AKIAALICE1 failed.', None]
+    # the rotation would have exceeded the two key limit
+    assert (ActionKind.ROTATE, 'alice', 'AKIAALICE2') not in handlers.calls
+    assert (ActionKind.ROTATE, 'bob', 'AKIABOB2') in handlers.calls
+
+
+@pytest.mark.parametrize('value', ['0', '-1'])
+def test_worker_counts_must_be_positive(monkeypatch, value):
+    monkeypatch.setenv('ACTION_WORKERS', value)
+    with pytest.raises(ValueError):
+        config.get_positive_int('ACTION_WORKERS', 4)
+
+    monkeypatch.setenv('ACTION_WORKERS', '2')
+    assert config.get_positive_int('ACTION_WORKERS', 4) == 2
+    monkeypatch.delenv('ACTION_WORKERS')
+    assert config.get_positive_int('ACTION_WORKERS', 4) == 4
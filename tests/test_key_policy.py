@@ -0,0 +1,133 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Differential tests of the key policy rule table against the frozen
+branch based evaluation it replaced."""
+
+import datetime
+import random
+import types
+
+import pytest
+
+import legacy_key_policy
+from key_policy import ActionReasons, KeyBatch, evaluate_batch
+from key_records import KeyRecord
+
+CONFIG = types.SimpleNamespace(rotationPeriod=90,
+                               installation_grace_period=10,
+                               recovery_grace_period=10,
+                               pending_action_warn_period=7)
+
+NOW = datetime.datetime(2021, 6, 1, 12, tzinfo=datetime.timezone.utc)
+DAY = datetime.timedelta(days=1)
+
+
+def make_key(user_name, access_key_id, active, age_days, used_days_ago=None):
+    create_date = NOW - datetime.timedelta(days=age_days)
+    last_used_date = None if used_days_ago is None \
+        else NOW - datetime.timedelta(days=used_days_ago)
+    return {'UserName': user_name, 'AccessKeyId': access_key_id,
+            'Status': 'Active' if active else 'Inactive',
+            'CreateDate': create_date, 'LastUsedDate': last_used_date}
+
+
+def random_user(rng, user_name):
+    keys = []
+    for index in range(rng.choice((0, 1, 1, 2, 2, 2))):
+        # ages around the rotation period and grace periods, with hours so
+        # dates fall on either side of the thresholds
+        age_days = rng.uniform(0, 130)
+        used_days_ago = None
+        if rng.random() < 0.8:
+            used_days_ago = rng.uniform(0, age_days)
+        keys.append(make_key(user_name, f'{user_name}-{index}',
+                             rng.random() < 0.6, age_days, used_days_ago))
+    return keys, rng.random() < 0.1
+
+
+def legacy_actions(users):
+    actions = []
+    for keys, force_rotate in users:
+        # the legacy evaluation adds the expiry to the metadata
+        for action in legacy_key_policy.get_actions_for_keys(
+                [dict(key) for key in keys], force_rotate, NOW, CONFIG):
+            actions.append((action['action'], action['key']['AccessKeyId'],
+                            action['reason'], action.get('action_date')))
+    return actions
+
+
+def rule_table_actions(users):
+    batch = KeyBatch()
+    for keys, force_rotate in users:
+        records = [KeyRecord.from_metadata(key, key['LastUsedDate'],
+                                           CONFIG.rotationPeriod)
+                   for key in keys]
+        batch.add_user(keys[0]['UserName'] if keys else None, records,
+                       force_rotate)
+    return [(action.kind.name, action.key.access_key_id, action.reason,
+             action.action_date)
+            for action in evaluate_batch(batch, NOW, CONFIG)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_generated_population_matches_legacy(seed):
+    rng = random.Random(seed)
+    users = [random_user(rng, f'user{index}') for index in range(4000)]
+
+    expected = legacy_actions(users)
+    assert rule_table_actions(users) == expected
+    # the population is only meaningful if it reaches every reason
+    assert {action[2] for action in expected} == set(ActionReasons)
+
+
+@pytest.mark.parametrize('keys, force_rotate, reason', [
+    # the rotation of the active key takes the reason of the conflict
+    ([make_key('u', 'active', True, 100, 1),
+      make_key('u', 'inactive', False, 120, 30)], False,
+     ActionReasons.EXPIRED_INACTIVE_KEY_CONFLICT),
+    ([make_key('u', 'active', True, 20, 1),
+      make_key('u', 'inactive', False, 40, 30)], True,
+     ActionReasons.FORCED_INACTIVE_KEY_CONFLICT),
+])
+def test_rotate_takes_delete_reason(keys, force_rotate, reason):
+    users = [(keys, force_rotate)]
+    actions = rule_table_actions(users)
+
+    assert actions == legacy_actions(users)
+    assert actions == [('DELETE', 'inactive', reason, None),
+                       ('ROTATE', 'active', reason, None)]
+
+
+@pytest.mark.parametrize('keys, force_rotate', [
+    # both active and expired, the least recently used is deleted
+    ([make_key('u', 'a', True, 100, 5), make_key('u', 'b', True, 95, 2)],
+     False),
+    # same, the key never used is deleted
+    ([make_key('u', 'a', True, 100, 5), make_key('u', 'b', True, 95)], False),
+    # same, neither used, the older key is deleted
+    ([make_key('u', 'a', True, 95), make_key('u', 'b', True, 100)], False),
+    # forced rotation of two active keys
+    ([make_key('u', 'a', True, 20, 5), make_key('u', 'b', True, 10, 2)],
+     True),
+    # newer key about to rotate, the older one is deleted with it
+    ([make_key('u', 'a', True, 100, 5), make_key('u', 'b', True, 85, 2)],
+     False),
+    # older key about to expire, it cannot rotate while the other exists
+    ([make_key('u', 'a', True, 85, 5), make_key('u', 'b', True, 30, 2)],
+     False),
+    # inactive key pending deletion while the active key rotates
+    ([make_key('u', 'a', True, 86, 5), make_key('u', 'b', False, 120, 90)],
+     False),
+    # both inactive, the expired one waits for the unexpired one
+    ([make_key('u', 'a', False, 100, 60), make_key('u', 'b', False, 86, 2)],
+     False),
+])
+def test_conflicts_match_legacy(keys, force_rotate):
+    users = [(keys, force_rotate)]
+    actions = rule_table_actions(users)
+
+    assert actions
+    assert actions == legacy_actions(users)
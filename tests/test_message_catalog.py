@@ -0,0 +1,58 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the message catalog against the messages it replaced."""
+
+import datetime
+
+import pytest
+
+from key_policy import ActionReasons
+from key_records import ActionKind, KeyAction, KeyRecord
+from legacy_messages import format_action_message
+from message_catalog import compile_message, get_catalog
+
+NOW = datetime.datetime(2021, 6, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def every_action():
+    """Every kind of action with every reason, warned actions up to a week
+    ahead, and every fifth action failed."""
+    actions = []
+    for kind in ActionKind:
+        for reason in ActionReasons:
+            for hours in range(0, 24 * 7, 17):
+                key = KeyRecord(f'user{len(actions)}',
+                                f'AKIA{len(actions):016d}', True,
+                                NOW, None, NOW)
+                action_date = NOW + datetime.timedelta(hours=hours) \
+                    if kind == ActionKind.WARN else None
+                actions.append(KeyAction(kind, key, reason, action_date))
+    action_errors = {id(action): f'Error {i}'
+                     for i, action in enumerate(actions) if i % 5 == 0}
+    return actions, action_errors
+
+
+@pytest.mark.parametrize('dryrun', [False, True])
+def test_messages_match_legacy(dryrun):
+    actions, action_errors = every_action()
+
+    messages = list(get_catalog('en').format_actions(
+        actions, dryrun, action_errors, NOW))
+
+    assert messages == [
+        format_action_message(action, dryrun, action_errors, NOW)
+        for action in actions]
+
+
+def test_compiled_message_keeps_conversions_and_format_specs():
+    message = compile_message('{name!r} owes {amount:.2f} {key.real}',
+                              ('amount', 'name', 'key'))
+    assert message(1.5, 'alice', 3) == "'alice' owes 1.50 3"
+
+
+def test_compiled_message_rejects_unknown_fields():
+    with pytest.raises(KeyError):
+        compile_message('{user_name} {__import__}', ('user_name',))
@@ -0,0 +1,65 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the payload encoder and the action stream of the notifier."""
+
+import json
+
+from payload_encoder import PREVIEW_ACTIONS, PayloadEncoder
+
+
+def payload():
+    return {'email': 'owner@example.com',
+            'template_values': {'account_id': '111111111111'}}
+
+
+def action_messages(count):
+    return (f'ACTION: ROTATE key user{i}:AKIA{i:016d}.  Key is expired.'
+            for i in range(count))
+
+
+def test_actions_that_fit_stay_in_payload(tmp_path):
+    encoder = PayloadEncoder(10000, spill_dir=str(tmp_path))
+
+    encoded = json.loads(encoder.encode(payload(), action_messages(5), 'run'))
+
+    assert encoded['template_values']['actions'] == list(action_messages(5))
+    assert 'actions_ref' not in encoded
+    assert not list(tmp_path.iterdir())
+
+
+def test_encoded_payload_is_within_spill_size(tmp_path):
+    encoder = PayloadEncoder(2000, spill_dir=str(tmp_path))
+
+    for count in range(60):
+        encoded = encoder.encode(payload(), action_messages(count), 'run')
+        if 'actions_ref' not in json.loads(encoded):
+            assert len(encoded) <= 2000
+
+
+def test_spilled_actions_are_streamed_back(tmp_path, notifier):
+    encoder = PayloadEncoder(2000, spill_dir=str(tmp_path))
+
+    encoded = json.loads(encoder.encode(payload(), action_messages(500),
+                                        'run'))
+
+    assert encoded['actions_count'] == 500
+    assert encoded['template_values']['actions'] == \
+        list(action_messages(PREVIEW_ACTIONS))
+    assert encoded['actions_ref']['path'].startswith(str(tmp_path))
+    action_stream = notifier('action_stream')
+    assert list(action_stream.get_actions(encoded)) == \
+        list(action_messages(500))
+
+
+def test_spilled_actions_without_location_are_counted():
+    encoder = PayloadEncoder(2000)
+
+    encoded = json.loads(encoder.encode(payload(), action_messages(500),
+                                        'run'))
+
+    assert encoded['actions_count'] == 500
+    assert len(encoded['template_values']['actions']) == PREVIEW_ACTIONS
+    assert 'actions_ref' not in encoded
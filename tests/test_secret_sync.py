@@ -0,0 +1,97 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the secret sync of rotated keys."""
+
+import json
+import types
+
+from secret_sync import SecretSync
+
+POLICY = json.dumps({'Version': '2012-10-17', 'Statement': [{
+    'Effect': 'Allow', 'Action': 'secretsmanager:GetSecretValue',
+    'Principal': {'AWS': 'arn:aws:iam::111111111111:user/alice'},
+    'Resource': '*'}]})
+
+
+class StubSecretsManagerClient:
+    """Secrets Manager stub keeping the replica regions and policy of each
+    secret, recording every write."""
+
+    exceptions = types.SimpleNamespace(ResourceExistsException=KeyError)
+
+    def __init__(self, secrets=None):
+        self.secrets = secrets or {}
+        self.writes = []
+
+    def get_paginator(self, operation_name):
+        assert operation_name == 'list_secrets'
+        return self
+
+    def paginate(self, Filters):
+        yield {'SecretList': [{'Name': name} for name in self.secrets]}
+
+    def create_secret(self, Name, AddReplicaRegions, **kwargs):
+        self.writes.append('create_secret')
+        self.secrets[Name] = {
+            'regions': [x['Region'] for x in AddReplicaRegions],
+            'policy': None}
+
+    def put_secret_value(self, SecretId, SecretString):
+        self.writes.append('put_secret_value')
+
+    def describe_secret(self, SecretId):
+        return {'ReplicationStatus': [
+            {'Region': region} for region in self.secrets[SecretId]['regions']]}
+
+    def replicate_secret_to_regions(self, SecretId, AddReplicaRegions,
+                                    **kwargs):
+        self.writes.append('replicate_secret_to_regions')
+        self.secrets[SecretId]['regions'] += [
+            x['Region'] for x in AddReplicaRegions]
+
+    def get_resource_policy(self, SecretId):
+        response = {'Name': SecretId}
+        if self.secrets[SecretId]['policy'] is not None:
+            response['ResourcePolicy'] = self.secrets[SecretId]['policy']
+        return response
+
+    def put_resource_policy(self, SecretId, ResourcePolicy, **kwargs):
+        self.writes.append('put_resource_policy')
+        self.secrets[SecretId]['policy'] = ResourcePolicy
+
+
+def test_new_secret_is_created_with_policy():
+    client = StubSecretsManagerClient()
+    SecretSync(client, ['us-west-2']).sync_secret(
+        'User_alice_AccessKey', '{}', POLICY)
+
+    assert client.writes == ['create_secret', 'put_resource_policy']
+    assert client.secrets['User_alice_AccessKey'] == {
+        'regions': ['us-west-2'], 'policy': POLICY}
+
+
+def test_synced_secret_only_stores_value():
+    client = StubSecretsManagerClient({'User_alice_AccessKey': {
+        'regions': ['us-west-2'],
+        # formatting differences are not a change
+        'policy': json.dumps(json.loads(POLICY), indent=2)}})
+    SecretSync(client, ['us-west-2']).sync_secret(
+        'User_alice_AccessKey', '{}', POLICY)
+
+    assert client.writes == ['put_secret_value']
+
+
+def test_changes_made_outside_the_rotation_are_corrected():
+    client = StubSecretsManagerClient({'User_alice_AccessKey': {
+        'regions': [], 'policy': POLICY.replace('alice', 'mallory')}})
+    SecretSync(client, ['us-west-2']).sync_secret(
+        'User_alice_AccessKey', '{}', POLICY)
+
+    assert client.writes == ['put_secret_value',
+                             'replicate_secret_to_regions',
+                             'put_resource_policy']
+    assert client.secrets['User_alice_AccessKey'] == {
+        'regions': ['us-west-2'], 'policy': POLICY}
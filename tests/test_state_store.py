@@ -0,0 +1,123 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the key state stores."""
+
+import datetime
+
+import pytest
+
+import state_store
+from state_store import DynamoDBStateStore, MemoryStateStore, \
+    SQLiteStateStore
+
+NOW = datetime.datetime(2021, 6, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+class UnprocessedClient:
+    """BatchWriteItem stub leaving the last item unprocessed a number of
+    times."""
+
+    def __init__(self, unprocessed_responses):
+        self.unprocessed_responses = unprocessed_responses
+        self.requests = []
+
+    def batch_write_item(self, RequestItems):
+        self.requests.append(RequestItems)
+        if self.unprocessed_responses:
+            self.unprocessed_responses -= 1
+            return {'UnprocessedItems': {
+                table: items[-1:] for table, items in RequestItems.items()}}
+        return {'UnprocessedItems': {}}
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(state_store.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def test_batch_write_resends_unprocessed_items(no_sleep):
+    client = UnprocessedClient(unprocessed_responses=2)
+    store = DynamoDBStateStore('KeyState', client)
+    store.delete_users('111111111111', [f'user{i}' for i in range(30)])
+
+    # 25 + 5 items, the first batch is resent twice with its last item
+    assert [len(request['KeyState']) for request in client.requests] == \
+        [25, 1, 1, 5]
+    assert len(no_sleep) == 2
+    assert all(0 <= sleep <= state_store.BATCH_WRITE_MAX_BACKOFF
+               for sleep in no_sleep)
+
+
+def test_batch_write_gives_up_after_max_attempts(no_sleep):
+    client = UnprocessedClient(unprocessed_responses=100)
+    store = DynamoDBStateStore('KeyState', client)
+
+    with pytest.raises(RuntimeError):
+        store.delete_users('111111111111', ['alice'])
+    assert len(client.requests) == state_store.BATCH_WRITE_MAX_ATTEMPTS
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request):
+    if request.param == 'memory':
+        return MemoryStateStore()
+    return SQLiteStateStore(':memory:')
+
+
+def user_state(user_name, next_check=NOW):
+    return {'user_name': user_name, 'next_check': next_check, 'keys': {
+        'AKIA1': {'status': 'Active', 'create_date': NOW,
+                  'last_used_date': None, 'deactivate_date': None},
+        'AKIA2': {'status': 'Inactive',
+                  'create_date': NOW - datetime.timedelta(days=100),
+                  'last_used_date': NOW - datetime.timedelta(seconds=1.5),
+                  'deactivate_date': NOW}}}
+
+
+def test_users_round_trip(store):
+    store.put_users('111111111111', [user_state('alice'), user_state('bob')])
+    store.put_users('222222222222', [user_state('carol')])
+    store.set_watermark('111111111111', NOW)
+
+    users, watermark = store.get_account_state('111111111111')
+    assert users == {'alice': user_state('alice'), 'bob': user_state('bob')}
+    assert watermark == NOW
+    assert store.get_user('222222222222', 'carol') == user_state('carol')
+    assert store.get_user('222222222222', 'alice') is None
+    assert store.get_account_state('333333333333') == ({}, None)
+
+
+def test_put_replaces_and_delete_removes_users(store):
+    store.put_users('111111111111', [user_state('alice'), user_state('bob')])
+    later = NOW + datetime.timedelta(days=1)
+    store.put_users('111111111111', [user_state('alice', later)])
+    store.delete_users('111111111111', ['bob', 'nobody'])
+
+    users, _ = store.get_account_state('111111111111')
+    assert users == {'alice': user_state('alice', later)}
+
+
+def test_loaded_state_is_a_copy(store):
+    stored = user_state('alice')
+    store.put_users('111111111111', [stored])
+    stored['keys']['AKIA1']['status'] = 'Inactive'
+    store.get_user('111111111111', 'alice')['keys'].clear()
+
+    assert store.get_user('111111111111', 'alice') == user_state('alice')
+
+
+def test_next_due_is_only_lowered_for_scheduled_accounts(store):
+    store.set_next_due('111111111111', NOW)
+    store.set_next_due('222222222222', NOW)
+    store.lower_next_due('111111111111', NOW - datetime.timedelta(hours=1))
+    store.lower_next_due('222222222222', NOW + datetime.timedelta(hours=1))
+    store.lower_next_due('333333333333', NOW)
+
+    assert store.get_schedule() == {
+        '111111111111': NOW - datetime.timedelta(hours=1),
+        '222222222222': NOW}
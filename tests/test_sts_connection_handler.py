@@ -0,0 +1,88 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the assumed role session cache."""
+
+import collections
+import datetime
+import types
+
+import pytest
+
+import sts_connection_handler
+from config import Config
+from sts_connection_handler import get_account_session
+
+
+class StubStsClient:
+    """STS stub handing out credentials that expire after lifetime."""
+
+    exceptions = types.SimpleNamespace(ClientError=RuntimeError)
+    meta = types.SimpleNamespace(region_name='us-east-1')
+
+    def __init__(self, lifetime=datetime.timedelta(hours=1)):
+        self.lifetime = lifetime
+        self.role_arns = []
+
+    def assume_role(self, RoleArn, RoleSessionName):
+        self.role_arns.append(RoleArn)
+        return {'Credentials': {
+            'AccessKeyId': f'ASIA{len(self.role_arns):04d}',
+            'SecretAccessKey': 'secret',
+            'SessionToken': 'token',
+            'Expiration': datetime.datetime.now(datetime.timezone.utc)
+            + self.lifetime}}
+
+
+@pytest.fixture
+def sts_client(monkeypatch):
+    client = StubStsClient()
+    monkeypatch.setattr(sts_connection_handler, '_get_base_sts_client',
+                        lambda: client)
+    monkeypatch.setattr(sts_connection_handler, '_session_cache',
+                        collections.OrderedDict())
+    monkeypatch.setattr(Config, 'iamAssumedRoleName', 'rotation-role')
+    monkeypatch.setattr(Config, 'roleSessionName', 'AccessKeyRotate')
+    return client
+
+
+def role_arn(account_id):
+    return f'arn:aws:iam::{account_id}:role/rotation-role'
+
+
+def test_session_is_reused_for_the_same_account(sts_client):
+    session = get_account_session('111111111111')
+
+    assert get_account_session('111111111111') is session
+    assert get_account_session('222222222222') is not session
+    assert sts_client.role_arns == [role_arn('111111111111'),
+                                    role_arn('222222222222')]
+
+
+def test_expiring_credentials_assume_the_role_again(sts_client):
+    # botocore refreshes credentials expiring within ten minutes
+    sts_client.lifetime = datetime.timedelta(minutes=1)
+    session = get_account_session('111111111111')
+    sts_client.lifetime = datetime.timedelta(hours=1)
+
+    credentials = session.get_credentials().get_frozen_credentials()
+
+    assert credentials.access_key == 'ASIA0002'
+    assert sts_client.role_arns == [role_arn('111111111111')] * 2
+
+
+def test_least_recently_used_session_is_evicted(sts_client, monkeypatch):
+    monkeypatch.setattr(sts_connection_handler, 'SESSION_CACHE_SIZE', 2)
+    first = get_account_session('111111111111')
+    get_account_session('222222222222')
+    assert get_account_session('111111111111') is first
+
+    get_account_session('333333333333')
+
+    assert list(sts_connection_handler._session_cache) == [
+        ('111111111111', role_arn('111111111111')),
+        ('333333333333', role_arn('333333333333'))]
+    assert get_account_session('222222222222') is not None
+    assert sts_client.role_arns.count(role_arn('222222222222')) == 2
@@ -0,0 +1,127 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the adaptive token bucket."""
+
+import pytest
+from botocore.exceptions import ClientError
+
+import throttling
+from throttling import TokenBucket
+
+
+class FakeClock:
+    """Monotonic clock that only advances when slept on."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(throttling.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(throttling.time, 'sleep', fake.sleep)
+    return fake
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code}}, 'ListAccessKeys')
+
+
+class StubMethod:
+    """API method raising the given errors before it succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'AccessKeyMetadata': []}
+
+
+def test_acquire_waits_for_a_token_at_the_current_rate(clock):
+    # waits of a power of two rate are exact, so the clock lands on them
+    limiter = TokenBucket(8)
+    for _ in range(8):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+    limiter.acquire()
+    assert clock.sleeps == [0.125]
+
+    limiter.throttled()
+    limiter.acquire()
+    assert clock.sleeps == [0.125, 0.25]
+
+
+def test_throttled_halves_the_rate_down_to_min_rate(clock):
+    limiter = TokenBucket(100, min_rate=10)
+    rates = []
+    for _ in range(5):
+        limiter.throttled()
+        rates.append(limiter.rate)
+
+    assert rates == [50, 25, 12.5, 10, 10]
+
+
+def test_succeeded_recovers_the_rate_up_to_max_rate(clock):
+    limiter = TokenBucket(100, min_rate=10)
+    limiter.throttled()
+    limiter.throttled()
+
+    limiter.succeeded()
+    assert limiter.rate == 30
+    for _ in range(20):
+        limiter.succeeded()
+    assert limiter.rate == 100
+
+
+def test_throttled_calls_are_retried_at_a_lower_rate(clock):
+    limiter = TokenBucket(100)
+    method = StubMethod(client_error('Throttling'),
+                        client_error('TooManyRequestsException'))
+
+    assert limiter.call(method, UserName='alice') == \
+        {'AccessKeyMetadata': []}
+    assert method.calls == [{'UserName': 'alice'}] * 3
+    # halved twice, then recovered by the successful call
+    assert limiter.rate == 30
+
+
+def test_other_errors_are_raised_immediately(clock):
+    limiter = TokenBucket(100)
+    method = StubMethod(client_error('NoSuchEntity'))
+
+    with pytest.raises(ClientError) as error:
+        limiter.call(method, UserName='alice')
+
+    assert error.value.response['Error']['Code'] == 'NoSuchEntity'
+    assert len(method.calls) == 1
+    assert limiter.rate == 100
+
+
+def test_throttle_error_is_raised_after_max_attempts(clock):
+    limiter = TokenBucket(100, min_rate=1, max_attempts=3)
+    method = StubMethod(*[client_error('Throttling')] * 5)
+
+    with pytest.raises(ClientError) as error:
+        limiter.call(method, UserName='alice')
+
+    assert error.value.response['Error']['Code'] == 'Throttling'
+    assert len(method.calls) == 3
+    # only the retried attempts lowered the rate
+    assert limiter.rate == 25
@@ -0,0 +1,54 @@
+# (c) 2021 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# https://aws.amazon.com/agreement/ or other written agreement between Customer
+# and Amazon Web Services, Inc.
+
+"""Tests of the user filter."""
+
+from botocore.exceptions import ClientError
+
+from throttling import TokenBucket
+from user_filter import UserFilter, iter_filtered_users
+
+
+class StubIamClient:
+    """IAM stub listing users and their tags one per page, throttling the
+    first tag request of every user."""
+
+    def __init__(self, user_tags):
+        self.user_tags = user_tags
+        self.tag_requests = []
+
+    def list_users(self, PathPrefix, MaxItems):
+        return {'Users': [{'UserName': name, 'Path': PathPrefix}
+                          for name in self.user_tags],
+                'IsTruncated': False}
+
+    def list_user_tags(self, UserName, Marker=None):
+        self.tag_requests.append((UserName, Marker))
+        if self.tag_requests.count((UserName, None)) == 1 and Marker is None:
+            raise ClientError({'Error': {'Code': 'Throttling'}},
+                              'ListUserTags')
+        index = int(Marker or 0)
+        tags = self.user_tags[UserName]
+        page = {'Tags': tags[index:index + 1],
+                'IsTruncated': index + 1 < len(tags)}
+        if page['IsTruncated']:
+            page['Marker'] = str(index + 1)
+        return page
+
+
+def test_tag_pages_are_rate_limited_and_retried():
+    iam_client = StubIamClient({
+        'alice': [{'Key': 'team', 'Value': 'a'},
+                  {'Key': 'rotate', 'Value': 'yes'}],
+        'bob': [{'Key': 'team', 'Value': 'b'}]})
+    limiter = TokenBucket(1000, min_rate=1000)
+
+    users = list(iter_filtered_users(
+        iam_client, limiter, UserFilter(tags={'rotate': '*'}), 100))
+
+    assert [user['UserName'] for user in users] == ['alice']
+    assert iam_client.tag_requests == [
+        ('alice', None), ('alice', None), ('alice', '1'),
+        ('bob', None), ('bob', None)]